@@ -0,0 +1,75 @@
+"""Adaptive batch sizing for the writer drain loop.
+
+A fixed batch cap (BATCH_MAX_EVENTS) is wrong in both directions: under a
+burst the queue fills toward QUEUE_MAX while the writer keeps committing small
+batches, and at idle the fixed wait (BATCH_MAX_WAIT_S) only adds latency.
+
+AdaptiveBatchController is AIMD, the same shape as TCP congestion control:
+
+- grow the batch additively while the queue is filling (or batches come back
+  full) and commits stay under the latency target;
+- cut it multiplicatively as soon as a commit is slow (lock waits, WAL
+  pressure) or a batch rolls back, so the writer backs off fast;
+- shrink the fill wait toward BATCH_MIN_WAIT_S while the stream is idle and
+  let it grow back to BATCH_MAX_WAIT_S when batches fill.
+
+Enabled with BATCH_ADAPTIVE=1; otherwise the consumer keeps its fixed knobs.
+"""
+
+import os
+
+BATCH_ADAPTIVE = os.getenv("BATCH_ADAPTIVE", "0").lower() in ("1", "true")
+BATCH_MIN_EVENTS = int(os.getenv("BATCH_MIN_EVENTS", "20"))
+BATCH_CEILING_EVENTS = int(os.getenv("BATCH_CEILING_EVENTS", "2000"))
+BATCH_MIN_WAIT_S = float(os.getenv("BATCH_MIN_WAIT_S", "0.01"))
+BATCH_TARGET_COMMIT_S = float(os.getenv("BATCH_TARGET_COMMIT_S", "0.2"))
+
+# queue occupancy (depth / maxsize) above which we consider the writer behind
+OCCUPANCY_HIGH = 0.05
+ADDITIVE_STEP = 20
+DECREASE_FACTOR = 0.5
+
+
+class AdaptiveBatchController:
+    def __init__(
+        self,
+        initial_events: int,
+        max_wait_s: float,
+        queue_max: int,
+        min_events: int = BATCH_MIN_EVENTS,
+        ceiling_events: int = BATCH_CEILING_EVENTS,
+        min_wait_s: float = BATCH_MIN_WAIT_S,
+        target_commit_s: float = BATCH_TARGET_COMMIT_S,
+    ):
+        self.min_events = max(1, min_events)
+        self.ceiling_events = max(self.min_events, ceiling_events)
+        self.min_wait_s = min(min_wait_s, max_wait_s)
+        self.max_wait_s_cap = max_wait_s
+        self.target_commit_s = target_commit_s
+        self.queue_max = max(1, queue_max)
+        self._size = min(max(initial_events, self.min_events), self.ceiling_events)
+        self._wait = max_wait_s
+
+    @property
+    def batch_size(self) -> int:
+        return self._size
+
+    @property
+    def max_wait_s(self) -> float:
+        return self._wait
+
+    def observe(self, batch_len: int, txn_s: float, queue_depth: int, failed: bool = False):
+        """Feed back one writer batch: its length, transaction wall time and
+        the queue depth after it was drawn. ``failed`` marks a rollback."""
+        occupancy = queue_depth / self.queue_max
+        full = batch_len >= self._size
+
+        if failed or txn_s > self.target_commit_s:
+            self._size = max(self.min_events, int(self._size * DECREASE_FACTOR))
+        elif occupancy >= OCCUPANCY_HIGH or full:
+            self._size = min(self.ceiling_events, self._size + ADDITIVE_STEP)
+
+        if full or occupancy >= OCCUPANCY_HIGH:
+            self._wait = min(self.max_wait_s_cap, self._wait * 2)
+        elif queue_depth == 0:
+            self._wait = max(self.min_wait_s, self._wait * 0.5)
@@ -4,7 +4,7 @@ import os
 import re
 import unicodedata
 from typing import Optional, List
-from .db import get_conn
+from .db import get_conn_for_did
 from . import timeutil
 
 # --- Config knobs via env vars (CLI can set these) ---
@@ -294,19 +294,26 @@ def evidence_hash_from_signals(text: str, external_links: list, embeds: list, fa
     return hashlib.sha256(j.encode("utf-8")).hexdigest()[:16]
 
 
-def add_claim_history_txn(conn, authorDid: str, text: str, createdAt: str, post_uri: str, post_cid: Optional[str] = None, confidence: Optional[float] = None, provenance: Optional[str] = None, evidence_hash: Optional[str] = None):
-    """Transaction-scoped insert: uses the passed conn, does not commit or close."""
+def claim_history_row(authorDid: str, text: str, createdAt: str, post_uri: str, post_cid: Optional[str] = None, confidence: Optional[float] = None, provenance: Optional[str] = None, evidence_hash: Optional[str] = None) -> tuple:
+    """Build a claim_history row tuple without touching the DB.
+
+    The fingerprint is the expensive part; computing it here lets the ingest
+    parse stage do it off the writer thread (see prepare.py).
+    """
     fp = fingerprint_text(text)
     createdAt = timeutil.to_utc_iso(createdAt)
-    conn.execute(
-        "INSERT INTO claim_history VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-        (authorDid, fp, createdAt, confidence, provenance or "", evidence_hash or "", post_uri, post_cid or "", FP_VERSION),
-    )
-    return fp
+    return (authorDid, fp, createdAt, confidence, provenance or "", evidence_hash or "", post_uri, post_cid or "", FP_VERSION)
+
+
+def add_claim_history_txn(conn, authorDid: str, text: str, createdAt: str, post_uri: str, post_cid: Optional[str] = None, confidence: Optional[float] = None, provenance: Optional[str] = None, evidence_hash: Optional[str] = None):
+    """Transaction-scoped insert: uses the passed conn, does not commit or close."""
+    row = claim_history_row(authorDid, text, createdAt, post_uri, post_cid, confidence, provenance, evidence_hash)
+    conn.execute("INSERT INTO claim_history VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+    return row[1]
 
 
 def add_claim_history(authorDid: str, text: str, createdAt: str, post_uri: str, post_cid: Optional[str] = None, confidence: Optional[float] = None, provenance: Optional[str] = None, evidence_hash: Optional[str] = None):
-    conn = get_conn()
+    conn = get_conn_for_did(authorDid)
     try:
         fp = add_claim_history_txn(conn, authorDid, text, createdAt, post_uri, post_cid, confidence, provenance, evidence_hash)
         conn.commit()
@@ -327,7 +334,7 @@ def evidence_hash_from_raw(raw: dict) -> str:
 
 
 def get_claim_history(authorDid: str, fingerprint: str) -> List[dict]:
-    conn = get_conn()
+    conn = get_conn_for_did(authorDid)
     rows = conn.execute(
         "SELECT authorDid, claim_fingerprint, createdAt, confidence, provenance, evidence_hash, post_uri, post_cid, fingerprint_version FROM claim_history WHERE authorDid = ? AND claim_fingerprint = ? ORDER BY createdAt ASC",
         (authorDid, fingerprint),
@@ -4,18 +4,17 @@ import os
 import pathlib
 import hashlib
 
-from .db import get_conn
+from .db import query_shards
 from .stability import load_items, compute_stability_report, stability_thresholds_from_env, evaluate_stability
 
 
 def quarantine_list(limit: int = 50):
     limit = max(1, min(int(limit), 500))
-    conn = get_conn()
-    rows = conn.execute(
+    rows = query_shards(
         "SELECT emit_id, created_at, emit_mode, emit_status, emit_reason, payload_json FROM quarantine_emits ORDER BY created_at DESC LIMIT ?",
         (limit,),
-    ).fetchall()
-    conn.close()
+    )
+    rows = sorted(rows, key=lambda r: r[1] or "", reverse=True)[:limit]
     out = []
     for r in rows:
         payload = {}
@@ -68,12 +67,10 @@ def main():
     if args.cmd == "quarantine" and args.qcmd == "list":
         quarantine_list(args.limit)
     elif args.cmd == "quarantine" and args.qcmd == "show":
-        conn = get_conn()
-        rows = conn.execute(
+        rows = query_shards(
             "SELECT emit_id, created_at, emit_mode, emit_status, emit_reason, payload_json FROM quarantine_emits WHERE emit_id = ?",
             (args.emit_id,),
-        ).fetchall()
-        conn.close()
+        )
         if not rows:
             print("{}")
             return
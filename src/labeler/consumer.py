@@ -7,7 +7,7 @@ Jetstream docs: https://docs.bsky.app/blog/jetstream
 
 Backported from driftwatch operational patterns:
 - put_nowait to avoid blocking event loop (kills WS pings → reconnect churn)
-- Cursor persistence with 3s rewind on reconnect
+- Cursor persisted in each batch transaction, 3s rewind on reconnect
 - Exponential backoff with jitter
 - STATS heartbeat line
 - Signal handling for graceful shutdown
@@ -20,12 +20,19 @@ import logging
 import random
 import signal
 import time
-from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from typing import Optional
 import websockets
-from .db import insert_event, insert_edges, insert_event_txn, insert_edges_txn, init_db, upsert_cursor, get_cursor, get_conn
-from .extractor import extract_edges_from_event
-from . import timeutil
+from .db import DATA_DIR, SHARD_COUNT, SHARD_ID, apply_tombstones_txn, insert_events_batch, insert_edges_txn, init_db, upsert_cursor_txn, get_cursor, get_conn
+from .frames import decode_frame, get_decompressor
+from .prepare import PreparedEvent, dumps_prepared, loads_spilled, prepare_event, prepare_frames
+from .batching import AdaptiveBatchController, BATCH_ADAPTIVE
+from .spill import INGEST_OVERFLOW, SPILL_DIR, SpillQueue
+from .replay import REPLAY_RECORD_DIR, FrameRecorder
+from .coverage import CoverageTracker, load_open_window, register as register_coverage
+from .maintenance import MAINT_MAX_BACKLOG, MAINT_PREEMPT_BACKLOG, default_scheduler, schedule_migrations
+from . import metrics, stagetiming
 
 LOG = logging.getLogger("labeler.consumer")
 
@@ -39,32 +46,54 @@ WANTED_COLLECTIONS = os.getenv(
     "app.bsky.feed.post,app.bsky.feed.repost",
 ).split(",")
 
-CURSOR_SAVE_INTERVAL = int(os.getenv("CURSOR_SAVE_INTERVAL", "500"))
+# zstd-compressed subscription (Jetstream `compress=true`). Frames arrive as
+# binary zstd against Jetstream's shared dictionary, roughly halving bandwidth.
+# Needs the zstandard package and a local copy of the dictionary file.
+JETSTREAM_COMPRESS = os.getenv("JETSTREAM_COMPRESS", "0").lower() in ("1", "true")
+JETSTREAM_ZSTD_DICT = os.getenv("JETSTREAM_ZSTD_DICT", "")
+
 STATS_INTERVAL_S = int(os.getenv("CONSUMER_STATS_INTERVAL", "60"))
 RECONNECT_BASE_S = 5
 RECONNECT_MAX_S = 60
 CURSOR_REWIND_US = 3_000_000  # 3s rewind on reconnect per Jetstream docs
 QUEUE_MAX = 5000
+# With INGEST_OVERFLOW=spill (see spill.py), replay from the spill only once
+# the in-memory queue is at most this full, so replay can't itself overflow it.
+SPILL_REFILL_BELOW = QUEUE_MAX // 2
 
 # Batched-write knobs: drain up to N events per writer transaction, or wait at
-# most M seconds for the batch to fill. One commit per batch.
+# most M seconds for the batch to fill. One commit per batch. With
+# BATCH_ADAPTIVE=1 these are the starting point and upper wait bound for the
+# AIMD controller in batching.py instead of fixed values.
 # A naive per-event commit cadence (the obvious shape) self-sheds under real
 # firehose load — see docs/INGEST_INVARIANTS.md.
 BATCH_MAX_EVENTS = int(os.getenv("BATCH_MAX_EVENTS", "100"))
 BATCH_MAX_WAIT_S = float(os.getenv("BATCH_MAX_WAIT_S", "0.25"))
 
 # Writer-owned WAL truncate. The persistent writer thread calls
-# wal_checkpoint(TRUNCATE) on its own connection right after a successful
-# commit — that's the cleanest moment to attempt a WAL restart, since the
-# writer just released its frame and is least likely to be racing readers
-# (auto-checkpoint at 1000 frames is PASSIVE only and never truncates).
-# Rate-limited so per-batch overhead is bounded. See INGEST_INVARIANTS
-# section 6 for the bucket-vocabulary doctrine that motivates this.
+# wal_checkpoint(TRUNCATE) on its own connection as a maintenance job
+# (maintenance.CheckpointJob) every WAL_TRUNCATE_INTERVAL_S, in a gap between
+# batches — the writer has just released its frame and is least likely to be
+# racing readers (auto-checkpoint at 1000 frames is PASSIVE only and never
+# truncates). See INGEST_INVARIANTS section 6 for the bucket-vocabulary
+# doctrine that motivates this.
 WAL_TRUNCATE_INTERVAL_S = float(os.getenv("WAL_TRUNCATE_INTERVAL_S", "30"))
 
-
-def _build_ws_url(base_url: str, cursor: Optional[str] = None) -> str:
-    """Append wantedCollections and optional cursor to the Jetstream URL."""
+# Parse stage. With PARSE_WORKERS=0 (default) frames are decoded on the event
+# loop and serialized/fingerprinted on the writer thread, as before. With N>0
+# raw frames are shipped in chunks to an N-process pool that returns
+# PreparedEvents, leaving the writer thread nothing but executes and one
+# commit per batch. Chunks flush at PARSE_CHUNK_SIZE frames or after
+# PARSE_CHUNK_MAX_WAIT_S. At most PARSE_MAX_INFLIGHT chunks may be in the pool;
+# beyond that frames are shed into the `dropped` counter, same as QueueFull.
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0"))
+PARSE_CHUNK_SIZE = int(os.getenv("PARSE_CHUNK_SIZE", "64"))
+PARSE_CHUNK_MAX_WAIT_S = float(os.getenv("PARSE_CHUNK_MAX_WAIT_S", "0.05"))
+PARSE_MAX_INFLIGHT = int(os.getenv("PARSE_MAX_INFLIGHT", "0")) or max(1, PARSE_WORKERS * 4)
+
+
+def _build_ws_url(base_url: str, cursor: Optional[str] = None, compress: bool = False) -> str:
+    """Append wantedCollections, optional cursor and compression to the Jetstream URL."""
     params = []
     for col in WANTED_COLLECTIONS:
         col = col.strip()
@@ -72,109 +101,32 @@ def _build_ws_url(base_url: str, cursor: Optional[str] = None) -> str:
             params.append(f"wantedCollections={col}")
     if cursor:
         params.append(f"cursor={cursor}")
+    if compress:
+        params.append("compress=true")
     if params:
         sep = "&" if "?" in base_url else "?"
         return base_url + sep + "&".join(params)
     return base_url
 
 
-def _jetstream_to_event(js: dict) -> Optional[dict]:
-    """Transform a Jetstream commit event into the canonical event dict
-    that the rest of the pipeline (insert_event, extract_edges, claims) expects.
-
-    Returns None for events we don't care about (identity, account, deletes).
-    """
-    if js.get("kind") != "commit":
-        return None
-
-    commit = js.get("commit", {})
-    operation = commit.get("operation")
-
-    # We only ingest creates and updates, not deletes
-    if operation not in ("create", "update"):
-        return None
-
-    did = js.get("did", "")
-    collection = commit.get("collection", "")
-    rkey = commit.get("rkey", "")
-    cid = commit.get("cid", "")
-    record = commit.get("record", {})
-
-    # Build AT URI: at://{did}/{collection}/{rkey}
-    uri = f"at://{did}/{collection}/{rkey}"
-
-    # Convert Jetstream time_us (microseconds) to ISO timestamp
-    time_us = js.get("time_us")
-    if time_us:
-        ctime = timeutil.to_utc_iso(time_us / 1_000_000)
-    else:
-        ctime = timeutil.now_utc().isoformat()
-
-    if collection == "app.bsky.feed.post":
-        # Extract reply pointers
-        reply = record.get("reply", {})
-        reply_parent = reply.get("parent", {}) if reply else {}
-        reply_root = reply.get("root", {}) if reply else {}
-
-        # Extract external links from embeds
-        external_links = []
-        embed = record.get("embed", {})
-        if embed:
-            ext = embed.get("external", {})
-            if ext and ext.get("uri"):
-                external_links.append(ext["uri"])
-            media = embed.get("media", {})
-            if media:
-                ext2 = media.get("external", {})
-                if ext2 and ext2.get("uri"):
-                    external_links.append(ext2["uri"])
-
-        return {
-            "uri": uri,
-            "cid": cid,
-            "text": record.get("text", ""),
-            "author": did,
-            "authorDid": did,
-            "time": ctime,
-            "createdAt": record.get("createdAt", ctime),
-            "replyParentUri": reply_parent.get("uri"),
-            "replyRootUri": reply_root.get("uri"),
-            "facets": record.get("facets", []),
-            "embeds": [embed] if embed else [],
-            "externalLinks": external_links,
-            "record": record,
-            "_collection": collection,
-            "_operation": operation,
-        }
-
-    elif collection == "app.bsky.feed.repost":
-        subject = record.get("subject", {})
-        return {
-            "uri": uri,
-            "cid": cid,
-            "text": "",
-            "author": did,
-            "authorDid": did,
-            "time": ctime,
-            "createdAt": record.get("createdAt", ctime),
-            "replyParentUri": None,
-            "replyRootUri": None,
-            "facets": [],
-            "embeds": [],
-            "externalLinks": [],
-            "record": record,
-            "type": "repost",
-            "subject": subject,
-            "_collection": collection,
-            "_operation": operation,
-        }
-
-    return None
-
-
 class ATProtoConsumer:
-    def __init__(self, ws_url: Optional[str] = None):
+    def __init__(
+        self,
+        ws_url: Optional[str] = None,
+        parse_workers: Optional[int] = None,
+        compress: Optional[bool] = None,
+        zstd_dict_path: Optional[str] = None,
+    ):
+        if SHARD_COUNT > 1 and SHARD_ID is None:
+            raise ValueError("SHARD_COUNT > 1 requires SHARD_ID for each consumer process")
+        # (shard_id, shard_count) when sharded: frames for other shards'
+        # DIDs are dropped at decode, and the cursor row is per shard.
+        self._shard = (SHARD_ID, SHARD_COUNT) if SHARD_COUNT > 1 else None
+        self._cursor_name = f"{CONSUMER_NAME}-shard{SHARD_ID}" if self._shard else CONSUMER_NAME
         self.ws_url = ws_url or JETSTREAM_WS
+        self._compress = JETSTREAM_COMPRESS if compress is None else compress
+        self._zstd_dict_path = zstd_dict_path or JETSTREAM_ZSTD_DICT
+        self._decompressor = None  # loaded in run() when compressing
         self._stop = False
         self._ws = None
         self._last_cursor: Optional[str] = None
@@ -183,6 +135,7 @@ class ATProtoConsumer:
         self._msgs = 0
         self._inserts = 0
         self._updates = 0
+        self._deletes = 0
         self._errors = 0
         self._dropped = 0
         self._reconnects = 0
@@ -195,7 +148,27 @@ class ATProtoConsumer:
             max_workers=1, thread_name_prefix="lbl-writer"
         )
         self._writer_conn = None  # lazily opened inside the writer thread
-        self._last_wal_truncate_mono = 0.0  # writer thread only
+        # Wall time of the last writer transaction. Set on the writer thread,
+        # read on the loop only after that batch's future has resolved.
+        self._last_txn_s = 0.0
+        self._batcher: Optional[AdaptiveBatchController] = (
+            AdaptiveBatchController(BATCH_MAX_EVENTS, BATCH_MAX_WAIT_S, QUEUE_MAX)
+            if BATCH_ADAPTIVE else None
+        )
+        # Retention, WAL truncate, expiry and ANALYZE run as preemptible
+        # slices on the writer thread between batches (see maintenance.py).
+        self._maint = default_scheduler(WAL_TRUNCATE_INTERVAL_S)
+        self._maint_ran_last = False  # event loop only
+        # Intake coverage / platform_health, fed after every batch. Markers
+        # for degraded windows are written in the batch transaction.
+        self._coverage = CoverageTracker(self._cursor_name)
+        register_coverage(self._coverage)
+        self._committed_cursor_us: Optional[int] = None  # set on writer thread
+        # Sampled stage timing (stagetiming.py): frames on the loop, batches
+        # on the writer thread, events stamped at enqueue.
+        self._frame_sampler = stagetiming.Sampler()
+        self._event_sampler = stagetiming.Sampler()
+        self._batch_sampler = stagetiming.Sampler()
         # Counts events shed by the writer when a batch hits a write-lock
         # conflict (e.g. retention or another connection holding the lock)
         # and rolls back. Tracked alongside _dropped so a future health
@@ -203,6 +176,21 @@ class ATProtoConsumer:
         # recovery flag must not hide lock-conflict shedding (see
         # INGEST_INVARIANTS section 6).
         self._rollback_lost = 0  # main thread only
+        # Parse stage (see PARSE_WORKERS). The pool is started in run() so
+        # constructing a consumer never forks.
+        self._parse_workers = PARSE_WORKERS if parse_workers is None else parse_workers
+        self._parse_executor: Optional[ProcessPoolExecutor] = None
+        self._frame_buf = []
+        # Futures for in-flight chunks, awaited in submission order so events
+        # reach the writer in arrival order (a create must precede its update).
+        self._parse_chunks: asyncio.Queue = asyncio.Queue(
+            maxsize=PARSE_MAX_INFLIGHT
+        )
+        # Disk overflow for the event queue (INGEST_OVERFLOW=spill); opened
+        # in run(). Event loop only.
+        self._spill: Optional[SpillQueue] = None
+        # Raw-frame recorder (REPLAY_RECORD_DIR, see replay.py); opened in run().
+        self._recorder: Optional[FrameRecorder] = None
 
     def _get_writer_conn(self):
         """Return the persistent writer connection, opening it on first call.
@@ -219,67 +207,132 @@ class ATProtoConsumer:
         One transaction, one commit per batch. On any exception, rolls back
         the entire batch — we'd rather lose a batch than half-write it.
 
-        Returns (written, inserted_delta, updated_delta, lost). ``lost`` is
-        non-zero only when the batch failed; it must count against intake
-        health so a recovery gate can't hide lock-conflict shedding.
+        Deletes are collected and applied together at the end of the batch
+        (db.apply_tombstones_txn), after the batch's creates and updates. The
+        cursor — the highest time_us in the batch — is upserted in the same
+        transaction, so a restart resumes exactly after committed data.
+
+        Returns (written, inserted_delta, updated_delta, deleted_delta, lost).
+        ``lost`` is non-zero only when the batch failed; it must count against
+        intake health so a recovery gate can't hide lock-conflict shedding.
         """
         if not batch:
-            return (0, 0, 0, 0)
+            return (0, 0, 0, 0, 0)
         conn = self._get_writer_conn()
+        markers = []
         inserted_delta = 0
         updated_delta = 0
+        deleted_delta = 0
+        tombstones = []
+        upserts = []
+        cursor_us = None
+        t0 = time.monotonic()
+        # Stage timing (stagetiming.py): every stage of a sampled batch, and
+        # queue_wait/e2e for the sampled events stamped at enqueue.
+        tm = {} if self._batch_sampler.hit() else None
+        stamps = []
         try:
-            for ev in batch:
-                event_uri = ev["uri"]
-                author = ev.get("authorDid") or ev.get("author")
-                ctime = ev.get("createdAt") or ev.get("time")
-                inserted, updated = insert_event_txn(conn, event_uri, ctime, author, ev)
+            for item in batch:
+                t_enq = stagetiming.enqueued_at(item)
+                if t_enq is not None:
+                    stamps.append(t_enq)
+                if tm is not None:
+                    ts = time.perf_counter()
+                # Events from the parse pool arrive prepared, and spilled
+                # ones come back from the spill as their serialized prepared
+                # rows (prepare.dumps_prepared); inline-parsed ones are
+                # prepared here on the writer thread.
+                if isinstance(item, PreparedEvent):
+                    prep = item
+                else:
+                    prep = loads_spilled(item) if isinstance(item, bytes) else prepare_event(item)
+                    if tm is not None:
+                        ts = stagetiming.add(tm, "prepare", ts)
+                if prep.time_us is not None and (cursor_us is None or prep.time_us > cursor_us):
+                    cursor_us = prep.time_us
+                if prep.deleted:
+                    tombstones.append(prep)
+                else:
+                    upserts.append(prep)
+            # Set-based writes: one lookup and a few executemany calls for
+            # the whole batch (db.insert_events_batch), then all its edges.
+            if tm is not None:
+                ts = time.perf_counter()
+            for inserted, updated in insert_events_batch(conn, upserts, tm):
                 if inserted:
                     inserted_delta += 1
                 if updated:
                     updated_delta += 1
-                edges = extract_edges_from_event(ev)
-                insert_edges_txn(conn, edges)
+            if tm is not None:
+                ts = stagetiming.add(tm, "insert", ts)
+            insert_edges_txn(conn, [e for prep in upserts for e in prep.edges])
+            if tm is not None:
+                ts = stagetiming.add(tm, "edges", ts)
+            if tombstones:
+                deleted_delta = apply_tombstones_txn(conn, tombstones)
+                if tm is not None:
+                    ts = stagetiming.add(tm, "tombstones", ts)
+            if cursor_us is not None:
+                upsert_cursor_txn(conn, self._cursor_name, str(cursor_us))
+            markers = self._coverage.write_markers_txn(conn)
             conn.commit()
-            self._maybe_wal_truncate(conn)
-            return (len(batch), inserted_delta, updated_delta, 0)
+            if tm is not None:
+                stagetiming.add(tm, "commit", ts)
+                # "insert" was timed around the claim insert as well
+                tm["insert"] = tm.get("insert", 0.0) - tm.get("claim", 0.0)
+                stagetiming.STATS.observe_all(tm)
+            if cursor_us is not None:
+                self._committed_cursor_us = cursor_us
+            t_commit = time.monotonic()
+            self._last_txn_s = t_commit - t0
+            for t_enq in stamps:
+                stagetiming.STATS.observe("queue_wait", t0 - t_enq)
+                stagetiming.STATS.observe("e2e", t_commit - t_enq)
+            return (len(batch), inserted_delta, updated_delta, deleted_delta, 0)
         except Exception:
             try:
                 conn.rollback()
             except Exception:
                 LOG.exception("rollback failed after batch error")
+            self._coverage.restore_markers(markers)
+            self._last_txn_s = time.monotonic() - t0
             LOG.exception("batch failed; rolled back %d events", len(batch))
-            return (0, 0, 0, len(batch))
-
-    def _maybe_wal_truncate(self, conn):
-        """Attempt PRAGMA wal_checkpoint(TRUNCATE) from the writer thread.
+            return (0, 0, 0, 0, len(batch))
 
-        Called only from inside _process_batch after a successful commit —
-        the writer just released its frame, the least racy moment to
-        attempt a WAL restart. Auto-checkpoint at 1000 frames is PASSIVE
-        only (frames flush to main DB but the WAL file itself never
-        shrinks); without an explicit TRUNCATE the WAL grows to its
-        high-water mark and stays. Rate-limited so the cost is bounded.
+    def _run_maintenance(self, preemptible=True):
+        """One maintenance slice on the writer thread (see maintenance.py).
 
-        Logs only when the result is interesting (busy or non-trivial work
-        done); silent on the typical no-op case.
+        A preemptible slice's running step is interrupted and rolled back if
+        the event queue grows past MAINT_PREEMPT_BACKLOG meanwhile.
         """
-        now = time.monotonic()
-        if now - self._last_wal_truncate_mono < WAL_TRUNCATE_INTERVAL_S:
-            return
-        self._last_wal_truncate_mono = now
-        try:
-            row = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
-            if not row:
-                return
-            busy, log, ckpt = row
-            if busy or log >= 1000:
-                LOG.info(
-                    "wal_truncate: busy=%d log=%d checkpointed=%d",
-                    busy, log, ckpt,
-                )
-        except Exception:
-            LOG.debug("wal_truncate failed", exc_info=True)
+        conn = self._get_writer_conn()
+        should_yield = None
+        if preemptible:
+            should_yield = lambda: self._event_queue.qsize() > MAINT_PREEMPT_BACKLOG  # noqa: E731
+        return self._maint.run_slice(conn, should_yield=should_yield)
+
+    def _maintenance_turn(self) -> Optional[str]:
+        """Decide whether the next writer job is a maintenance slice.
+
+        Ingest goes first: a slice runs only with an empty queue, or with at
+        most MAINT_MAX_BACKLOG queued events when the previous writer job was
+        a batch (so slices and batches alternate). Anything else is a
+        deferral, until the head job has waited past MAINT_STARVE_S and gets
+        one non-preemptible slice. Returns None (run ingest), "slice" or
+        "forced".
+        """
+        if not self._maint.has_work():
+            return None
+        backlog = self._event_queue.qsize()
+        if backlog == 0:
+            return "slice"
+        if backlog <= MAINT_MAX_BACKLOG and not self._maint_ran_last:
+            return "slice"
+        if self._maint.starved():
+            return "forced"
+        if backlog > MAINT_MAX_BACKLOG:
+            self._maint.defer()
+        return None
 
     async def _drain_queue(self):
         """Background task: drain event queue in batches without blocking WS read.
@@ -287,12 +340,13 @@ class ATProtoConsumer:
         Pulls up to BATCH_MAX_EVENTS (or BATCH_MAX_WAIT_S, whichever first)
         and hands the whole batch to the dedicated writer thread, which runs
         one transaction with one commit. Per-event SQLite connection churn
-        and per-event fsync barriers were the bottleneck pre-fix.
+        and per-event fsync barriers were the bottleneck pre-fix. With
+        BATCH_ADAPTIVE=1 both limits come from the AIMD controller, fed back
+        after every batch.
         """
         from .preflight import is_disk_pressure
         loop = asyncio.get_running_loop()
         _brake_logged = False
-        events_since_cursor_save = 0
 
         while not self._stop:
             # Disk pressure brake
@@ -306,19 +360,42 @@ class ATProtoConsumer:
                 LOG.info("DISK PRESSURE: cleared, resuming")
                 _brake_logged = False
 
+            self._refill_from_spill()
+
+            turn = self._maintenance_turn()
+            if turn is not None:
+                try:
+                    await loop.run_in_executor(
+                        self._writer_executor, self._run_maintenance, turn == "slice"
+                    )
+                except Exception:
+                    LOG.exception("maintenance slice failed")
+                self._maint_ran_last = True
+                continue
+            self._maint_ran_last = False
+
             # Build a batch: first event blocks (with sane timeout); subsequent
             # events are pulled non-blockingly until cap or short-wait deadline.
             batch = []
             try:
-                first = await asyncio.wait_for(self._event_queue.get(), timeout=5.0)
+                # wake up in time for the next due maintenance job
+                due = self._maint.seconds_until_due()
+                timeout = 5.0 if due is None else min(5.0, max(0.05, due))
+                first = await asyncio.wait_for(self._event_queue.get(), timeout=timeout)
                 batch.append(first)
             except asyncio.TimeoutError:
+                self._update_coverage()
                 continue
             except asyncio.CancelledError:
                 break
 
-            deadline = loop.time() + BATCH_MAX_WAIT_S
-            while len(batch) < BATCH_MAX_EVENTS:
+            if self._batcher is not None:
+                max_events = self._batcher.batch_size
+                max_wait = self._batcher.max_wait_s
+            else:
+                max_events, max_wait = BATCH_MAX_EVENTS, BATCH_MAX_WAIT_S
+            deadline = loop.time() + max_wait
+            while len(batch) < max_events:
                 remaining = deadline - loop.time()
                 if remaining <= 0:
                     break
@@ -338,13 +415,23 @@ class ATProtoConsumer:
                         break
 
             try:
-                written, inserted_delta, updated_delta, lost = await loop.run_in_executor(
+                written, inserted_delta, updated_delta, deleted_delta, lost = await loop.run_in_executor(
                     self._writer_executor, self._process_batch, batch
                 )
             except Exception:
                 self._errors += 1
                 LOG.exception("failed to process batch")
-                written, inserted_delta, updated_delta, lost = 0, 0, 0, 0
+                written, inserted_delta, updated_delta, deleted_delta, lost = 0, 0, 0, 0, 0
+
+            backlog = self._event_queue.qsize()
+            metrics.INGEST_COMMIT_LATENCY.observe(self._last_txn_s)
+            metrics.INGEST_QUEUE_OCCUPANCY.set(backlog / QUEUE_MAX)
+            if self._batcher is not None:
+                self._batcher.observe(len(batch), self._last_txn_s, backlog, failed=bool(lost))
+                max_events = self._batcher.batch_size
+                max_wait = self._batcher.max_wait_s
+            metrics.INGEST_BATCH_SIZE.set(max_events)
+            metrics.INGEST_BATCH_WAIT.set(max_wait)
 
             if lost:
                 # Database-locked rollbacks are intake loss — surface them
@@ -355,17 +442,74 @@ class ATProtoConsumer:
                 self._msgs += written
                 self._inserts += inserted_delta
                 self._updates += updated_delta
-                events_since_cursor_save += written
+                self._deletes += deleted_delta
+            self._update_coverage()
+
+    def _update_coverage(self):
+        self._coverage.update(
+            self._msgs, self._dropped, self._rollback_lost,
+            backlog=self._event_queue.qsize(), queue_max=QUEUE_MAX,
+            cursor_us=self._committed_cursor_us,
+        )
 
-                # Periodic cursor save (after a successful commit)
-                if events_since_cursor_save >= CURSOR_SAVE_INTERVAL and self._last_cursor:
-                    try:
-                        await loop.run_in_executor(
-                            None, upsert_cursor, CONSUMER_NAME, self._last_cursor
-                        )
-                        events_since_cursor_save = 0
-                    except Exception:
-                        LOG.exception("failed to save cursor")
+    def _refill_from_spill(self):
+        """Move spilled events back into the queue once it has headroom.
+
+        Payloads stay serialized; the writer thread decodes them, so replay
+        costs the event loop only a sequential file read.
+        """
+        spill = self._spill
+        if spill is None or not spill.depth:
+            return
+        qsize = self._event_queue.qsize()
+        if qsize > SPILL_REFILL_BELOW:
+            return
+        for payload in spill.read(QUEUE_MAX - qsize):
+            self._event_queue.put_nowait(payload)
+        self._export_spill_metrics()
+
+    def _export_spill_metrics(self):
+        spill = self._spill
+        metrics.INGEST_SPILL_DEPTH.set(spill.depth)
+        metrics.INGEST_SPILL_BYTES.set(spill.bytes)
+        metrics.INGEST_SPILL_AGE.set(spill.age_s())
+
+    def _enqueue(self, ev):
+        """Non-blocking put — never block the event loop (which kills WS
+        pings → reconnect churn). On overflow, spill to disk if enabled,
+        otherwise shed into ``dropped``."""
+        if self._event_sampler.hit():
+            stagetiming.stamp(ev)
+        spill = self._spill
+        if spill is not None and spill.depth:
+            # Already spilling: queue behind the spill to keep arrival order.
+            self._spill_event(ev)
+            return
+        try:
+            self._event_queue.put_nowait(ev)
+        except asyncio.QueueFull:
+            if spill is not None:
+                self._spill_event(ev)
+            else:
+                self._dropped += 1
+
+    def _spill_event(self, ev):
+        if isinstance(ev, PreparedEvent):
+            # the prepared rows, stream position included, so replay neither
+            # prepares again on the writer nor loses the cursor
+            payload = dumps_prepared(ev)
+        elif isinstance(ev, bytes):
+            payload = ev
+        else:
+            ev.pop(stagetiming.ENQ_KEY, None)  # a replayed event's wait isn't queue wait
+            payload = json.dumps(ev).encode("utf-8")
+        try:
+            ok = self._spill.append(payload)
+        except OSError:
+            LOG.exception("spill append failed")
+            ok = False
+        if not ok:
+            self._dropped += 1
 
     async def _stats_loop(self):
         """Emit periodic STATS line to stderr."""
@@ -373,38 +517,121 @@ class ATProtoConsumer:
             await asyncio.sleep(STATS_INTERVAL_S)
             uptime = int(time.monotonic() - self._started_at)
             backlog = self._event_queue.qsize()
+            batch_cap = self._batcher.batch_size if self._batcher else BATCH_MAX_EVENTS
+            spill_depth = spill_bytes = 0
+            spill_age = 0.0
+            if self._spill is not None:
+                spill_depth, spill_bytes = self._spill.depth, self._spill.bytes
+                spill_age = self._spill.age_s()
+                self._export_spill_metrics()
+            maint_occ = self._maint.occupancy(reset=True)
+            cov = self._coverage
             LOG.info(
-                "STATS msgs=%d inserts=%d updates=%d errors=%d "
-                "dropped=%d rollback_lost=%d reconnects=%d backlog=%d uptime=%ds",
-                self._msgs, self._inserts, self._updates,
+                "STATS msgs=%d inserts=%d updates=%d deletes=%d errors=%d "
+                "dropped=%d rollback_lost=%d reconnects=%d backlog=%d "
+                "spill_depth=%d spill_bytes=%d spill_age=%.1fs "
+                "batch_cap=%d last_txn_ms=%.1f "
+                "maint_occ=%.3f maint_deferred=%d maint_pending=%s "
+                "drop_frac=%.4f eps=%.1f eps_ewma=%.1f health=%s%s uptime=%ds",
+                self._msgs, self._inserts, self._updates, self._deletes,
                 self._errors, self._dropped, self._rollback_lost,
-                self._reconnects, backlog, uptime,
+                self._reconnects, backlog,
+                spill_depth, spill_bytes, spill_age, batch_cap,
+                self._last_txn_s * 1000,
+                maint_occ, sum(self._maint.deferrals.values()),
+                ",".join(self._maint.pending()) or "-",
+                cov.drop_frac(), cov.events_per_sec(), cov.ewma_eps or 0.0,
+                cov.state, "(" + ",".join(cov.reasons) + ")" if cov.reasons else "",
+                uptime,
             )
+            LOG.info("STATS stages_ms(mean/max) %s", stagetiming.STATS.summary(reset=True))
+
+    async def _handle_message(self, raw):
+        if self._recorder is not None:
+            self._recorder.write(raw)
+
+        if self._parse_executor is not None:
+            # compressed frames are decompressed by the parse workers
+            self._frame_buf.append(raw)
+            if len(self._frame_buf) >= PARSE_CHUNK_SIZE:
+                self._flush_frames()
+            return
 
-    async def _handle_message(self, raw: str):
+        if self._decompressor is not None:
+            try:
+                raw = self._decompressor.decompress(raw)
+            except Exception:
+                self._errors += 1
+                LOG.warning("failed to decompress frame, skipping")
+                return
+
+        timed = self._frame_sampler.hit()
+        if timed:
+            t_parse = time.perf_counter()
         try:
-            js = json.loads(raw)
+            # Identity/account/delete frames are recognized from the raw
+            # bytes and only yield a cursor; see frames.prefilter_frame.
+            time_us, ev = decode_frame(raw, shard=self._shard)
         except Exception:
             self._errors += 1
             LOG.warning("failed to parse JSON message, skipping")
             return
 
+        if timed:
+            stagetiming.STATS.observe("parse", time.perf_counter() - t_parse)
+
         # Track cursor from every message (not just commits)
-        time_us = js.get("time_us")
         if time_us:
-            self._last_cursor = str(time_us)
+            self._last_cursor = time_us
 
-        # Transform to canonical event
-        ev = _jetstream_to_event(js)
         if ev is None:
             return
 
-        # Non-blocking put — drop events when queue is full rather than
-        # blocking the event loop (which kills WS pings → reconnect churn)
-        try:
-            self._event_queue.put_nowait(ev)
-        except asyncio.QueueFull:
-            self._dropped += 1
+        self._enqueue(ev)
+
+    def _flush_frames(self):
+        """Hand the buffered frames to the parse pool as one chunk.
+
+        Never blocks: if PARSE_MAX_INFLIGHT chunks are already in the pool
+        the chunk is shed and counted in ``dropped``.
+        """
+        if not self._frame_buf:
+            return
+        chunk, self._frame_buf = self._frame_buf, []
+        if self._parse_chunks.full():
+            self._dropped += len(chunk)
+            return
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(
+            self._parse_executor, prepare_frames, chunk,
+            self._zstd_dict_path if self._decompressor is not None else None,
+            self._shard,
+        )
+        self._parse_chunks.put_nowait((len(chunk), fut))
+
+    async def _parse_flush_loop(self):
+        """Flush partial chunks so a quiet stream doesn't sit in the buffer."""
+        while not self._stop:
+            await asyncio.sleep(PARSE_CHUNK_MAX_WAIT_S)
+            self._flush_frames()
+
+    async def _collect_parsed(self):
+        """Await parse chunks in submission order and enqueue their events."""
+        while not self._stop:
+            n, fut = await self._parse_chunks.get()
+            try:
+                prepared, cursor, errors = await fut
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._errors += n
+                LOG.exception("parse worker failed on chunk of %d frames", n)
+                continue
+            self._errors += errors
+            if cursor:
+                self._last_cursor = cursor
+            for prep in prepared:
+                self._enqueue(prep)
 
     def _resume_cursor(self) -> Optional[str]:
         """Get cursor for reconnect, rewound 3s for gapless playback."""
@@ -420,12 +647,53 @@ class ATProtoConsumer:
     async def run(self):
         """Connect to Jetstream and process messages with reconnect resilience."""
         init_db()
-        saved_cursor = get_cursor(CONSUMER_NAME)
+        saved_cursor = get_cursor(self._cursor_name)
+        conn = get_conn()
+        try:
+            # a degraded window left open by the previous run stays open
+            self._coverage.resume(load_open_window(conn, self._cursor_name))
+            # index builds init_db left pending run between batches
+            n = schedule_migrations(self._maint, conn)
+            if n:
+                LOG.info("schema: %d online index build(s) queued as maintenance", n)
+        finally:
+            conn.close()
         LOG.info(
-            "starting Jetstream consumer, collections=%s cursor=%s",
+            "starting Jetstream consumer, collections=%s cursor=%s shard=%s",
             WANTED_COLLECTIONS, saved_cursor,
+            "%d/%d" % self._shard if self._shard else "-",
         )
 
+        if self._compress:
+            try:
+                self._decompressor = get_decompressor(self._zstd_dict_path)
+                LOG.info("zstd compression on, dictionary=%s", self._zstd_dict_path)
+            except Exception:
+                # Misconfiguration costs bandwidth, not data: fall back loud.
+                LOG.exception(
+                    "cannot load zstd dictionary %r; subscribing uncompressed",
+                    self._zstd_dict_path,
+                )
+                self._compress = False
+
+        if INGEST_OVERFLOW == "spill":
+            spill_dir = SPILL_DIR or (DATA_DIR / "spill")
+            if self._shard:
+                spill_dir = f"{spill_dir}-shard{SHARD_ID}"
+            self._spill = SpillQueue(spill_dir)
+            if self._spill.depth:
+                LOG.info(
+                    "spill: replaying %d events (%d bytes) left by previous run",
+                    self._spill.depth, self._spill.bytes,
+                )
+
+        if REPLAY_RECORD_DIR:
+            record_dir = REPLAY_RECORD_DIR
+            if self._shard:
+                record_dir = f"{record_dir}-shard{SHARD_ID}"
+            self._recorder = FrameRecorder(record_dir)
+            LOG.info("recording raw frames to %s", record_dir)
+
         # Register signal handlers for graceful shutdown
         loop = asyncio.get_running_loop()
         for sig in (signal.SIGTERM, signal.SIGINT):
@@ -434,13 +702,24 @@ class ATProtoConsumer:
         # Start background tasks
         drain_task = asyncio.create_task(self._drain_queue())
         stats_task = asyncio.create_task(self._stats_loop())
+        tasks = [drain_task, stats_task]
+        if self._parse_workers > 0:
+            # spawn, not fork: the parent has a running event loop and a
+            # writer thread, neither of which is safe to fork.
+            self._parse_executor = ProcessPoolExecutor(
+                max_workers=self._parse_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            tasks.append(asyncio.create_task(self._collect_parsed()))
+            tasks.append(asyncio.create_task(self._parse_flush_loop()))
+            LOG.info("parse stage: %d worker processes", self._parse_workers)
 
         backoff = RECONNECT_BASE_S
         try:
             while not self._stop:
                 try:
                     cursor = self._resume_cursor() or saved_cursor
-                    url = _build_ws_url(self.ws_url, cursor=cursor)
+                    url = _build_ws_url(self.ws_url, cursor=cursor, compress=self._compress)
                     async with websockets.connect(
                         url,
                         max_size=10 * 1024 * 1024,
@@ -471,13 +750,16 @@ class ATProtoConsumer:
                     self._ws = None
         finally:
             # Clean up background tasks
-            drain_task.cancel()
-            stats_task.cancel()
-            for t in (drain_task, stats_task):
+            for t in tasks:
+                t.cancel()
+            for t in tasks:
                 try:
                     await t
                 except asyncio.CancelledError:
                     pass
+            if self._parse_executor is not None:
+                self._parse_executor.shutdown(wait=True, cancel_futures=True)
+                self._parse_executor = None
 
             # Close the persistent writer connection from inside the writer
             # thread, then shut the executor down. Order matters: don't
@@ -497,17 +779,25 @@ class ATProtoConsumer:
             finally:
                 self._writer_executor.shutdown(wait=True, cancel_futures=False)
 
-            # Commit final cursor
-            if self._last_cursor:
+            if self._recorder is not None:
                 try:
-                    upsert_cursor(CONSUMER_NAME, self._last_cursor)
-                    LOG.info("cursor committed on shutdown: %s", self._last_cursor)
-                except Exception:
-                    LOG.exception("failed to commit cursor on shutdown")
+                    self._recorder.close()
+                except OSError:
+                    LOG.exception("frame recorder close failed")
+
+            # Seal the spill; unreplayed events are picked up on next start.
+            if self._spill is not None:
+                try:
+                    self._spill.close()
+                except OSError:
+                    LOG.exception("spill close failed")
+
+            # No final cursor write: the stored cursor was committed with
+            # the last batch, and anything still queued was not.
             LOG.info(
-                "consumer stopped. msgs=%d inserts=%d updates=%d "
+                "consumer stopped. msgs=%d inserts=%d updates=%d deletes=%d "
                 "errors=%d dropped=%d rollback_lost=%d",
-                self._msgs, self._inserts, self._updates,
+                self._msgs, self._inserts, self._updates, self._deletes,
                 self._errors, self._dropped, self._rollback_lost,
             )
 
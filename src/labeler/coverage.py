@@ -0,0 +1,334 @@
+"""Intake coverage and platform_health (docs/INGEST_INVARIANTS.md §2, §5, §6).
+
+CoverageTracker is fed the consumer's cumulative counters after every writer
+batch and answers "is intake complete right now, and if not, why":
+
+- drop_frac: (dropped + rollback_lost) / offered over a sliding window, where
+  offered = committed + dropped + rollback_lost. Every instrumented shedding
+  bucket counts; a path with no bucket would make the number a lie.
+- events_per_sec over the window, plus an EWMA baseline so an observer can
+  tell "low traffic" from "high loss".
+- platform_health: ``ok`` / ``degraded`` / ``recovering`` with reasons
+  (high_drop_rate, lag_high, consumer_backlog).
+
+A degraded window opens the moment any reason appears and is only closed
+after drop_frac < COVERAGE_RECOVERY_DROP_FRAC with no other reason for the
+whole recovery horizon (24h by default) — a clean snapshot is not a
+recovery. Window start/end markers are persisted to ``degraded_windows`` in
+the writer's own batch transaction, and an open window survives restarts.
+
+Per-batch cost is a few additions: counters land in fixed-width buckets and
+the window sums, EWMA, state machine and gauges are only recomputed when a
+bucket closes.
+
+Env vars:
+  COVERAGE_WINDOW_S            — drop_frac / rate window (default 300)
+  COVERAGE_BUCKET_S            — bucket width (default 10)
+  COVERAGE_EWMA_HALFLIFE_S     — events_per_sec baseline half-life (default 3600)
+  COVERAGE_DROP_FRAC_HIGH      — drop_frac that opens a window (default 0.05)
+  COVERAGE_RECOVERY_DROP_FRAC  — drop_frac the horizon requires (default 0.05)
+  COVERAGE_RECOVERY_HORIZON_S  — clean time needed to close (default 86400)
+  COVERAGE_LAG_HIGH_S          — cursor lag behind wall clock (default 120)
+  COVERAGE_BACKLOG_HIGH        — queue occupancy ratio (default 0.8)
+"""
+
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+from . import metrics, timeutil
+
+LOG = logging.getLogger("labeler.coverage")
+
+COVERAGE_WINDOW_S = float(os.getenv("COVERAGE_WINDOW_S", "300"))
+COVERAGE_BUCKET_S = float(os.getenv("COVERAGE_BUCKET_S", "10"))
+COVERAGE_EWMA_HALFLIFE_S = float(os.getenv("COVERAGE_EWMA_HALFLIFE_S", "3600"))
+COVERAGE_DROP_FRAC_HIGH = float(os.getenv("COVERAGE_DROP_FRAC_HIGH", "0.05"))
+COVERAGE_RECOVERY_DROP_FRAC = float(os.getenv("COVERAGE_RECOVERY_DROP_FRAC", "0.05"))
+COVERAGE_RECOVERY_HORIZON_S = float(os.getenv("COVERAGE_RECOVERY_HORIZON_S", "86400"))
+COVERAGE_LAG_HIGH_S = float(os.getenv("COVERAGE_LAG_HIGH_S", "120"))
+COVERAGE_BACKLOG_HIGH = float(os.getenv("COVERAGE_BACKLOG_HIGH", "0.8"))
+
+OK, DEGRADED, RECOVERING = "ok", "degraded", "recovering"
+_STATE_CODE = {OK: 0, RECOVERING: 1, DEGRADED: 2}
+REASONS = ("high_drop_rate", "lag_high", "consumer_backlog")
+
+# Tracker of the consumer running in this process, if any (see snapshot()).
+_CURRENT: Optional["CoverageTracker"] = None
+
+
+class CoverageTracker:
+    def __init__(
+        self,
+        consumer: str = "",
+        window_s: float = COVERAGE_WINDOW_S,
+        bucket_s: float = COVERAGE_BUCKET_S,
+        ewma_halflife_s: float = COVERAGE_EWMA_HALFLIFE_S,
+        recovery_horizon_s: float = COVERAGE_RECOVERY_HORIZON_S,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.consumer = consumer
+        self.window_s = window_s
+        self.bucket_s = bucket_s
+        self.recovery_horizon_s = recovery_horizon_s
+        # per-bucket EWMA weight for the configured half-life
+        self._alpha = 1.0 - 0.5 ** (bucket_s / ewma_halflife_s) if ewma_halflife_s > 0 else 1.0
+        self._clock = clock
+
+        self._last = None  # last cumulative (committed, lost)
+        # closed buckets: (start_ts, committed, lost); plus running sums
+        self._buckets: deque = deque()
+        self._win_committed = 0
+        self._win_lost = 0
+        self._cur_start = None
+        self._cur_committed = 0
+        self._cur_lost = 0
+
+        self.ewma_eps: Optional[float] = None
+        self.backlog_ratio = 0.0
+        self.cursor_lag_s: Optional[float] = None
+
+        self.state = OK
+        self.reasons: List[str] = []
+        self.window_id: Optional[int] = None  # open degraded_windows row
+        self.degraded_since: Optional[float] = None
+        self.clean_since: Optional[float] = None
+        self.max_drop_frac = 0.0
+        self._markers: list = []
+
+    # -- feeding ----------------------------------------------------------
+
+    def update(self, committed: int, dropped: int, rollback_lost: int,
+               backlog: int = 0, queue_max: int = 1, cursor_us: Optional[int] = None):
+        """Record the consumer's cumulative counters. Cheap; call per batch."""
+        now = self._clock()
+        lost = dropped + rollback_lost
+        if self._last is None:
+            self._last = (committed, lost)
+            self._cur_start = now
+        d_committed = committed - self._last[0]
+        d_lost = lost - self._last[1]
+        self._last = (committed, lost)
+        self.backlog_ratio = backlog / queue_max if queue_max else 0.0
+        if cursor_us:
+            self.cursor_lag_s = max(0.0, now - cursor_us / 1_000_000)
+
+        if now - self._cur_start >= self.bucket_s:
+            self._close_buckets(now)
+        self._cur_committed += d_committed
+        self._cur_lost += d_lost
+
+    def _close_buckets(self, now: float):
+        self._push_bucket(self._cur_start, self._cur_committed, self._cur_lost)
+        self._cur_start += self.bucket_s
+        self._cur_committed = self._cur_lost = 0
+        # Fully idle buckets since then count as zeros; past one window they
+        # would all be evicted anyway, so skip the rest.
+        idle = int((now - self._cur_start) // self.bucket_s)
+        cap = int(self.window_s // self.bucket_s) + 1
+        for _ in range(min(idle, cap)):
+            self._push_bucket(self._cur_start, 0, 0)
+            self._cur_start += self.bucket_s
+        self._cur_start += max(0, idle - cap) * self.bucket_s
+        self._evaluate(now)
+
+    def _push_bucket(self, start: float, committed: int, lost: int):
+        self._buckets.append((start, committed, lost))
+        self._win_committed += committed
+        self._win_lost += lost
+        while self._buckets and self._buckets[0][0] <= start - self.window_s:
+            _, c, l = self._buckets.popleft()
+            self._win_committed -= c
+            self._win_lost -= l
+        rate = committed / self.bucket_s
+        if self.ewma_eps is None:
+            self.ewma_eps = rate
+        else:
+            self.ewma_eps += self._alpha * (rate - self.ewma_eps)
+
+    # -- derived values ---------------------------------------------------
+
+    def drop_frac(self) -> float:
+        offered = self._win_committed + self._win_lost
+        return self._win_lost / offered if offered else 0.0
+
+    def events_per_sec(self) -> float:
+        span = len(self._buckets) * self.bucket_s
+        return self._win_committed / span if span else 0.0
+
+    def current_reasons(self) -> List[str]:
+        reasons = []
+        if self.drop_frac() >= COVERAGE_DROP_FRAC_HIGH:
+            reasons.append("high_drop_rate")
+        if self.cursor_lag_s is not None and self.cursor_lag_s > COVERAGE_LAG_HIGH_S:
+            reasons.append("lag_high")
+        if self.backlog_ratio >= COVERAGE_BACKLOG_HIGH:
+            reasons.append("consumer_backlog")
+        return reasons
+
+    # -- state machine ----------------------------------------------------
+
+    def _evaluate(self, now: float):
+        reasons = self.current_reasons()
+        drop_frac = self.drop_frac()
+        self.reasons = reasons
+        if reasons:
+            if self.state == OK:
+                self.state = DEGRADED
+                self.degraded_since = now
+                self.max_drop_frac = drop_frac
+                self._markers.append(("open", now, list(reasons), drop_frac))
+                LOG.warning("platform_health degraded: %s drop_frac=%.4f", ",".join(reasons), drop_frac)
+            elif self.state == RECOVERING:
+                self.state = DEGRADED
+                LOG.warning("platform_health recovery reset: %s", ",".join(reasons))
+            self.clean_since = None
+            self.max_drop_frac = max(self.max_drop_frac, drop_frac)
+        elif self.state != OK and drop_frac < COVERAGE_RECOVERY_DROP_FRAC:
+            if self.clean_since is None:
+                self.clean_since = now
+                self.state = RECOVERING
+            elif now - self.clean_since >= self.recovery_horizon_s:
+                self._markers.append(("close", now, [], self.max_drop_frac))
+                LOG.info(
+                    "platform_health recovered after %.0fs clean (window opened %s)",
+                    now - self.clean_since, timeutil.to_utc_iso(self.degraded_since),
+                )
+                self.state = OK
+                self.degraded_since = self.clean_since = None
+                self.max_drop_frac = 0.0
+        self._export()
+
+    def _export(self):
+        metrics.COVERAGE_DROP_FRAC.set(self.drop_frac())
+        metrics.COVERAGE_EVENTS_PER_SEC.set(self.events_per_sec())
+        metrics.COVERAGE_EVENTS_PER_SEC_EWMA.set(self.ewma_eps or 0.0)
+        metrics.COVERAGE_CURSOR_LAG.set(self.cursor_lag_s or 0.0)
+        metrics.PLATFORM_HEALTH_STATE.set(_STATE_CODE[self.state])
+        for reason in REASONS:
+            metrics.PLATFORM_HEALTH_REASON.labels(reason=reason).set(1 if reason in self.reasons else 0)
+
+    # -- persistence ------------------------------------------------------
+
+    def resume(self, row):
+        """Re-open a window left open by a previous run (load_open_window).
+
+        Recovery restarts from zero: the clean horizon was not observed.
+        """
+        if row is None:
+            return
+        self.window_id, started_at, reasons, max_drop_frac = row
+        self.state = DEGRADED
+        self.reasons = json.loads(reasons or "[]")
+        self.degraded_since = timeutil.to_utc_datetime(started_at).timestamp()
+        self.max_drop_frac = max_drop_frac or 0.0
+
+    def write_markers_txn(self, conn) -> list:
+        """Persist pending window markers on ``conn``; does not commit.
+
+        Returns the markers written so the caller can hand them back with
+        restore_markers() if its transaction rolls back.
+        """
+        markers, self._markers = self._markers, []
+        for kind, ts, reasons, drop_frac in markers:
+            if kind == "open":
+                cur = conn.execute(
+                    "INSERT INTO degraded_windows (consumer, started_at, reasons, max_drop_frac) "
+                    "VALUES (?, ?, ?, ?)",
+                    (self.consumer, timeutil.to_utc_iso(ts), json.dumps(reasons), drop_frac),
+                )
+                self.window_id = cur.lastrowid
+            elif self.window_id is not None:
+                conn.execute(
+                    "UPDATE degraded_windows SET ended_at = ?, max_drop_frac = ? WHERE id = ?",
+                    (timeutil.to_utc_iso(ts), drop_frac, self.window_id),
+                )
+                self.window_id = None
+        return markers
+
+    def restore_markers(self, markers: list):
+        self._markers[:0] = markers
+
+    def snapshot(self) -> dict:
+        now = self._clock()
+        recovery = None
+        if self.state != OK:
+            remaining = self.recovery_horizon_s
+            if self.clean_since is not None:
+                remaining = max(0.0, self.recovery_horizon_s - (now - self.clean_since))
+            recovery = {
+                "criterion": f"drop_frac < {COVERAGE_RECOVERY_DROP_FRAC} with no other reason",
+                "horizon_s": self.recovery_horizon_s,
+                "clean_since": timeutil.to_utc_iso(self.clean_since) if self.clean_since else None,
+                "remaining_s": round(remaining, 1),
+            }
+        return {
+            "platform_health": self.state,
+            "reasons": list(self.reasons),
+            "drop_frac": round(self.drop_frac(), 5),
+            "window_s": self.window_s,
+            "events_per_sec": round(self.events_per_sec(), 2),
+            "events_per_sec_ewma": round(self.ewma_eps, 2) if self.ewma_eps is not None else None,
+            "cursor_lag_s": round(self.cursor_lag_s, 1) if self.cursor_lag_s is not None else None,
+            "backlog_ratio": round(self.backlog_ratio, 4),
+            "degraded_since": timeutil.to_utc_iso(self.degraded_since) if self.degraded_since else None,
+            "recovery": recovery,
+        }
+
+
+def register(tracker: CoverageTracker):
+    global _CURRENT
+    _CURRENT = tracker
+
+
+def load_open_window(conn, consumer: str):
+    return conn.execute(
+        "SELECT id, started_at, reasons, max_drop_frac FROM degraded_windows "
+        "WHERE consumer = ? AND ended_at IS NULL ORDER BY id DESC LIMIT 1",
+        (consumer,),
+    ).fetchone()
+
+
+def load_windows(recent_windows: int = 5) -> list:
+    """The most recent degraded windows across shards (blocking read)."""
+    from .readpool import query_shards
+
+    rows = query_shards(
+        "SELECT consumer, started_at, ended_at, reasons, max_drop_frac FROM degraded_windows "
+        "ORDER BY started_at DESC LIMIT ?",
+        (recent_windows,),
+    )
+    rows.sort(key=lambda r: r[1] or "", reverse=True)
+    return [
+        {
+            "consumer": r[0], "started_at": r[1], "ended_at": r[2],
+            "reasons": json.loads(r[3] or "[]"), "max_drop_frac": r[4],
+        }
+        for r in rows[:recent_windows]
+    ]
+
+
+def snapshot(recent_windows: int = 5, windows: Optional[list] = None) -> dict:
+    """Coverage for /health/extended.
+
+    Live numbers come from the consumer in this process when there is one;
+    a standalone API only sees the persisted degraded windows, so it reports
+    ``degraded`` while any window is open and ``unknown`` otherwise. The API
+    loads ``windows`` on its read pool and calls this on the event loop,
+    where the live tracker is updated.
+    """
+    if windows is None:
+        windows = load_windows(recent_windows)
+    if _CURRENT is not None:
+        out = _CURRENT.snapshot()
+    else:
+        open_windows = [w for w in windows if w["ended_at"] is None]
+        out = {
+            "platform_health": DEGRADED if open_windows else "unknown",
+            "reasons": sorted({r for w in open_windows for r in w["reasons"]}),
+        }
+    out["degraded_windows"] = windows
+    return out
@@ -1,25 +1,112 @@
+import hashlib
 import json
+import logging
 import os
 import pathlib
 import datetime
 import sqlite3
+import time
 from typing import Optional, Union
 import uuid
 from . import timeutil
+from .rawcodec import decode_raw, load_raw, encoder as raw_encoder
+from .posts import EMPTY_PROJECTION, PROJECTED_COLUMNS
+
+LOG = logging.getLogger("labeler.db")
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 DATA_DIR = ROOT / "data"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+# DID-hash sharding. With SHARD_COUNT > 1, ingest runs as SHARD_COUNT consumer
+# processes; the one started with SHARD_ID=k keeps only frames whose author
+# DID hashes to k and writes everything (events, claim history, labels,
+# cursor) to its own database file, so an author's history is always
+# co-located. Processes without SHARD_ID (the API) read through the router
+# below: point lookups go to the owning shard, listings fan out.
+SHARD_COUNT = max(1, int(os.getenv("SHARD_COUNT", "1")))
+_shard_env = os.getenv("SHARD_ID", "")
+SHARD_ID: Optional[int] = int(_shard_env) if _shard_env else None
+if SHARD_ID is not None and not 0 <= SHARD_ID < SHARD_COUNT:
+    raise ValueError(f"SHARD_ID={SHARD_ID} outside [0, SHARD_COUNT={SHARD_COUNT})")
+
+
+def shard_for_did(did: str, shard_count: Optional[int] = None) -> int:
+    """Map a DID to a shard with jump consistent hashing.
+
+    Growing SHARD_COUNT from n to n+1 moves only ~1/(n+1) of DIDs, and the
+    mapping is stable across processes and Python versions (no hash()).
+    """
+    buckets = shard_count or SHARD_COUNT
+    key = int.from_bytes(hashlib.blake2b(did.encode("utf-8"), digest_size=8).digest(), "big")
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def did_from_uri(uri: str) -> Optional[str]:
+    """Return the repo DID of an at:// URI (or a bare DID), else None."""
+    if not uri:
+        return None
+    if uri.startswith("at://"):
+        uri = uri[5:]
+    did = uri.split("/", 1)[0]
+    return did if did.startswith("did:") else None
+
+
+def shard_ids() -> list:
+    """Shards a router has to consult: every shard, or [None] when unsharded."""
+    return list(range(SHARD_COUNT)) if SHARD_COUNT > 1 else [None]
+
+
+def _db_file(backend_ext: str, shard: Optional[int]) -> pathlib.Path:
+    if shard is None:
+        shard = SHARD_ID
+    if SHARD_COUNT > 1 and shard is not None:
+        return DATA_DIR / f"labeler.shard{shard}.{backend_ext}"
+    return DATA_DIR / f"labeler.{backend_ext}"
+
+
+def get_conn_for_did(did: Optional[str]):
+    """Connection to the shard owning ``did`` (this process's DB if unsharded)."""
+    if SHARD_COUNT > 1 and did:
+        return get_conn(shard_for_did(did))
+    return get_conn()
+
+
+def get_conn_for_uri(uri: Optional[str]):
+    """Connection to the shard owning the author of an at:// URI."""
+    return get_conn_for_did(did_from_uri(uri))
+
+
+def query_shards(sql: str, params: tuple = ()) -> list:
+    """Run a read query on every shard and concatenate the rows.
+
+    Callers merge (sort/limit/sum) the result themselves.
+    """
+    rows = []
+    for shard in shard_ids():
+        conn = get_conn(shard)
+        try:
+            rows.extend(conn.execute(sql, params).fetchall())
+        finally:
+            conn.close()
+    return rows
+
 
-def get_conn():
+def get_conn(shard: Optional[int] = None):
     """Return a DB connection according to DB_BACKEND env var.
 
-    Supported backends: 'sqlite' (default), 'duckdb'.
+    Supported backends: 'sqlite' (default), 'duckdb'. ``shard`` selects a
+    shard database when SHARD_COUNT > 1; by default this process's own
+    (SHARD_ID), or the unsharded database.
     """
     backend = os.getenv("DB_BACKEND", "sqlite").lower()
     if backend == "sqlite":
-        db_path = DATA_DIR / "labeler.sqlite"
+        db_path = _db_file("sqlite", shard)
         conn = sqlite3.connect(str(db_path))
         # WAL mode: concurrent reads + writes, crash-safe
         conn.execute("PRAGMA journal_mode=WAL")
@@ -37,14 +124,14 @@ def get_conn():
             import duckdb
         except Exception:
             raise
-        db_path = DATA_DIR / "labeler.db"
+        db_path = _db_file("db", shard)
         return duckdb.connect(database=str(db_path), read_only=False)
     else:
         raise ValueError(f"Unsupported DB_BACKEND: {backend}")
 
 
-def init_db():
-    conn = get_conn()
+def init_db(shard: Optional[int] = None):
+    conn = get_conn(shard)
     # set pragmatic duckdb options when running on duckdb
     if os.getenv("DB_BACKEND", "sqlite").lower() == "duckdb":
         try:
@@ -86,12 +173,6 @@ def init_db():
         )
         """
     )
-    # ensure older DBs get the column if possible (duckdb: ALTER TABLE ADD COLUMN if not exists not supported everywhere)
-    try:
-        conn.execute("ALTER TABLE labels ADD COLUMN expired_at TIMESTAMP")
-    except Exception:
-        # ignore if column exists or ALTER not supported
-        pass
 
     conn.execute(
         """
@@ -130,11 +211,6 @@ def init_db():
         )
         """
     )
-    # ensure older DBs get the new column if possible
-    try:
-        conn.execute("ALTER TABLE claim_history ADD COLUMN fingerprint_version TEXT")
-    except Exception:
-        pass
 
     # re-check requests queue for threads that need re-evaluation
     conn.execute(
@@ -197,7 +273,34 @@ def init_db():
         "CREATE INDEX IF NOT EXISTS idx_claim_history_created ON claim_history(createdAt)"
     )
 
+    # Degraded-coverage windows (coverage.py): opened when platform_health
+    # leaves ok, closed only after the recovery horizon. Artifacts produced
+    # inside a window were made under sampling loss.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS degraded_windows (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            consumer TEXT,
+            started_at TIMESTAMP,
+            ended_at TIMESTAMP,
+            reasons TEXT,
+            max_drop_frac REAL
+        )
+        """
+    )
+
     conn.commit()
+    # Columns and indexes added since the baseline schema (migrations.py).
+    # Index builds on large tables stay pending for the consumer to run
+    # online; report them so an API-only deployment notices.
+    from . import migrations
+
+    deferred = migrations.migrate(conn)
+    if deferred:
+        LOG.warning(
+            "schema: %d migration(s) pending (online index builds): %s",
+            len(deferred), ", ".join(f"{m.version}:{m.name}" for m in deferred),
+        )
     conn.close()
 
 
@@ -206,55 +309,238 @@ def insert_event_txn(conn, event_uri: str, ctime: Union[str, int, float, datetim
 
     See insert_event() for behavior. Caller is responsible for transaction control.
     """
-    raw_json = json.dumps(raw)
-    ctime_dt = timeutil.to_utc_datetime(ctime)
+    from .prepare import prepare_event
+    return insert_prepared_event_txn(conn, prepare_event(raw, event_uri, ctime, author))
 
-    cur = conn.execute("SELECT raw, ctime FROM events WHERE event_uri = ?", (event_uri,)).fetchall()
-    if not cur:
-        conn.execute(
-            "INSERT INTO events VALUES (?, ?, ?, ?)",
-            (event_uri, ctime_dt.isoformat(), author, raw_json),
-        )
-        # schedule recheck for thread root
-        root = raw.get("replyRootUri") or raw.get("replyParentUri") or event_uri
-        _add_recheck_txn(conn, root)
-        # add claim history entry if this looks like a claim post
-        try:
-            from .claims import add_claim_history_txn, evidence_hash_from_raw
-            text = raw.get("text")
-            if text:
-                evidence_hash = evidence_hash_from_raw(raw)
-                add_claim_history_txn(conn, author, text, ctime_dt.isoformat(), event_uri, raw.get("cid"), None, None, evidence_hash)
-        except Exception:
-            pass
-        return (True, False)
 
-    existing_raw = cur[0][0]
-    if existing_raw != raw_json:
-        now = timeutil.now_utc().isoformat()
+def insert_prepared_event_txn(conn, prep, timings: Optional[dict] = None):
+    """Apply a PreparedEvent (see prepare.py). Uses passed conn, does not commit.
+
+    Only DB work happens here — serialization, fingerprinting and evidence
+    hashing were done when the event was prepared, possibly in a parse worker
+    process. Edges are not written; callers that want them use
+    insert_edges_txn(conn, prep.edges). With ``timings`` (stagetiming), the
+    claim_history insert's wall time is added to timings["claim"].
+
+    Returns a tuple (inserted: bool, updated: bool).
+    """
+    return insert_events_batch(conn, [prep], timings)[0]
+
+
+_INSERT_EVENT = "INSERT INTO events (event_uri, ctime, author, raw, {}) VALUES ({})".format(
+    ", ".join(PROJECTED_COLUMNS), ", ".join("?" * (4 + len(PROJECTED_COLUMNS)))
+)
+_UPDATE_EVENT = "UPDATE events SET raw = ?, ctime = ?, author = ?, {} WHERE event_uri = ?".format(
+    ", ".join(f"{c} = ?" for c in PROJECTED_COLUMNS)
+)
+
+
+def insert_events_batch(conn, events, timings: Optional[dict] = None) -> list:
+    """Apply a batch of PreparedEvents set-wise. Uses passed conn, does not commit.
+
+    Same outcome as calling insert_prepared_event_txn per event in order, in
+    a handful of statements: one ``event_uri IN (...)`` lookup per 500 events
+    (plus one on tombstones for the misses), then executemany for new rows,
+    version rows, updates and claim_history, and one recheck per distinct
+    thread root. Repeats of a URI within the batch are resolved in memory, so
+    a create followed by its edit still yields an insert, then a version row
+    and an update.
+
+    Returns [(inserted, updated), ...] aligned with ``events``.
+    """
+    if not events:
+        return []
+    uris = list(dict.fromkeys(p.event_uri for p in events))
+    current = {}
+    for chunk, marks in _in_chunks(uris):
+        for uri, raw in conn.execute(
+            f"SELECT event_uri, raw FROM events WHERE event_uri IN ({marks})", chunk
+        ).fetchall():
+            current[uri] = decode_raw(raw, conn)
+    missing = [u for u in uris if u not in current]
+    tombstoned = set()
+    for chunk, marks in _in_chunks(missing):
+        tombstoned.update(r[0] for r in conn.execute(
+            f"SELECT event_uri FROM tombstones WHERE event_uri IN ({marks})", chunk
+        ).fetchall())
+
+    now = timeutil.now_utc().isoformat()
+    results = []
+    new_rows, version_rows, update_rows, claim_rows = [], [], [], []
+    roots = {}
+    for prep in events:
+        existing_raw = current.get(prep.event_uri)
+        if existing_raw is None:
+            if prep.event_uri in tombstoned:
+                results.append((False, False))
+                continue
+            new_rows.append((prep.event_uri, prep.ctime, prep.author, prep.raw_json, prep))
+            results.append((True, False))
+        elif existing_raw != prep.raw_json:
+            version_rows.append((prep.event_uri, now, existing_raw))
+            update_rows.append((prep.raw_json, prep.ctime, prep.author, prep.event_uri, prep))
+            results.append((False, True))
+        else:
+            results.append((False, False))
+            continue
+        current[prep.event_uri] = prep.raw_json
+        # schedule recheck for thread root; claim history for claim posts
+        # (on update, a new claim version if the text changed)
+        roots[prep.root_uri] = None
+        if prep.claim_row is not None:
+            claim_rows.append(prep.claim_row)
+
+    # payloads are stored through the RAW_CODEC encoder (rawcodec.py),
+    # with the projected Post columns (posts.py) alongside
+    if new_rows or version_rows:
+        encode = raw_encoder(conn)
+        new_rows = [
+            (u, c, a, encode(raw), *(p.projection or EMPTY_PROJECTION)) for u, c, a, raw, p in new_rows
+        ]
+        version_rows = [(u, ts, encode(raw)) for u, ts, raw in version_rows]
+        update_rows = [
+            (encode(raw), c, a, *(p.projection or EMPTY_PROJECTION), u) for raw, c, a, u, p in update_rows
+        ]
+    # inserts before updates: an event created and edited in the same batch
+    if new_rows:
+        conn.executemany(_INSERT_EVENT, new_rows)
+    if version_rows:
+        conn.executemany("INSERT INTO event_versions VALUES (?, ?, ?)", version_rows)
+        conn.executemany(_UPDATE_EVENT, update_rows)
+    _add_prepared_claims_txn(conn, claim_rows, timings)
+    _add_rechecks_txn(conn, roots)
+    return results
+
+
+# SQLite's default host-parameter limit is 999; stay well under it.
+_IN_CHUNK = 500
+
+
+def _in_chunks(values: list):
+    for i in range(0, len(values), _IN_CHUNK):
+        chunk = values[i:i + _IN_CHUNK]
+        yield chunk, ",".join("?" * len(chunk))
+
+
+def apply_tombstones_txn(conn, tombstones) -> int:
+    """Apply a batch of deletes (PreparedEvents with ``deleted``). Uses passed
+    conn, does not commit.
+
+    Records a tombstone per URI, then purges what the deleted posts left
+    behind with set-based statements over the whole batch: their events and
+    versions, claim_history rows, edges (by event_uri) and active labels and
+    label decisions.
+
+    Edges written before edges.event_uri existed (migration 19) have no post
+    URI. For those the purge re-derives the edges from the stored event and
+    deletes by (src_did, dst_did, type, ctime), which can also remove an
+    identical legacy edge of another post with the same ctime; stored events
+    that cannot be decoded leave their legacy edges behind, and are logged.
+    Each affected thread root that still exists is queued for recheck so
+    thread-level labels are re-evaluated without the deleted post; pending
+    rechecks and evaluation state (thread_eval_state) of deleted roots are
+    dropped.
+
+    Returns the number of stored events removed.
+    """
+    from .extractor import extract_edges_from_event
+
+    if not tombstones:
+        return 0
+    now = timeutil.now_utc().isoformat()
+    conn.executemany(
+        "INSERT OR IGNORE INTO tombstones VALUES (?, ?, ?)",
+        [(t.event_uri, t.author, t.ctime) for t in tombstones],
+    )
+    uris = list(dict.fromkeys(t.event_uri for t in tombstones))
+
+    roots = {}
+    edges = []
+    removed = 0
+    undecodable = 0
+    unqueued = 0
+    for chunk, marks in _in_chunks(uris):
+        for _uri, raw in conn.execute(
+            f"SELECT event_uri, raw FROM events WHERE event_uri IN ({marks})", chunk
+        ).fetchall():
+            removed += 1
+            try:
+                ev = load_raw(raw, conn)
+            except Exception:
+                undecodable += 1
+                continue
+            root = ev.get("replyRootUri") or ev.get("replyParentUri")
+            if root:
+                roots[root] = None
+            edges.extend(extract_edges_from_event(ev))
+
+        conn.execute(f"DELETE FROM edges WHERE event_uri IN ({marks})", chunk)
+        conn.execute(f"DELETE FROM events WHERE event_uri IN ({marks})", chunk)
+        conn.execute(f"DELETE FROM event_versions WHERE event_uri IN ({marks})", chunk)
+        conn.execute(f"DELETE FROM claim_history WHERE post_uri IN ({marks})", chunk)
         conn.execute(
-            "INSERT INTO event_versions VALUES (?, ?, ?)",
-            (event_uri, now, existing_raw),
+            f"UPDATE labels SET expired_at = ? WHERE subject_uri IN ({marks}) AND expired_at IS NULL",
+            [now, *chunk],
         )
         conn.execute(
-            "UPDATE events SET raw = ?, ctime = ?, author = ? WHERE event_uri = ?",
-            (raw_json, ctime_dt.isoformat(), author, event_uri),
+            f"UPDATE label_decisions SET status = 'expired' WHERE subject_uri IN ({marks}) AND status = 'committed'",
+            chunk,
+        )
+        unqueued += conn.execute(f"DELETE FROM recheck_requests WHERE root_uri IN ({marks})", chunk).rowcount
+        conn.execute(f"DELETE FROM thread_eval_state WHERE root_uri IN ({marks})", chunk)
+
+    if edges:
+        conn.executemany(
+            "DELETE FROM edges WHERE src_did = ? AND dst_did = ? AND type = ? AND ctime = ? AND event_uri IS NULL",
+            edges,
         )
-        # schedule recheck for thread root
-        root = raw.get("replyRootUri") or raw.get("replyParentUri") or event_uri
-        _add_recheck_txn(conn, root)
-        # on update, also append new claim history version if text changed
+    if undecodable:
+        LOG.warning("tombstones: %d deleted event(s) could not be decoded; their legacy edges were kept", undecodable)
+    from .recheck_queue import note_removed
+    note_removed(conn, unqueued)
+    deleted = set(uris)
+    _add_rechecks_txn(conn, [r for r in roots if r not in deleted])
+    return removed
+
+
+def _add_prepared_claims_txn(conn, rows: list, timings: Optional[dict] = None):
+    """Insert a batch's claim_history rows. Uses passed conn, does not commit.
+
+    Best-effort, as claim history has always been: a row that fails to
+    insert is dropped (logged, counted in claim_rows_dropped_total) and costs
+    only itself. The rows go in with one executemany inside a savepoint; if
+    that fails, the savepoint is rolled back, so no partial batch remains, and
+    the rows are inserted one at a time.
+    """
+    from . import metrics
+
+    if not rows:
+        return
+    t0 = time.perf_counter() if timings is not None else 0.0
+    sql = "INSERT INTO claim_history VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    pending = rows
+    try:
+        conn.execute("SAVEPOINT claim_rows")
+    except Exception:
+        pass  # no savepoints (duckdb): row by row
+    else:
         try:
-            from .claims import add_claim_history_txn, evidence_hash_from_raw
-            text = raw.get("text")
-            if text:
-                evidence_hash = evidence_hash_from_raw(raw)
-                add_claim_history_txn(conn, author, text, ctime_dt.isoformat(), event_uri, raw.get("cid"), None, None, evidence_hash)
+            conn.executemany(sql, rows)
+            pending = []
         except Exception:
-            pass
-        return (False, True)
-
-    return (False, False)
+            conn.execute("ROLLBACK TO claim_rows")
+        conn.execute("RELEASE claim_rows")
+    dropped = 0
+    for row in pending:
+        try:
+            conn.execute(sql, row)
+        except Exception:
+            dropped += 1
+    if dropped:
+        LOG.warning("claim_history: dropped %d of %d row(s) that failed to insert", dropped, len(rows))
+        metrics.CLAIM_ROWS_DROPPED.inc(dropped)
+    if timings is not None:
+        timings["claim"] = timings.get("claim", 0.0) + (time.perf_counter() - t0)
 
 
 def insert_event(event_uri: str, ctime: Union[str, int, float, datetime.datetime], author: str, raw: dict):
@@ -265,7 +551,7 @@ def insert_event(event_uri: str, ctime: Union[str, int, float, datetime.datetime
 
     Returns a tuple (inserted: bool, updated: bool)
     """
-    conn = get_conn()
+    conn = get_conn_for_did(author)
     try:
         result = insert_event_txn(conn, event_uri, ctime, author, raw)
         conn.commit()
@@ -276,33 +562,27 @@ def insert_event(event_uri: str, ctime: Union[str, int, float, datetime.datetime
 
 def _add_recheck_txn(conn, root_uri: str):
     """Transaction-scoped recheck enqueue. Uses passed conn, does not commit."""
-    now = timeutil.now_utc().isoformat()
-    # Best-effort: enqueue in Redis-backed queue if available; otherwise persist in DB queue
+    _add_rechecks_txn(conn, [root_uri])
+
+
+def _add_rechecks_txn(conn, roots):
+    """Enqueue rechecks for a batch's distinct thread roots in one call.
+
+    Redis-backed queue if available (one pipelined round trip), otherwise one
+    UPSERT executemany into recheck_requests on the passed conn. Does not
+    commit.
+    """
+    roots = list(dict.fromkeys(roots))
+    if not roots:
+        return
+    from .recheck_queue import LocalFallbackQueue, get_queue
     try:
-        from .recheck_queue import get_queue
-        q = get_queue(conn)
-        q.enqueue(root_uri)
+        get_queue(conn).enqueue_many(roots)
         return
     except Exception:
-        # fallback to DB-backed upsert
+        # Redis unreachable: fall back to the DB-backed queue
         pass
-
-    # fallback DB upsert (SQLite-compatible - INSERT OR IGNORE)
-    try:
-        conn.execute(
-            "INSERT OR IGNORE INTO recheck_requests (root_uri, scheduled_at) VALUES (?, ?)",
-            (root_uri, now),
-        )
-    except Exception:
-        # generic fallback for DBs that don't support INSERT OR IGNORE
-        cur = conn.execute("SELECT 1 FROM recheck_requests WHERE root_uri = ?", (root_uri,)).fetchall()
-        if not cur:
-            conn.execute("INSERT INTO recheck_requests (root_uri, scheduled_at) VALUES (?, ?)", (root_uri, now))
-
-    conn.execute(
-        "UPDATE recheck_requests SET scheduled_at = ? WHERE root_uri = ?",
-        (now, root_uri),
-    )
+    LocalFallbackQueue(conn).enqueue_many(roots)
 
 
 def _add_recheck(conn, root_uri: str):
@@ -312,16 +592,21 @@ def _add_recheck(conn, root_uri: str):
 
 
 def insert_edges_txn(conn, edges):
-    """Transaction-scoped edge insert. Uses passed conn, does not commit."""
+    """Transaction-scoped edge insert. Uses passed conn, does not commit.
+
+    Edges are (src, dst, type, ctime, event_uri) tuples, as PreparedEvent
+    carries them; (src, dst, type, ctime) ones are stored without a post URI.
+    """
     if not edges:
         return
     conn.executemany(
-        "INSERT INTO edges VALUES (?, ?, ?, ?)", edges
+        "INSERT INTO edges (src_did, dst_did, type, ctime, event_uri) VALUES (?, ?, ?, ?, ?)",
+        [tuple(e) if len(e) == 5 else (*e, None) for e in edges],
     )
 
 
 def insert_edges(edges):
-    # edges: list of tuples (src, dst, type, ctime)
+    # edges: list of tuples (src, dst, type, ctime[, event_uri])
     if not edges:
         return
     conn = get_conn()
@@ -332,22 +617,26 @@ def insert_edges(edges):
         conn.close()
 
 
+def upsert_cursor_txn(conn, consumer: str, cursor: Optional[str]):
+    """Transaction-scoped cursor save: one UPSERT on the passed conn, no commit.
+
+    The consumer calls this inside its batch transaction, so the stored
+    cursor always matches exactly what has been committed.
+    """
+    conn.execute(
+        "INSERT INTO cursors VALUES (?, ?, ?) "
+        "ON CONFLICT(consumer) DO UPDATE SET cursor = excluded.cursor, updated_at = excluded.updated_at",
+        (consumer, cursor or "", timeutil.now_utc().isoformat()),
+    )
+
+
 def upsert_cursor(consumer: str, cursor: Optional[str]):
     conn = get_conn()
-    now = timeutil.now_utc().isoformat()
-    cur = conn.execute("SELECT 1 FROM cursors WHERE consumer = ?", (consumer,)).fetchall()
-    if cur:
-        conn.execute(
-            "UPDATE cursors SET cursor = ?, updated_at = ? WHERE consumer = ?",
-            (cursor or "", now, consumer),
-        )
-    else:
-        conn.execute(
-            "INSERT INTO cursors VALUES (?, ?, ?)",
-            (consumer, cursor or "", now),
-        )
-    conn.commit()
-    conn.close()
+    try:
+        upsert_cursor_txn(conn, consumer, cursor)
+        conn.commit()
+    finally:
+        conn.close()
 
 
 def get_cursor(consumer: str) -> Optional[str]:
@@ -367,7 +656,7 @@ def insert_label(subject_uri: str, labeler_did: str, label: dict, ctime: Optiona
     """
     from . import metrics
 
-    conn = get_conn()
+    conn = get_conn_for_uri(subject_uri)
     ctime = timeutil.to_utc_iso(ctime)
     label_json = json.dumps(label)
 
@@ -429,30 +718,38 @@ def insert_label(subject_uri: str, labeler_did: str, label: dict, ctime: Optiona
 
 
 def get_unlabeled_subjects(window_hours: int = 24, limit: int = 100) -> list:
-    """Return a list of event URIs that do not yet have labels and are within the time window."""
+    """Return a list of event URIs that do not yet have labels and are within the time window.
+
+    Events and their labels live on the author's shard, so each shard is
+    queried on its own and the newest ``limit`` across shards are returned.
+    """
     cutoff = (timeutil.now_utc() - datetime.timedelta(hours=window_hours)).isoformat()
-    conn = get_conn()
-    rows = conn.execute(
-        "SELECT event_uri FROM events WHERE ctime >= ? AND event_uri NOT IN (SELECT subject_uri FROM labels) ORDER BY ctime DESC LIMIT ?",
+    rows = query_shards(
+        "SELECT event_uri, ctime FROM events WHERE ctime >= ? AND event_uri NOT IN (SELECT subject_uri FROM labels) ORDER BY ctime DESC LIMIT ?",
         (cutoff, limit),
-    ).fetchall()
-    conn.close()
+    )
+    rows = sorted(rows, key=lambda r: r[1] or "", reverse=True)[:limit]
     return [r[0] for r in rows]
 
 
-def get_labels_for_subject(subject_uri: str, include_expired: bool = False) -> list:
-    conn = get_conn()
+def get_labels_for_subject(subject_uri: str, include_expired: bool = False, conn=None) -> list:
+    """Labels on a subject, newest first. A passed ``conn`` (e.g. a pooled
+    read connection) is used as is and left open."""
+    own = conn is None
+    if own:
+        conn = get_conn_for_uri(subject_uri)
     if include_expired:
         rows = conn.execute("SELECT labeler_did, label, ctime, expired_at FROM labels WHERE subject_uri = ? ORDER BY ctime DESC", (subject_uri,)).fetchall()
     else:
         rows = conn.execute("SELECT labeler_did, label, ctime, expired_at FROM labels WHERE subject_uri = ? AND (expired_at IS NULL) ORDER BY ctime DESC", (subject_uri,)).fetchall()
-    conn.close()
+    if own:
+        conn.close()
     return [{"labeler_did": r[0], "label": json.loads(r[1]), "ctime": r[2], "expired_at": r[3]} for r in rows]
 
 
 def expire_label(subject_uri: str, labeler_did: str, label: dict, expired_at: str = None) -> int:
     """Mark a label as expired. Returns number of rows updated."""
-    conn = get_conn()
+    conn = get_conn_for_uri(subject_uri)
     expired_at = timeutil.to_utc_iso(expired_at)
     label_json = json.dumps(label)
     cur = conn.execute(
@@ -489,34 +786,52 @@ def insert_label_decision(
     config_hash: Optional[str],
     status: str = "committed",
 ) -> str:
-    from .claims import FP_VERSION, fingerprint_config_hash
-    decision_id = str(uuid.uuid4())
-    created_at = timeutil.now_utc().isoformat()
-    conn = get_conn()
-    conn.execute(
-        "INSERT INTO label_decisions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-        (
-            decision_id,
-            created_at,
-            subject_uri,
-            root_uri,
-            label_name,
-            rule_id,
-            fingerprint_version or FP_VERSION,
-            json.dumps(inputs or {}),
-            json.dumps(evidence_hashes or []),
-            decision_trace or "",
-            config_hash or fingerprint_config_hash(),
-            status,
-        ),
+    row = _decision_row(
+        subject_uri, root_uri, label_name, rule_id, fingerprint_version,
+        inputs, evidence_hashes, decision_trace, config_hash, status,
     )
+    conn = get_conn_for_uri(subject_uri)
+    conn.execute(_INSERT_DECISION, row)
     conn.commit()
     conn.close()
-    return decision_id
+    return row[0]
+
+
+_INSERT_DECISION = "INSERT INTO label_decisions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+def _decision_row(
+    subject_uri: str,
+    root_uri: Optional[str],
+    label_name: str,
+    rule_id: str,
+    fingerprint_version: Optional[str] = None,
+    inputs: Optional[dict] = None,
+    evidence_hashes: Optional[list] = None,
+    decision_trace: Optional[str] = None,
+    config_hash: Optional[str] = None,
+    status: str = "committed",
+    created_at: Optional[str] = None,
+) -> tuple:
+    from .claims import FP_VERSION, fingerprint_config_hash
+    return (
+        str(uuid.uuid4()),
+        created_at or timeutil.now_utc().isoformat(),
+        subject_uri,
+        root_uri,
+        label_name,
+        rule_id,
+        fingerprint_version or FP_VERSION,
+        json.dumps(inputs or {}),
+        json.dumps(evidence_hashes or []),
+        decision_trace or "",
+        config_hash or fingerprint_config_hash(),
+        status,
+    )
 
 
 def expire_label_decisions(subject_uri: str, label_name: str) -> int:
-    conn = get_conn()
+    conn = get_conn_for_uri(subject_uri)
     cur = conn.execute(
         "UPDATE label_decisions SET status = ? WHERE subject_uri = ? AND label = ? AND status = ?",
         ("expired", subject_uri, label_name, "committed"),
@@ -534,10 +849,116 @@ def expire_label_decisions(subject_uri: str, label_name: str) -> int:
     return count
 
 
+def get_active_labels_txn(conn, subject_uris) -> dict:
+    """Active labels of a batch of subjects on the passed conn:
+    {subject_uri: [(rowid, labeler_did, label dict)]}."""
+    out = {}
+    for chunk, marks in _in_chunks(list(dict.fromkeys(subject_uris))):
+        for rowid, subj, labeler_did, label_json in conn.execute(
+            f"SELECT rowid, subject_uri, labeler_did, label FROM labels"
+            f" WHERE subject_uri IN ({marks}) AND expired_at IS NULL",
+            chunk,
+        ).fetchall():
+            out.setdefault(subj, []).append((rowid, labeler_did, json.loads(label_json)))
+    return out
+
+
+def _label_key(label: dict) -> tuple:
+    return label.get("label"), label.get("rule_id"), label.get("scheduler")
+
+
+def reconcile_labels_txn(conn, labeler_did: str, desired: dict, expire: bool = True) -> tuple:
+    """Bring the labels of a batch of subjects (e.g. every evaluated post of
+    a thread) in line with what the rules now produce. Uses passed conn,
+    does not commit, so the labels and their decision-ledger rows change in
+    the caller's transaction or not at all.
+
+    ``desired`` maps subject_uri -> [(label dict, decision)], where the label
+    dict is stored as the label payload and ``decision`` holds the
+    label_decisions fields for it (root_uri, rule_id, fingerprint_version,
+    inputs, evidence_hashes, decision_trace, config_hash; see
+    insert_label_decision). The diff is computed in memory against one read
+    of the subjects' active labels:
+
+    - with ``expire``, active labels (from any labeler) whose name none of
+      the subject's desired labels carries are expired, and their committed
+      decisions marked expired
+    - a desired label is inserted, with one committed decision row, unless
+      ``labeler_did`` already has an active label with the same name,
+      rule_id and scheduler on the subject
+
+    Returns (inserted, expired): the (subject_uri, label dict) pairs
+    inserted and the (subject_uri, labeler_did, label dict) triples expired.
+    """
+    from . import metrics
+
+    subjects = list(desired)
+    if not subjects:
+        return [], []
+    now = timeutil.now_utc().isoformat()
+    current = get_active_labels_txn(conn, subjects)
+
+    expired = []
+    expire_rowids = []
+    expire_decisions = []
+    label_rows = []
+    decision_rows = []
+    inserted = []
+    skipped = 0
+    for subj in subjects:
+        wanted = desired[subj]
+        active = current.get(subj, [])
+        if expire:
+            names = {label.get("label") for label, _ in wanted}
+            gone = set()
+            for rowid, did, label in active:
+                name = label.get("label") if isinstance(label, dict) else None
+                if name in names:
+                    continue
+                expire_rowids.append(rowid)
+                expired.append((subj, did, label))
+                if name and name not in gone:
+                    gone.add(name)
+                    expire_decisions.append(("expired", subj, name, "committed"))
+        have = {
+            _label_key(label)
+            for _, did, label in active
+            if did == labeler_did and isinstance(label, dict)
+        }
+        for label, decision in wanted:
+            key = _label_key(label)
+            if key in have:
+                skipped += 1
+                continue
+            have.add(key)
+            label_rows.append((subj, labeler_did, json.dumps(label), now, None))
+            decision_rows.append(
+                _decision_row(subj, label_name=label.get("label") or "unknown", created_at=now, **decision)
+            )
+            inserted.append((subj, label))
+
+    for chunk, marks in _in_chunks(expire_rowids):
+        conn.execute(f"UPDATE labels SET expired_at = ? WHERE rowid IN ({marks})", [now, *chunk])
+    if expire_decisions:
+        conn.executemany(
+            "UPDATE label_decisions SET status = ? WHERE subject_uri = ? AND label = ? AND status = ?",
+            expire_decisions,
+        )
+    if label_rows:
+        conn.executemany("INSERT INTO labels VALUES (?, ?, ?, ?, ?)", label_rows)
+        conn.executemany(_INSERT_DECISION, decision_rows)
+    if inserted:
+        metrics.LABELS_INSERTED.inc(len(inserted))
+    if skipped:
+        metrics.LABELS_SKIPPED.inc(skipped)
+    return inserted, expired
+
+
 def insert_quarantine_emit(emit_mode: str, emit_status: str, emit_reason: str, payload: dict) -> str:
     emit_id = str(uuid.uuid4())
     created_at = timeutil.now_utc().isoformat()
-    conn = get_conn()
+    # kept next to the subject's labels; readers fan out over shards
+    conn = get_conn_for_uri(payload.get("subject_uri"))
     conn.execute(
         "INSERT INTO quarantine_emits VALUES (?, ?, ?, ?, ?, ?)",
         (emit_id, created_at, emit_mode, emit_status, emit_reason or "", json.dumps(payload, sort_keys=True)),
@@ -549,7 +970,7 @@ def insert_quarantine_emit(emit_mode: str, emit_status: str, emit_reason: str, p
 
 def enqueue_claim_recheck(authorDid: str, claim_fingerprint: str) -> None:
     now = timeutil.now_utc().isoformat()
-    conn = get_conn()
+    conn = get_conn_for_did(authorDid)
     cur = conn.execute(
         "SELECT 1 FROM claim_recheck_requests WHERE authorDid = ? AND claim_fingerprint = ?",
         (authorDid, claim_fingerprint),
@@ -569,17 +990,28 @@ def enqueue_claim_recheck(authorDid: str, claim_fingerprint: str) -> None:
 
 
 def dequeue_claim_rechecks(limit: int = 100) -> list:
-    conn = get_conn()
-    rows = conn.execute(
-        "SELECT authorDid, claim_fingerprint FROM claim_recheck_requests ORDER BY scheduled_at ASC LIMIT ?",
-        (limit,),
-    ).fetchall()
-    items = [(r[0], r[1]) for r in rows]
-    for authorDid, fp in items:
-        conn.execute(
-            "DELETE FROM claim_recheck_requests WHERE authorDid = ? AND claim_fingerprint = ?",
-            (authorDid, fp),
-        )
-    conn.commit()
-    conn.close()
+    """Pop up to ``limit`` (authorDid, fingerprint) pairs, oldest first per shard.
+
+    Requests are queued on the author's shard (enqueue_claim_recheck), so
+    every shard is drained in turn until the limit is used up.
+    """
+    items = []
+    for shard in shard_ids():
+        if len(items) >= limit:
+            break
+        conn = get_conn(shard)
+        try:
+            rows = conn.execute(
+                "SELECT authorDid, claim_fingerprint FROM claim_recheck_requests ORDER BY scheduled_at ASC LIMIT ?",
+                (limit - len(items),),
+            ).fetchall()
+            for authorDid, fp in rows:
+                conn.execute(
+                    "DELETE FROM claim_recheck_requests WHERE authorDid = ? AND claim_fingerprint = ?",
+                    (authorDid, fp),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+        items.extend((r[0], r[1]) for r in rows)
     return items
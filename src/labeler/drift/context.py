@@ -0,0 +1,59 @@
+from typing import Dict, List, Optional, Tuple
+
+from .models import Post
+
+
+class ThreadContext:
+    """What the rules read besides the thread itself, fetched once per thread.
+
+    Holds each post's claim fingerprint and the claim history of every
+    (author, fingerprint) pair in the thread, with the posts that history
+    refers to. ``build`` loads it in one batched query per shard
+    (posts.load_claim_groups), so evaluating a thread costs the same number
+    of queries whatever its size.
+    """
+
+    def __init__(self, fingerprints: Dict[str, str], claims: Dict[Tuple[str, str], List[Tuple[str, Post]]]):
+        self._fingerprints = fingerprints
+        self._claims = claims
+
+    @classmethod
+    def build(cls, thread: List[Post], conn=None) -> "ThreadContext":
+        """Context for ``thread``. ``conn`` is used for the authors on its
+        shard (all of them when unsharded); others get a connection each."""
+        from ..claims import fingerprint_text
+        from .. import db
+        from ..posts import load_claim_groups
+
+        fingerprints = {p.uri: fingerprint_text(p.text) for p in thread}
+        by_shard: Dict[Optional[int], set] = {}
+        for p in thread:
+            shard = db.shard_for_did(p.authorDid) if db.SHARD_COUNT > 1 and p.authorDid else None
+            by_shard.setdefault(shard, set()).add((p.authorDid, fingerprints[p.uri]))
+        claims: Dict[Tuple[str, str], List[Tuple[str, Post]]] = {}
+        for shard, keys in by_shard.items():
+            own = conn is not None and (shard is None or shard == db.SHARD_ID)
+            c = conn if own else db.get_conn(shard)
+            try:
+                claims.update(load_claim_groups(c, keys))
+            except Exception:
+                # rules treat missing history as no history
+                pass
+            finally:
+                if not own:
+                    c.close()
+        return cls(fingerprints, claims)
+
+    def fingerprint(self, post: Post) -> str:
+        fp = self._fingerprints.get(post.uri)
+        if fp is None:
+            from ..claims import fingerprint_text
+
+            fp = self._fingerprints[post.uri] = fingerprint_text(post.text)
+        return fp
+
+    def prior_claims(self, post: Post) -> List[Post]:
+        """Posts in the author's history for this post's claim, created
+        before it, oldest first."""
+        group = self._claims.get((post.authorDid, self.fingerprint(post)), [])
+        return [p for created, p in group if created < post.createdAt]
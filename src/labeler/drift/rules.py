@@ -1,14 +1,18 @@
-from typing import List, Dict, Any
-import json
+from typing import List, Dict, Any, Optional
 from .models import Post, LabelRecord
+from .context import ThreadContext
 from .extract import extract_claim_signals
 from .diff import detect_assertiveness_increase, comparable_claim_texts
 
+# bump when a rule's logic changes: rechecks then re-evaluate whole threads
+# instead of only their new posts (thread_state.py)
+RULES_VERSION = "1"
+
 ATTRIBUTION_TOKENS = ["reportedly", "according to", "source says", "reported by", "sources say"]
 QUOTE_MARK_RE = '"'
 
 
-def rule_provenance_laundering(post: Post, thread: List[Post]) -> List[LabelRecord]:
+def rule_provenance_laundering(post: Post, thread: List[Post], ctx: Optional[ThreadContext] = None) -> List[LabelRecord]:
     labels = []
     # find prior post in thread by same author
     priors = [p for p in thread if p.authorDid == post.authorDid and p.uri != post.uri]
@@ -38,21 +42,11 @@ def rule_provenance_laundering(post: Post, thread: List[Post]) -> List[LabelReco
 
     # Fallback: check claim_history for prior claims by fingerprint for this author
     try:
-        from ..claims import fingerprint_text, get_claim_history
-        from ..db import get_conn
-        fp = fingerprint_text(post.text)
-        history = get_claim_history(post.authorDid, fp)
-        # look for earlier prior posts in history
-        for h in reversed(history):
-            if h["createdAt"] < post.createdAt:
-                conn = get_conn()
-                rows = conn.execute("SELECT raw FROM events WHERE event_uri = ?", (h["post_uri"],)).fetchall()
-                conn.close()
-                if not rows:
-                    continue
-                raw = json.loads(rows[0][0])
-                if _check_prior_text(raw.get("text", ""), h["post_uri"]):
-                    return labels
+        if ctx is None:
+            ctx = ThreadContext.build([post])
+        for prior in reversed(ctx.prior_claims(post)):
+            if _check_prior_text(prior.text, prior.uri):
+                return labels
     except Exception:
         # be conservative
         pass
@@ -105,32 +99,20 @@ def rule_time_inconsistency(post: Post, thread: List[Post]) -> List[LabelRecord]
     return labels
 
 
-def rule_assertiveness_increase(post: Post, thread: List[Post]) -> List[LabelRecord]:
+def rule_assertiveness_increase(post: Post, thread: List[Post], ctx: Optional[ThreadContext] = None) -> List[LabelRecord]:
     """Detects if the author has increased assertiveness for the same claim fingerprint without new evidence."""
     labels = []
     try:
-        from ..claims import fingerprint_text, get_claim_history, compute_claim_state_from_post, compare_claim_states, evidence_hash_from_raw
-        from ..db import get_conn
-        # compute fingerprint for this post
-        fp = fingerprint_text(post.text)
-        # fetch history for this author+fingerprint
-        history = get_claim_history(post.authorDid, fp)
+        from ..claims import compute_claim_state_from_post, compare_claim_states, evidence_hash_from_raw
+        if ctx is None:
+            ctx = ThreadContext.build([post])
+        # history for this author+fingerprint before this post (by createdAt)
+        history = ctx.prior_claims(post)
         if not history:
             return labels
-        # find the most recent prior claim before this post (by createdAt)
-        prior = None
-        for h in history:
-            if h["createdAt"] < post.createdAt:
-                prior = h
-        if not prior:
-            return labels
-        # fetch raw of the prior post to compute state
-        conn = get_conn()
-        rows = conn.execute("SELECT raw FROM events WHERE event_uri = ?", (prior["post_uri"],)).fetchall()
-        conn.close()
-        if not rows:
-            return labels
-        prior_raw = json.loads(rows[0][0])
+        # the most recent prior claim
+        prior = history[-1]
+        prior_raw = {"text": prior.text, "externalLinks": prior.externalLinks, "embeds": prior.embeds, "facets": prior.facets}
         # compute states
         prior_state = compute_claim_state_from_post(prior_raw)
         current_state = compute_claim_state_from_post({"text": post.text, "externalLinks": post.externalLinks, "embeds": post.embeds, "facets": post.facets})
@@ -142,18 +124,25 @@ def rule_assertiveness_increase(post: Post, thread: List[Post]) -> List[LabelRec
         except Exception:
             threshold = 0.2
         if deltas["confidence_delta"] >= threshold and not deltas["evidence_changed"]:
-            labels.append(LabelRecord(subject_uri=post.uri, label="assertiveness_increase_possible", score=0.7, reasons=["assertiveness/confidence increased without new evidence"], evidence=[{"prior": prior["post_uri"], "post": post.uri}], rule_id="assertiveness_increase"))
+            labels.append(LabelRecord(subject_uri=post.uri, label="assertiveness_increase_possible", score=0.7, reasons=["assertiveness/confidence increased without new evidence"], evidence=[{"prior": prior.uri, "post": post.uri}], rule_id="assertiveness_increase"))
     except Exception:
         # be conservative on errors
         pass
     return labels
 
 
-def apply_all_rules(post: Post, thread: List[Post]) -> List[LabelRecord]:
+def apply_all_rules(post: Post, thread: List[Post], ctx: Optional[ThreadContext] = None) -> List[LabelRecord]:
+    """``ctx``: ThreadContext.build(thread), built once and passed for every
+    post of the thread; without one, each call fetches the post's history."""
     labels = []
-    labels.extend(rule_provenance_laundering(post, thread))
+    if ctx is None:
+        try:
+            ctx = ThreadContext.build([post])
+        except Exception:
+            pass
+    labels.extend(rule_provenance_laundering(post, thread, ctx))
     labels.extend(rule_repeat_claim_no_new_evidence(post, thread))
-    labels.extend(rule_assertiveness_increase(post, thread))
+    labels.extend(rule_assertiveness_increase(post, thread, ctx))
     labels.extend(rule_quote_mismatch(post, thread))
     labels.extend(rule_time_inconsistency(post, thread))
     # filter by score threshold
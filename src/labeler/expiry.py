@@ -6,9 +6,24 @@ from . import timeutil
 DEFAULT_TTL_DAYS = int(os.getenv("LABEL_TTL_DAYS", "30"))
 
 
-def expire_labels_by_ttl(ttl_days: int = None):
+def ttl_cutoff(ttl_days: int = None) -> str:
     ttl_days = ttl_days or DEFAULT_TTL_DAYS
-    cutoff = (timeutil.now_utc() - datetime.timedelta(days=ttl_days)).isoformat()
+    return (timeutil.now_utc() - datetime.timedelta(days=ttl_days)).isoformat()
+
+
+def expire_labels_chunk_txn(conn, cutoff: str, limit: int) -> int:
+    """Expire up to ``limit`` labels created at or before cutoff. Does not
+    commit; the maintenance scheduler runs this in bounded slices."""
+    cur = conn.execute(
+        "UPDATE labels SET expired_at = ? WHERE rowid IN "
+        "(SELECT rowid FROM labels WHERE ctime <= ? AND expired_at IS NULL LIMIT ?)",
+        (timeutil.now_utc().isoformat(), cutoff, limit),
+    )
+    return cur.rowcount
+
+
+def expire_labels_by_ttl(ttl_days: int = None):
+    cutoff = ttl_cutoff(ttl_days)
     conn = get_conn()
     # Mark labels older than cutoff and not yet expired
     conn.execute(
@@ -0,0 +1,210 @@
+"""Local Jetstream stand-in that serves frames from a fixture file.
+
+Lets the consumer be exercised (and compressed vs plain subscriptions be
+compared) offline, without touching the real firehose.
+
+Run as:
+    python -m labeler.fixture_server serve --fixture fixtures/jetstream_frames.jsonl --dict data/zstd_dictionary
+    python -m labeler.fixture_server train-dict --fixture fixtures/jetstream_frames.jsonl --out data/zstd_dictionary
+    python -m labeler.fixture_server bench --fixture fixtures/jetstream_frames.jsonl --dict data/zstd_dictionary
+
+Point the consumer at it with FIREHOSE_WS_URL=ws://127.0.0.1:6008/subscribe.
+Clients that ask for ``compress=true`` get binary zstd frames compressed with
+the dictionary, the same shape real Jetstream serves; everyone else gets JSON
+text frames. A ``cursor`` query parameter skips frames older than it.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from .frames import FrameDecompressor, decode_frame, frame_time_us, zstandard
+
+LOG = logging.getLogger("labeler.fixture_server")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 6008
+
+
+def load_frames(path: str) -> List[bytes]:
+    """Read one raw Jetstream frame per line (blank lines ignored)."""
+    out = []
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                out.append(line)
+    return out
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise RuntimeError("this command requires the zstandard package")
+
+
+def train_dictionary(frames: List[bytes], dict_size: int = 16384) -> bytes:
+    """Train a zstd dictionary from sample frames.
+
+    zstd needs a few hundred samples to train; small fixtures are cycled
+    until there are enough.
+    """
+    _require_zstd()
+    samples = list(frames)
+    while samples and len(samples) < 1000:
+        samples.extend(frames)
+    return zstandard.train_dictionary(dict_size, samples).as_bytes()
+
+
+def compress_frames(frames: List[bytes], dict_bytes: bytes, level: int = 3) -> List[bytes]:
+    _require_zstd()
+    cctx = zstandard.ZstdCompressor(
+        level=level,
+        dict_data=zstandard.ZstdCompressionDict(dict_bytes),
+        write_content_size=True,
+    )
+    return [cctx.compress(f) for f in frames]
+
+
+def bench(frames: List[bytes], dict_path: Optional[str] = None, rounds: int = 20) -> dict:
+    """Measure bytes on the wire and decode CPU, plain vs compressed.
+
+    CPU is process time for decompress + decode_frame per frame, i.e. exactly
+    the consumer's parse path, so the numbers are comparable.
+    """
+    def _cpu_us_per_frame(payloads, fn):
+        t0 = time.process_time()
+        for _ in range(rounds):
+            for p in payloads:
+                fn(p)
+        return (time.process_time() - t0) * 1e6 / max(1, rounds * len(payloads))
+
+    plain_bytes = sum(len(f) for f in frames)
+    result = {
+        "frames": len(frames),
+        "rounds": rounds,
+        "plain_bytes": plain_bytes,
+        "plain_cpu_us_per_frame": round(_cpu_us_per_frame(frames, decode_frame), 2),
+    }
+    if dict_path:
+        with open(dict_path, "rb") as f:
+            dict_bytes = f.read()
+        compressed = compress_frames(frames, dict_bytes)
+        dctx = FrameDecompressor(dict_path)
+        compressed_bytes = sum(len(f) for f in compressed)
+        result.update({
+            "compressed_bytes": compressed_bytes,
+            "compression_ratio": round(compressed_bytes / max(1, plain_bytes), 3),
+            "compressed_cpu_us_per_frame": round(
+                _cpu_us_per_frame(compressed, lambda p: decode_frame(dctx.decompress(p))), 2
+            ),
+        })
+    return result
+
+
+def _cursor_from_path(path: str) -> Optional[int]:
+    qs = parse_qs(urlsplit(path or "").query)
+    try:
+        return int(qs["cursor"][0])
+    except (KeyError, ValueError, IndexError):
+        return None
+
+
+def _wants_compression(path: str) -> bool:
+    qs = parse_qs(urlsplit(path or "").query)
+    return qs.get("compress", ["false"])[0].lower() == "true"
+
+
+async def serve(
+    frames: List[bytes],
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    dict_bytes: Optional[bytes] = None,
+    loops: int = 1,
+    stop: Optional[asyncio.Event] = None,
+    hold_open: bool = False,
+):
+    """Serve ``frames`` to each connecting client, then close the socket
+    (or, with ``hold_open``, leave it to the client to close).
+
+    Compressed payloads are built once up front so the server's own CPU
+    doesn't skew a consumer-side benchmark.
+    """
+    import websockets
+
+    compressed = compress_frames(frames, dict_bytes) if dict_bytes else None
+    times = [frame_time_us(f) for f in frames]
+
+    async def handler(ws, path=None):
+        path = path or getattr(ws, "path", "")
+        cursor = _cursor_from_path(path)
+        use_zstd = compressed is not None and _wants_compression(path)
+        payloads = compressed if use_zstd else [f.decode("utf-8") for f in frames]
+        sent = 0
+        for _ in range(loops):
+            for t, p in zip(times, payloads):
+                if cursor is not None and t is not None and int(t) < cursor:
+                    continue
+                await ws.send(p)
+                sent += 1
+        LOG.info("served %d frames (compressed=%s)", sent, use_zstd)
+        if hold_open:
+            await ws.wait_closed()
+        else:
+            await ws.close()
+
+    stop = stop or asyncio.Event()
+    async with websockets.serve(handler, host, port, max_size=10 * 1024 * 1024):
+        LOG.info("fixture server on ws://%s:%d/subscribe (%d frames)", host, port, len(frames))
+        await stop.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="labeler.fixture_server")
+    sub = parser.add_subparsers(dest="cmd")
+
+    sv = sub.add_parser("serve")
+    sv.add_argument("--fixture", default="fixtures/jetstream_frames.jsonl")
+    sv.add_argument("--dict", dest="dict_path", default=None)
+    sv.add_argument("--host", default=DEFAULT_HOST)
+    sv.add_argument("--port", type=int, default=DEFAULT_PORT)
+    sv.add_argument("--loops", type=int, default=1)
+
+    td = sub.add_parser("train-dict")
+    td.add_argument("--fixture", default="fixtures/jetstream_frames.jsonl")
+    td.add_argument("--out", required=True)
+    td.add_argument("--size", type=int, default=16384)
+
+    bn = sub.add_parser("bench")
+    bn.add_argument("--fixture", default="fixtures/jetstream_frames.jsonl")
+    bn.add_argument("--dict", dest="dict_path", default=None)
+    bn.add_argument("--rounds", type=int, default=20)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.cmd == "serve":
+        frames = load_frames(args.fixture)
+        dict_bytes = None
+        if args.dict_path:
+            with open(args.dict_path, "rb") as f:
+                dict_bytes = f.read()
+        try:
+            asyncio.run(serve(frames, args.host, args.port, dict_bytes, args.loops))
+        except KeyboardInterrupt:
+            pass
+    elif args.cmd == "train-dict":
+        d = train_dictionary(load_frames(args.fixture), args.size)
+        with open(args.out, "wb") as f:
+            f.write(d)
+        print(json.dumps({"ok": True, "out": args.out, "bytes": len(d)}, sort_keys=True))
+    elif args.cmd == "bench":
+        print(json.dumps(bench(load_frames(args.fixture), args.dict_path, args.rounds), indent=2, sort_keys=True))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""Jetstream frame decoding and transformation.
+
+Everything that turns a raw Jetstream WebSocket frame into the canonical event
+dict lives here. The module deliberately has no dependency on the websocket
+client so it can be imported by parse worker processes (see prepare.py).
+
+Decoding has three tiers, picked by JETSTREAM_DECODER (auto|msgspec|orjson|json):
+
+- msgspec, when installed: decodes straight into a typed commit envelope, so
+  only the record is materialized as a dict.
+- orjson, when installed: a faster drop-in for json.loads.
+- stdlib json: always available.
+
+Ahead of any of them, prefilter_frame() recognizes identity/account events
+from the raw bytes and extracts only time_us for cursor tracking — those
+frames are discarded anyway, so they never pay for a full parse. Deletes are
+small and are decoded into tombstone events (see commit_to_event).
+
+With ``compress=true`` Jetstream sends binary frames zstd-compressed against a
+shared dictionary; FrameDecompressor undoes that before decode (requires the
+zstandard package and the dictionary file Jetstream publishes).
+"""
+
+import json
+import os
+import re
+from typing import Callable, Optional, Tuple
+from . import timeutil
+from .db import shard_for_did
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+try:
+    import msgspec
+except Exception:
+    msgspec = None
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+JETSTREAM_DECODER = os.getenv("JETSTREAM_DECODER", "auto").lower()
+
+
+def jetstream_to_event(js: dict) -> Optional[dict]:
+    """Transform a Jetstream commit event into the canonical event dict
+    that the rest of the pipeline (insert_event, extract_edges, claims) expects.
+
+    Returns None for events we don't care about (identity, account).
+    """
+    if js.get("kind") != "commit":
+        return None
+
+    commit = js.get("commit", {})
+    return commit_to_event(
+        js.get("did", ""),
+        js.get("time_us"),
+        commit.get("operation"),
+        commit.get("collection", ""),
+        commit.get("rkey", ""),
+        commit.get("cid", ""),
+        commit.get("record", {}),
+    )
+
+
+def commit_to_event(did: str, time_us: Optional[int], operation: Optional[str], collection: str, rkey: str, cid: str, record: dict) -> Optional[dict]:
+    """Build the canonical event dict from the fields of a commit envelope.
+
+    Shared by the dict path (jetstream_to_event) and the typed msgspec path.
+    A delete of a post or repost becomes a tombstone event (``_operation`` ==
+    "delete", no record) that the writer applies with db.apply_tombstones_txn.
+    ``_time_us`` rides along for the writer's cursor and is not stored.
+    """
+    if operation not in ("create", "update", "delete"):
+        return None
+
+    # Build AT URI: at://{did}/{collection}/{rkey}
+    uri = f"at://{did}/{collection}/{rkey}"
+
+    # Convert Jetstream time_us (microseconds) to ISO timestamp
+    if time_us:
+        ctime = timeutil.to_utc_iso(time_us / 1_000_000)
+    else:
+        ctime = timeutil.now_utc().isoformat()
+
+    if operation == "delete":
+        if collection not in ("app.bsky.feed.post", "app.bsky.feed.repost"):
+            return None
+        return {
+            "uri": uri,
+            "author": did,
+            "authorDid": did,
+            "time": ctime,
+            "_collection": collection,
+            "_operation": operation,
+            "_time_us": time_us,
+        }
+
+    if collection == "app.bsky.feed.post":
+        # Extract reply pointers
+        reply = record.get("reply", {})
+        reply_parent = reply.get("parent", {}) if reply else {}
+        reply_root = reply.get("root", {}) if reply else {}
+
+        # Extract external links from embeds
+        external_links = []
+        embed = record.get("embed", {})
+        if embed:
+            ext = embed.get("external", {})
+            if ext and ext.get("uri"):
+                external_links.append(ext["uri"])
+            media = embed.get("media", {})
+            if media:
+                ext2 = media.get("external", {})
+                if ext2 and ext2.get("uri"):
+                    external_links.append(ext2["uri"])
+
+        return {
+            "uri": uri,
+            "cid": cid,
+            "text": record.get("text", ""),
+            "author": did,
+            "authorDid": did,
+            "time": ctime,
+            "createdAt": record.get("createdAt", ctime),
+            "replyParentUri": reply_parent.get("uri"),
+            "replyRootUri": reply_root.get("uri"),
+            "facets": record.get("facets", []),
+            "embeds": [embed] if embed else [],
+            "externalLinks": external_links,
+            "record": record,
+            "_collection": collection,
+            "_operation": operation,
+            "_time_us": time_us,
+        }
+
+    elif collection == "app.bsky.feed.repost":
+        subject = record.get("subject", {})
+        return {
+            "uri": uri,
+            "cid": cid,
+            "text": "",
+            "author": did,
+            "authorDid": did,
+            "time": ctime,
+            "createdAt": record.get("createdAt", ctime),
+            "replyParentUri": None,
+            "replyRootUri": None,
+            "facets": [],
+            "embeds": [],
+            "externalLinks": [],
+            "record": record,
+            "type": "repost",
+            "subject": subject,
+            "_collection": collection,
+            "_operation": operation,
+            "_time_us": time_us,
+        }
+
+    return None
+
+
+# -- pre-filter ---------------------------------------------------------------
+#
+# Jetstream serializes compactly and in struct order: did, time_us, kind, then
+# commit{rev, operation, collection, rkey, record, cid}. So the *first*
+# "kind" key is the envelope's — user-controlled record fields come later and
+# can't shadow it. Anything that doesn't match these exact shapes falls through
+# to a full parse, so the filter can only ever skip work, never change what is
+# ingested.
+
+_KIND_RE = re.compile(rb'"kind":"([a-z]+)"')
+_TIME_US_RE = re.compile(rb'"time_us":(\d+)')
+_COMMIT_KEY = b'"commit":'
+_DID_RE = re.compile(rb'"did":"([^"]+)"')
+_SKIP_KINDS = (b"identity", b"account")
+
+
+def prefilter_frame(raw) -> Tuple[bool, Optional[str]]:
+    """Cheaply decide whether a raw frame can be skipped without parsing.
+
+    Returns (skip, cursor). ``cursor`` is the frame's time_us as a string when
+    it was extracted, else None. When ``skip`` is False the caller must fully
+    decode the frame (the cursor is then taken from the decode instead).
+    """
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    m = _KIND_RE.search(raw)
+    if m is None or raw.find(_COMMIT_KEY, 0, m.start()) >= 0:
+        return False, None
+    kind = m.group(1)
+    if kind in _SKIP_KINDS:
+        return True, frame_time_us(raw)
+    return False, None
+
+
+def frame_time_us(raw) -> Optional[str]:
+    """Extract time_us from a raw frame without parsing it."""
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    m = _TIME_US_RE.search(raw)
+    return m.group(1).decode("ascii") if m else None
+
+
+def frame_did(raw) -> Optional[str]:
+    """Extract the top-level repo DID from a raw frame without parsing it.
+
+    Jetstream serializes ``did`` before ``commit``; a match inside the commit
+    (e.g. a mention facet) is ignored and None returned, so the caller falls
+    back to the decoded event.
+    """
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    m = _DID_RE.search(raw)
+    if m is None:
+        return None
+    commit_at = raw.find(_COMMIT_KEY, 0, m.start())
+    if commit_at >= 0:
+        return None
+    return m.group(1).decode("utf-8")
+
+
+# -- decoders -----------------------------------------------------------------
+#
+# Each decoder takes a raw frame and returns (cursor, event_or_None), raising
+# on malformed input.
+
+def _decode_dict(js: dict) -> Tuple[Optional[str], Optional[dict]]:
+    time_us = js.get("time_us")
+    return (str(time_us) if time_us else None), jetstream_to_event(js)
+
+
+def _decode_json(raw):
+    return _decode_dict(json.loads(raw))
+
+
+def _decode_orjson(raw):
+    return _decode_dict(orjson.loads(raw))
+
+
+if msgspec is not None:
+    class JetstreamCommit(msgspec.Struct):
+        """Typed commit envelope; only ``record`` stays a dict."""
+        operation: Optional[str] = None
+        collection: str = ""
+        rkey: str = ""
+        cid: str = ""
+        record: Optional[dict] = None
+
+    class JetstreamFrame(msgspec.Struct):
+        """Typed top-level Jetstream frame. identity/account payloads are
+        not declared, so msgspec skips over them without building dicts."""
+        did: str = ""
+        time_us: Optional[int] = None
+        kind: str = ""
+        commit: Optional[JetstreamCommit] = None
+
+    _FRAME_DECODER = msgspec.json.Decoder(JetstreamFrame)
+
+    def _decode_msgspec(raw):
+        fr = _FRAME_DECODER.decode(raw)
+        cursor = str(fr.time_us) if fr.time_us else None
+        if fr.kind != "commit" or fr.commit is None:
+            return cursor, None
+        c = fr.commit
+        ev = commit_to_event(
+            fr.did, fr.time_us, c.operation, c.collection, c.rkey, c.cid,
+            c.record if c.record is not None else {},
+        )
+        return cursor, ev
+
+
+def available_decoders() -> list:
+    names = []
+    if msgspec is not None:
+        names.append("msgspec")
+    if orjson is not None:
+        names.append("orjson")
+    names.append("json")
+    return names
+
+
+def select_decoder(name: str = "auto") -> Callable:
+    """Return the decoder for ``name``; "auto" picks the fastest installed.
+
+    Asking for a backend that isn't installed falls back to stdlib json.
+    """
+    name = (name or "auto").lower()
+    if name == "auto":
+        name = available_decoders()[0]
+    if name == "msgspec" and msgspec is not None:
+        return _decode_msgspec
+    if name == "orjson" and orjson is not None:
+        return _decode_orjson
+    return _decode_json
+
+
+_DECODER = select_decoder(JETSTREAM_DECODER)
+
+
+def decode_frame(
+    raw,
+    decoder: Optional[Callable] = None,
+    shard: Optional[Tuple[int, int]] = None,
+) -> Tuple[Optional[str], Optional[dict]]:
+    """Pre-filter then decode one raw frame.
+
+    Returns (cursor, event) where ``event`` is the canonical event dict or
+    None for frames we don't ingest. Raises on malformed JSON. With ``shard``
+    as (shard_id, shard_count), frames whose DID hashes elsewhere are dropped
+    right after the DID is extracted, before the full decode.
+    """
+    skip, cursor = prefilter_frame(raw)
+    if skip:
+        return cursor, None
+    did = None
+    if shard is not None:
+        did = frame_did(raw)
+        if did is not None and shard_for_did(did, shard[1]) != shard[0]:
+            return frame_time_us(raw), None
+    cursor, ev = (decoder or _DECODER)(raw)
+    if shard is not None and did is None and ev is not None:
+        if shard_for_did(ev.get("authorDid") or "", shard[1]) != shard[0]:
+            ev = None
+    return cursor, ev
+
+
+# -- zstd ---------------------------------------------------------------------
+
+# Upper bound for a decompressed frame, matching the WS max_size the consumer
+# accepts. Only used when a frame header doesn't carry its content size.
+MAX_FRAME_BYTES = 10 * 1024 * 1024
+
+
+class FrameDecompressor:
+    """Decompress zstd Jetstream frames with a shared dictionary.
+
+    Holds one decompression context for its lifetime; zstd contexts are
+    costly to build and the dictionary is digested once, not per frame.
+    Not thread-safe — give each thread/process its own (see get_decompressor).
+    """
+
+    def __init__(self, dict_path: str):
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed frames require the zstandard package")
+        with open(dict_path, "rb") as f:
+            self._dict = zstandard.ZstdCompressionDict(f.read())
+        self._dctx = zstandard.ZstdDecompressor(dict_data=self._dict)
+
+    def decompress(self, frame) -> bytes:
+        if isinstance(frame, str):
+            # text frames are never compressed
+            return frame.encode("utf-8")
+        return self._dctx.decompress(frame, max_output_size=MAX_FRAME_BYTES)
+
+
+_DECOMPRESSORS = {}
+
+
+def get_decompressor(dict_path: str) -> FrameDecompressor:
+    """Per-process cached FrameDecompressor for ``dict_path``."""
+    d = _DECOMPRESSORS.get(dict_path)
+    if d is None:
+        d = _DECOMPRESSORS[dict_path] = FrameDecompressor(dict_path)
+    return d
@@ -0,0 +1,276 @@
+"""End-to-end ingest benchmark: synthetic firehose -> consumer -> SQLite.
+
+For each writer batch setting, serves the same synthetic stream (see
+synthetic.py) from a local WebSocket in a child process, runs a real
+ATProtoConsumer against it with a fresh database, and reports:
+
+- events_per_sec: events committed / wall time from first enqueue to last commit
+- latency_ms p50/p99: enqueue -> commit of the batch carrying the event
+- drop_frac: (dropped + rollback_lost) / frames served
+- wal_max_bytes: largest -wal file seen while running
+- cpu_us_per_event: consumer process CPU per committed event (parse worker
+  processes, when enabled, are not included)
+
+Run as:
+    python -m labeler.ingest_bench --events 100000 --batches 50,100,250,adaptive
+
+Results are written as JSON (default out/bench/ingest-<utc timestamp>.json)
+together with the synthetic config, so runs can be compared over time.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import math
+import multiprocessing
+import pathlib
+import socket
+import tempfile
+import time
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+from . import timeutil
+from .synthetic import SynthConfig, _add_config_args, config_from_args, generate
+
+LOG = logging.getLogger("labeler.ingest_bench")
+
+DEFAULT_PORT = 6010
+DEFAULT_BATCHES = "50,100,250,500,adaptive"
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100); None for no samples."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(q / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def parse_batches(spec: str) -> List[dict]:
+    """"50,100,adaptive" -> writer settings for each run."""
+    out = []
+    for item in (s.strip() for s in spec.split(",")):
+        if not item:
+            continue
+        if item == "adaptive":
+            out.append({"name": "adaptive", "adaptive": True, "max_events": None})
+        else:
+            out.append({"name": f"fixed-{int(item)}", "adaptive": False, "max_events": int(item)})
+    return out
+
+
+def _serve_child(frames: List[bytes], port: int):
+    from .fixture_server import serve
+
+    # hold the socket open after the last frame: a close would make the
+    # consumer reconnect in a loop while the bench waits for it to drain
+    asyncio.run(serve(frames, port=port, hold_open=True))
+
+
+def _wait_port(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"bench server did not come up on port {port}")
+
+
+def _wal_size(data_dir: pathlib.Path) -> int:
+    return sum(p.stat().st_size for p in data_dir.glob("*.sqlite-wal"))
+
+
+@contextlib.contextmanager
+def _patched(module, **values):
+    old = {k: getattr(module, k) for k in values}
+    for k, v in values.items():
+        setattr(module, k, v)
+    try:
+        yield
+    finally:
+        for k, v in old.items():
+            setattr(module, k, v)
+
+
+def _timed_consumer_cls():
+    from .consumer import ATProtoConsumer
+
+    class TimedConsumer(ATProtoConsumer):
+        """Consumer that stamps enqueue and commit times per event.
+
+        Keyed by id(): every queued object stays alive until its batch is
+        processed, and a dropped one's stale entry is overwritten when the
+        id is reused at its next enqueue.
+        """
+
+        def __init__(self, *a, **kw):
+            super().__init__(*a, **kw)
+            self.enqueued_at: Dict[int, float] = {}
+            self.latencies: List[float] = []
+            self.first_enqueue: Optional[float] = None
+            self.last_commit: Optional[float] = None
+
+        def _enqueue(self, ev):
+            now = time.monotonic()
+            if self.first_enqueue is None:
+                self.first_enqueue = now
+            self.enqueued_at[id(ev)] = now
+            super()._enqueue(ev)
+
+        def _process_batch(self, batch):
+            result = super()._process_batch(batch)
+            now = time.monotonic()
+            if result[-1] == 0:
+                for item in batch:
+                    t = self.enqueued_at.pop(id(item), None)
+                    if t is not None:
+                        self.latencies.append(now - t)
+                self.last_commit = now
+            return result
+
+    return TimedConsumer
+
+
+async def _run_one(frames_count: int, setting: dict, port: int, parse_workers: int, timeout_s: float) -> dict:
+    from . import consumer as consumer_mod
+    from . import db
+
+    with tempfile.TemporaryDirectory(prefix="ingest-bench-") as tmp:
+        data_dir = pathlib.Path(tmp)
+        overrides = {
+            "BATCH_ADAPTIVE": setting["adaptive"],
+            "INGEST_OVERFLOW": "drop",
+            "REPLAY_RECORD_DIR": "",
+        }
+        if setting["max_events"]:
+            overrides["BATCH_MAX_EVENTS"] = setting["max_events"]
+        with _patched(db, DATA_DIR=data_dir), _patched(consumer_mod, **overrides):
+            consumer = _timed_consumer_cls()(
+                ws_url=f"ws://127.0.0.1:{port}/subscribe", parse_workers=parse_workers
+            )
+            cpu0 = time.process_time()
+            t0 = time.monotonic()
+            task = asyncio.create_task(consumer.run())
+            wal_max = 0
+            timed_out = False
+            while True:
+                await asyncio.sleep(0.1)
+                wal_max = max(wal_max, _wal_size(data_dir))
+                settled = (
+                    consumer._msgs + consumer._dropped
+                    + consumer._rollback_lost + consumer._errors
+                )
+                if settled >= frames_count and consumer._event_queue.empty():
+                    break
+                if time.monotonic() - t0 > timeout_s:
+                    timed_out = True
+                    break
+            cpu_s = time.process_time() - cpu0
+            consumer.stop()
+            if consumer._ws is not None:
+                await consumer._ws.close()
+            with contextlib.suppress(asyncio.CancelledError):
+                await asyncio.wait_for(task, timeout=30)
+
+    committed = consumer._msgs
+    start = consumer.first_enqueue or t0
+    end = consumer.last_commit or time.monotonic()
+    elapsed = max(end - start, 1e-9)
+    lat_ms = [x * 1000 for x in consumer.latencies]
+    return {
+        "setting": setting["name"],
+        "events_committed": committed,
+        "elapsed_s": round(elapsed, 3),
+        "events_per_sec": round(committed / elapsed, 1),
+        "latency_ms": {
+            "p50": _round(percentile(lat_ms, 50)),
+            "p99": _round(percentile(lat_ms, 99)),
+            "max": _round(max(lat_ms) if lat_ms else None),
+        },
+        "dropped": consumer._dropped,
+        "rollback_lost": consumer._rollback_lost,
+        "drop_frac": round((consumer._dropped + consumer._rollback_lost) / max(1, frames_count), 5),
+        "errors": consumer._errors,
+        "wal_max_bytes": wal_max,
+        "cpu_us_per_event": _round(cpu_s * 1e6 / committed if committed else None),
+        "timed_out": timed_out,
+    }
+
+
+def _round(v, nd=2):
+    return None if v is None else round(v, nd)
+
+
+def run(
+    cfg: SynthConfig,
+    events: int,
+    settings: List[dict],
+    port: int = DEFAULT_PORT,
+    parse_workers: int = 0,
+    timeout_s: float = 600.0,
+) -> dict:
+    frames = list(generate(cfg, events))
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for setting in settings:
+        # a fresh server per run: each consumer starts without a cursor
+        server = ctx.Process(target=_serve_child, args=(frames, port), daemon=True)
+        server.start()
+        try:
+            _wait_port(port)
+            LOG.info("bench run %s: %d frames", setting["name"], len(frames))
+            results.append(asyncio.run(_run_one(len(frames), setting, port, parse_workers, timeout_s)))
+        finally:
+            server.terminate()
+            server.join(10)
+    return {
+        "generated_at": timeutil.now_utc().isoformat(),
+        "events": events,
+        "parse_workers": parse_workers,
+        "synthetic": asdict(cfg),
+        "runs": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="labeler.ingest_bench")
+    _add_config_args(parser)
+    parser.add_argument("--batches", default=DEFAULT_BATCHES,
+                        help="comma list of fixed batch caps and/or 'adaptive'")
+    parser.add_argument("--parse-workers", type=int, default=0)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    report = run(
+        config_from_args(args),
+        args.events,
+        parse_batches(args.batches),
+        port=args.port,
+        parse_workers=args.parse_workers,
+        timeout_s=args.timeout,
+    )
+    out = pathlib.Path(args.out) if args.out else pathlib.Path("out/bench") / (
+        "ingest-" + timeutil.now_utc().strftime("%Y%m%dT%H%M%SZ") + ".json"
+    )
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2, sort_keys=True))
+    for r in report["runs"]:
+        print(
+            f"{r['setting']:>12}  {r['events_per_sec']:>9} ev/s  "
+            f"p50 {r['latency_ms']['p50']} ms  p99 {r['latency_ms']['p99']} ms  "
+            f"drop {r['drop_frac']}  wal {r['wal_max_bytes']}  cpu {r['cpu_us_per_event']} us/ev"
+        )
+    print(f"wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
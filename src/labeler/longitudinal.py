@@ -1,13 +1,16 @@
 import os
 import json
 import logging
-from typing import List
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
 
 from .db import get_conn, get_conn as _get_conn
 from .db import get_conn as get_conn_fn
 from .db import get_conn
 from .db import get_conn as gc
 from .db import get_conn as _gc
+from .db import shard_ids
 
 LOG = logging.getLogger("labeler.longitudinal")
 
@@ -15,47 +18,20 @@ DRIFT_LABELER_DID = os.getenv("DRIFT_LABELER_DID", "did:labeler:drift")
 
 # Import drift modules lazily to avoid import cycles in tests
 from .drift.models import Post
+from .drift.context import ThreadContext
 from .drift.rules import apply_all_rules
 from . import timeutil
+from .posts import load_claim_group, load_thread, load_thread_all_shards, load_thread_rows
+from .thread_state import get_state, posts_to_evaluate, rules_config_hash, save_state_txn, thread_digest
+from .recheck_pool import evaluate_roots, recheck_executor
 from .emit_mode import get_emit_mode, get_emit_limits
 from .budgets import parse_rule_budgets, budget_exceeded_in_run, budget_exceeded_in_window
 
 
 def _load_posts_for_root(conn, root_uri: str) -> List[Post]:
-    # Fetch all events and filter in Python by the raw JSON fields. This is simpler and
-    # portable since we store raw JSON in a single column.
-    rows = conn.execute("SELECT event_uri, raw, ctime FROM events").fetchall()
-
-    posts = []
-    for r in rows:
-        event_uri, raw_json, ctime = r
-        try:
-            data = json.loads(raw_json)
-        except Exception:
-            continue
-
-        # Determine whether this event belongs to the thread rooted at `root_uri`.
-        if not (
-            event_uri == root_uri
-            or data.get("replyRootUri") == root_uri
-            or data.get("replyParentUri") == root_uri
-        ):
-            continue
-
-        # normalise to Post dataclass expected by rules
-        p = Post(
-            uri=data.get("uri") or event_uri,
-            cid=data.get("cid"),
-            text=data.get("text", ""),
-            createdAt=timeutil.to_utc_iso(data.get("createdAt") or ctime),
-            authorDid=data.get("authorDid", ""),
-            replyParentUri=data.get("replyParentUri"),
-            replyRootUri=data.get("replyRootUri"),
-            facets=data.get("facets", []),
-            embeds=data.get("embeds", []),
-            externalLinks=data.get("externalLinks", []),
-        )
-        posts.append(p)
+    # The root plus every event replying into its thread: one range scan of
+    # idx_events_thread (posts.load_thread)
+    posts = load_thread(conn, root_uri)
 
     # sort by createdAt ascending
     posts = sorted(posts, key=lambda x: x.createdAt)
@@ -63,37 +39,8 @@ def _load_posts_for_root(conn, root_uri: str) -> List[Post]:
 
 
 def _load_posts_for_claim_group(conn, authorDid: str, claim_fingerprint: str) -> List[Post]:
-    rows = conn.execute(
-        "SELECT post_uri, createdAt FROM claim_history WHERE authorDid = ? AND claim_fingerprint = ? ORDER BY createdAt ASC",
-        (authorDid, claim_fingerprint),
-    ).fetchall()
-    posts = []
-    for post_uri, _created in rows:
-        try:
-            ev_rows = conn.execute("SELECT raw, ctime FROM events WHERE event_uri = ?", (post_uri,)).fetchall()
-        except Exception:
-            ev_rows = []
-        if not ev_rows:
-            continue
-        raw_json, ctime = ev_rows[0]
-        try:
-            data = json.loads(raw_json)
-        except Exception:
-            continue
-        p = Post(
-            uri=data.get("uri") or post_uri,
-            cid=data.get("cid"),
-            text=data.get("text", ""),
-            createdAt=timeutil.to_utc_iso(data.get("createdAt") or ctime),
-            authorDid=data.get("authorDid", ""),
-            replyParentUri=data.get("replyParentUri"),
-            replyRootUri=data.get("replyRootUri"),
-            facets=data.get("facets", []),
-            embeds=data.get("embeds", []),
-            externalLinks=data.get("externalLinks", []),
-        )
-        posts.append(p)
-    return posts
+    # claim_history joined to events in one query (posts.load_claim_group)
+    return load_claim_group(conn, authorDid, claim_fingerprint)
 
 
 def _decision_inputs_for_post(text: str) -> dict:
@@ -113,23 +60,175 @@ def _decision_inputs_for_post(text: str) -> dict:
     }
 
 
+def _desired_labels(p: Post, labs: list, scheduler: str, now: str) -> List[Tuple[dict, dict]]:
+    """(label payload, decision-ledger fields) for each rule result on ``p``,
+    as db.reconcile_labels_txn takes them."""
+    from .claims import FP_VERSION, fingerprint_config_hash, evidence_hash_from_signals
+
+    if not labs:
+        return []
+    try:
+        inputs = _decision_inputs_for_post(p.text)
+    except Exception:
+        inputs = None
+    evidence_hashes = []
+    try:
+        evidence_hashes.append(evidence_hash_from_signals(p.text, p.externalLinks, p.embeds, p.facets))
+    except Exception:
+        pass
+    config_hash = fingerprint_config_hash()
+    out = []
+    for l in labs:
+        rule_id = l.rule_id or "unknown"
+        label_obj = {
+            "label": l.label,
+            "score": l.score,
+            "reasons": l.reasons,
+            "evidence": l.evidence,
+            "time": now,
+            "labeler": DRIFT_LABELER_DID,
+            "rule_id": rule_id,
+            "scheduler": scheduler,
+        }
+        decision = {
+            "root_uri": p.replyRootUri or p.uri,
+            "rule_id": rule_id,
+            "fingerprint_version": FP_VERSION,
+            "inputs": inputs,
+            "evidence_hashes": evidence_hashes,
+            "decision_trace": json.dumps({"reasons": l.reasons, "evidence": l.evidence, "scheduler": scheduler}, sort_keys=True),
+            "config_hash": config_hash,
+        }
+        out.append((label_obj, decision))
+    return out
+
+
+def _reconcile_labels(conn, desired: dict, expire: bool = True, shard: Optional[int] = None) -> Tuple[list, list]:
+    """db.reconcile_labels_txn on the shard owning each subject. Subjects on
+    ``conn``'s database (``shard``, default this process's; all of them when
+    unsharded) change in its open transaction, left for the caller to
+    commit; other shards' get a connection and a transaction each."""
+    from . import db
+
+    if shard is None:
+        shard = db.SHARD_ID
+
+    by_shard = {}
+    for subj, labels in desired.items():
+        did = db.did_from_uri(subj)
+        subject_shard = db.shard_for_did(did) if db.SHARD_COUNT > 1 and did else None
+        by_shard.setdefault(subject_shard, {})[subj] = labels
+    inserted, expired = [], []
+    for subject_shard, subjects in by_shard.items():
+        own = subject_shard is None or subject_shard == shard
+        c = conn if own else db.get_conn(subject_shard)
+        try:
+            ins, exp = db.reconcile_labels_txn(c, DRIFT_LABELER_DID, subjects, expire=expire)
+            if not own:
+                c.commit()
+        finally:
+            if not own:
+                c.close()
+        inserted.extend(ins)
+        expired.extend(exp)
+    return inserted, expired
+
+
+def _emit_record(subject_uri: str, label: dict) -> dict:
+    return {
+        "subject_uri": subject_uri,
+        "label": label["label"],
+        "score": round(float(label["score"]), 3),
+        "reasons": label["reasons"],
+        "evidence": label["evidence"],
+        "rule_id": label["rule_id"],
+    }
+
+
+@dataclass
+class RootEvaluation:
+    """Rule results for one thread. Computed on a read connection, possibly
+    in a worker process (recheck_pool.py); recheck_once applies them on its
+    own connection."""
+
+    root: str
+    subjects: List[Tuple[Post, list]] = field(default_factory=list)  # evaluated posts and their labels
+    claim_rechecks: List[Tuple[str, str]] = field(default_factory=list)
+    state: Optional[Tuple[int, str, str]] = None  # for thread_state.save_state_txn
+    posts: int = 0
+    evaluated: int = 0
+
+
+def evaluate_root(conn, root: str, claim_recheck: bool = False) -> RootEvaluation:
+    """Run the rules over the posts of ``root``'s thread that need it. Reads
+    only."""
+    from . import db
+
+    result = RootEvaluation(root)
+    if db.SHARD_COUNT > 1:
+        # replies are stored on their authors' shards: the rules need the
+        # thread from all of them. Events rowids are per shard, so there is
+        # no watermark to evaluate incrementally from.
+        rows = []
+        posts = sorted(load_thread_all_shards(root), key=lambda x: x.createdAt)
+        evaluate = posts
+    else:
+        rows = load_thread_rows(conn, root)
+        posts = sorted((p for p, _ in rows), key=lambda x: x.createdAt)
+        # only the posts whose labels may have changed since the last
+        # evaluation of this thread (thread_state.py)
+        config_hash = rules_config_hash()
+        evaluate = posts_to_evaluate(get_state(conn, root), rows, config_hash)
+        evaluate = sorted(evaluate, key=lambda x: x.createdAt)
+    result.posts, result.evaluated = len(posts), len(evaluate)
+    # claim history for every evaluated post, fetched once
+    ctx = ThreadContext.build(evaluate, conn)
+    for p in evaluate:
+        labs = apply_all_rules(p, posts, ctx)
+        result.subjects.append((p, labs))
+        if claim_recheck and any(l.rule_id == "repeat_claim_no_new_evidence" for l in labs):
+            result.claim_rechecks.append((p.authorDid, ctx.fingerprint(p)))
+    if rows:
+        result.state = (max(r[1] for r in rows), thread_digest(rows), config_hash)
+    return result
+
+
 def recheck_once(limit: int = 100) -> int:
     """Process up to `limit` recheck requests and re-evaluate threads.
 
     Returns the number of roots processed.
     """
-    conn = get_conn()
-    # try queue-backed dequeue first (Redis preferred)
-    try:
-        from .recheck_queue import get_queue
-        q = get_queue(conn)
-        roots = q.dequeue(limit)
-    except Exception:
-        rows = conn.execute("SELECT root_uri FROM recheck_requests ORDER BY scheduled_at ASC LIMIT ?", (limit,)).fetchall()
-        roots = [r[0] for r in rows]
-
-    if not roots:
-        conn.close()
+    started = time.monotonic()
+    # Recheck requests are queued on the shard of the post that triggered
+    # them, so with SHARD_COUNT > 1 a thread's requests may sit on any
+    # shard: drain each one on its own connection.
+    queues = []
+    batches = []
+    dequeued = 0
+    for shard in shard_ids():
+        if dequeued >= limit:
+            break
+        shard_conn = get_conn(shard)
+        # try queue-backed dequeue first (Redis preferred)
+        try:
+            from .recheck_queue import get_queue
+            q = get_queue(shard_conn)
+            if all(q is not other for other in queues):
+                queues.append(q)
+            shard_roots = q.dequeue(limit - dequeued)
+        except Exception:
+            rows = shard_conn.execute(
+                "SELECT root_uri FROM recheck_requests ORDER BY scheduled_at ASC LIMIT ?", (limit - dequeued,)
+            ).fetchall()
+            shard_roots = [r[0] for r in rows]
+        if shard_roots:
+            batches.append((shard, shard_conn, shard_roots))
+            dequeued += len(shard_roots)
+        else:
+            shard_conn.close()
+
+    if not batches:
+        _record_pass(queues, 0, time.monotonic() - started)
         return 0
 
     processed = 0
@@ -140,125 +239,74 @@ def recheck_once(limit: int = 100) -> int:
     budgets = parse_rule_budgets()
     claim_recheck_enabled = os.getenv("ENABLE_CLAIM_RECHECK", "0") == "1"
     claim_recheck_limit = int(os.getenv("CLAIM_RECHECK_MAX_PER_RUN", "25"))
+    from . import db
     from . import metrics as metrics_module
-    for root in roots:
-        try:
-            posts = _load_posts_for_root(conn, root)
-            # collect labels produced by rules per subject
-            labels_by_subject = {}
-            for p in posts:
-                labs = apply_all_rules(p, posts)
-                labels_by_subject.setdefault(p.uri, []).extend(labs)
-                # if repeat-no-new-evidence fires, enqueue claim-group recheck
+    seen = set()
+    for shard, conn, roots in batches:
+        # a thread with requests on several shards is evaluated once
+        dups = [r for r in roots if r in seen]
+        if dups:
+            conn.executemany("DELETE FROM recheck_requests WHERE root_uri = ?", [(r,) for r in dups])
+            conn.commit()
+        roots = [r for r in roots if r not in seen]
+        seen.update(roots)
+        for root, result in evaluate_roots(conn, roots, claim_recheck_enabled):
+            try:
+                if isinstance(result, BaseException):
+                    raise result
+                if result.evaluated == result.posts:
+                    metrics_module.RECHECK_FULL_EVALUATIONS.inc()
+                metrics_module.RECHECK_POSTS_EVALUATED.inc(result.evaluated)
+                metrics_module.RECHECK_POSTS_SKIPPED.inc(result.posts - result.evaluated)
+                # if repeat-no-new-evidence fired, enqueue claim-group rechecks
                 if claim_recheck_enabled:
-                    if any(l.rule_id == "repeat_claim_no_new_evidence" for l in labs):
+                    for authorDid, fp in result.claim_rechecks:
                         try:
-                            from .claims import fingerprint_text
                             from .db import enqueue_claim_recheck
-                            fp = fingerprint_text(p.text)
-                            enqueue_claim_recheck(p.authorDid, fp)
+                            enqueue_claim_recheck(authorDid, fp)
                         except Exception:
                             pass
 
-            # For each subject, compare current active labels to labels_by_subject
-            for subj, labs in labels_by_subject.items():
-                # names of labels that should be active according to rules
-                desired_names = set(l.label for l in labs)
-
-                # fetch current active labels
-                from .db import get_labels_for_subject, expire_label, insert_label
-
-                current = get_labels_for_subject(subj, include_expired=False)
-                current_names = set([c["label"]["label"] for c in current])
-
-                # expire labels that are active but no longer supported
-                to_expire = [c for c in current if c["label"]["label"] not in desired_names]
-                expired_count = 0
-                for c in to_expire:
-                    cnt = expire_label(subj, c["labeler_did"], c["label"])
-                    if cnt:
-                        expired_count += cnt
-
-                if expired_count:
-                    metrics_module.RECHECK_LABELS_EXPIRED.inc(expired_count)
-
-                # insert/update labels produced by rules
-                for l in labs:
-                    label_obj = {
-                        "label": l.label,
-                        "score": l.score,
-                        "reasons": l.reasons,
-                        "evidence": l.evidence,
-                        "time": timeutil.now_utc().isoformat(),
-                        "labeler": DRIFT_LABELER_DID,
-                        "rule_id": l.rule_id or "unknown",
-                        "scheduler": "thread_root",
-                    }
-                    inserted = insert_label(subj, DRIFT_LABELER_DID, label_obj)
-                    if inserted:
-                        metrics_module.RECHECK_LABELS_INSERTED.inc()
-                        emit_buffer.append(
-                            {
-                                "subject_uri": subj,
-                                "label": l.label,
-                                "score": round(float(l.score), 3),
-                                "reasons": l.reasons,
-                                "evidence": l.evidence,
-                                "rule_id": l.rule_id or "unknown",
-                            }
-                        )
-                        rid = l.rule_id or "unknown"
-                        run_rule_counts[rid] = run_rule_counts.get(rid, 0) + 1
-                        try:
-                            from .claims import FP_VERSION, fingerprint_config_hash, evidence_hash_from_signals
-                            from .db import insert_label_decision
-                            inputs = _decision_inputs_for_post(p.text)
-                            evidence_hashes = []
-                            try:
-                                evidence_hashes.append(
-                                    evidence_hash_from_signals(
-                                        p.text,
-                                        p.externalLinks,
-                                        p.embeds,
-                                        p.facets,
-                                    )
-                                )
-                            except Exception:
-                                pass
-                            decision_trace = json.dumps({"reasons": l.reasons, "evidence": l.evidence, "scheduler": "thread_root"}, sort_keys=True)
-                            insert_label_decision(
-                                subject_uri=subj,
-                                root_uri=p.replyRootUri or p.uri,
-                                label_name=l.label,
-                                rule_id=l.rule_id or "unknown",
-                                fingerprint_version=FP_VERSION,
-                                inputs=inputs,
-                                evidence_hashes=evidence_hashes,
-                                decision_trace=decision_trace,
-                                config_hash=fingerprint_config_hash(),
-                                status="committed",
-                            )
-                        except Exception:
-                            pass
-                        if emit_cap > 0 and len(emit_buffer) >= emit_cap:
-                            emit_mode = "quarantine"
-                            metrics_module.RECHECK_QUARANTINE_TRIPPED.inc()
-
-        except Exception:
-            LOG.exception("recheck failed for root %s", root)
-        finally:
-            # if using DB fallback, remove the recheck request
-            try:
+                # one diff of the thread's labels against the rule results,
+                # applied with the thread state in this root's transaction
+                now = timeutil.now_utc().isoformat()
+                desired = {p.uri: _desired_labels(p, labs, "thread_root", now) for p, labs in result.subjects}
+                inserted, expired = _reconcile_labels(conn, desired, shard=shard)
+                if result.state is not None:
+                    save_state_txn(conn, root, *result.state)
+                # if using DB fallback, remove the recheck request
                 conn.execute("DELETE FROM recheck_requests WHERE root_uri = ?", (root,))
                 conn.commit()
+
+                if expired:
+                    metrics_module.RECHECK_LABELS_EXPIRED.inc(len(expired))
+                for subj, label in inserted:
+                    metrics_module.RECHECK_LABELS_INSERTED.inc()
+                    emit_buffer.append(_emit_record(subj, label))
+                    rid = label["rule_id"]
+                    run_rule_counts[rid] = run_rule_counts.get(rid, 0) + 1
+                    if emit_cap > 0 and len(emit_buffer) >= emit_cap:
+                        emit_mode = "quarantine"
+                        metrics_module.RECHECK_QUARANTINE_TRIPPED.inc()
+
             except Exception:
-                pass
-            processed += 1
+                LOG.exception("recheck failed for root %s", root)
+                try:
+                    conn.rollback()
+                    # if using DB fallback, still remove the recheck request
+                    conn.execute("DELETE FROM recheck_requests WHERE root_uri = ?", (root,))
+                    conn.commit()
+                except Exception:
+                    pass
+            finally:
+                processed += 1
 
+        conn.close()
+
+    conn = get_conn()
     # metrics and close
     metrics_module.RECHECK_ITERATIONS.inc()
     try:
-        import time
         metrics_module.RECHECK_LAST_RUN_TS.set(time.time())
     except Exception:
         pass
@@ -271,70 +319,31 @@ def recheck_once(limit: int = 100) -> int:
         except Exception:
             claim_items = []
         for authorDid, fp in claim_items:
+            # a claim group is one author's history: it all lives on their shard
+            shard = db.shard_for_did(authorDid) if db.SHARD_COUNT > 1 else db.SHARD_ID
+            group_conn = db.get_conn_for_did(authorDid)
             try:
-                posts = _load_posts_for_claim_group(conn, authorDid, fp)
+                posts = _load_posts_for_claim_group(group_conn, authorDid, fp)
                 posts = sorted(posts, key=lambda x: x.createdAt)
-                for p in posts:
-                    labs = apply_all_rules(p, posts)
-                    for l in labs:
-                        label_obj = {
-                            "label": l.label,
-                            "score": l.score,
-                            "reasons": l.reasons,
-                            "evidence": l.evidence,
-                            "time": timeutil.now_utc().isoformat(),
-                            "labeler": DRIFT_LABELER_DID,
-                            "rule_id": l.rule_id or "unknown",
-                            "scheduler": "claim_group",
-                        }
-                        inserted = insert_label(p.uri, DRIFT_LABELER_DID, label_obj)
-                        if inserted:
-                            metrics_module.RECHECK_LABELS_INSERTED.inc()
-                            emit_buffer.append(
-                                {
-                                    "subject_uri": p.uri,
-                                    "label": l.label,
-                                    "score": round(float(l.score), 3),
-                                    "reasons": l.reasons,
-                                    "evidence": l.evidence,
-                                    "rule_id": l.rule_id or "unknown",
-                                }
-                            )
-                            rid = l.rule_id or "unknown"
-                            run_rule_counts[rid] = run_rule_counts.get(rid, 0) + 1
-                            try:
-                                from .claims import FP_VERSION, fingerprint_config_hash, evidence_hash_from_signals
-                                from .db import insert_label_decision
-                                inputs = _decision_inputs_for_post(p.text)
-                                evidence_hashes = []
-                                try:
-                                    evidence_hashes.append(
-                                        evidence_hash_from_signals(
-                                            p.text,
-                                            p.externalLinks,
-                                            p.embeds,
-                                            p.facets,
-                                        )
-                                    )
-                                except Exception:
-                                    pass
-                                decision_trace = json.dumps({"reasons": l.reasons, "evidence": l.evidence, "scheduler": "claim_group"}, sort_keys=True)
-                                insert_label_decision(
-                                    subject_uri=p.uri,
-                                    root_uri=p.replyRootUri or p.uri,
-                                    label_name=l.label,
-                                    rule_id=l.rule_id or "unknown",
-                                    fingerprint_version=FP_VERSION,
-                                    inputs=inputs,
-                                    evidence_hashes=evidence_hashes,
-                                    decision_trace=decision_trace,
-                                    config_hash=fingerprint_config_hash(),
-                                    status="committed",
-                                )
-                            except Exception:
-                                pass
+                ctx = ThreadContext.build(posts, group_conn)
+                now = timeutil.now_utc().isoformat()
+                desired = {p.uri: _desired_labels(p, apply_all_rules(p, posts, ctx), "claim_group", now) for p in posts}
+                # adds labels only: expiry is the thread recheck's call
+                inserted, _ = _reconcile_labels(group_conn, desired, expire=False, shard=shard)
+                group_conn.commit()
+                for subj, label in inserted:
+                    metrics_module.RECHECK_LABELS_INSERTED.inc()
+                    emit_buffer.append(_emit_record(subj, label))
+                    rid = label["rule_id"]
+                    run_rule_counts[rid] = run_rule_counts.get(rid, 0) + 1
             except Exception:
                 LOG.exception("claim-group recheck failed for %s/%s", authorDid, fp)
+                try:
+                    group_conn.rollback()
+                except Exception:
+                    pass
+            finally:
+                group_conn.close()
 
     if emit_buffer:
         try:
@@ -356,18 +365,35 @@ def recheck_once(limit: int = 100) -> int:
         except Exception:
             pass
 
+    _record_pass(queues, processed, time.monotonic() - started)
     conn.close()
     return processed
 
 
+def _record_pass(queues: list, roots: int, elapsed_s: float):
+    from . import metrics as metrics_module
+
+    try:
+        metrics_module.RECHECK_PASS_SECONDS.observe(elapsed_s)
+        if roots:
+            metrics_module.RECHECK_ROOTS_PER_SECOND.set(roots / elapsed_s if elapsed_s > 0 else 0.0)
+        if queues:
+            metrics_module.RECHECK_BACKLOG.set(sum(q.depth() for q in queues))
+    except Exception:
+        pass
+
+
 async def run_periodic(stop_event=None, interval: int = None):
     import asyncio
     interval = interval or int(os.getenv("RECHECK_INTERVAL", "60"))
     stop_event = stop_event or asyncio.Event()
     LOG.info("starting recheck loop interval=%s", interval)
+    loop = asyncio.get_running_loop()
     while not stop_event.is_set():
         try:
-            recheck_once()
+            # a pass can take a while; keep it off the loop serving the API
+            # and the firehose
+            await loop.run_in_executor(recheck_executor(), recheck_once)
         except Exception:
             LOG.exception("error during recheck loop")
         try:
@@ -1,7 +1,9 @@
 import os
 import uvicorn
 from fastapi import FastAPI, HTTPException, Response, Depends, Header
-from .db import init_db, get_conn
+from .db import init_db, shard_ids
+from . import readpool
+from .readpool import aquery_shards
 from .consumer import ATProtoConsumer
 import asyncio
 import json
@@ -11,13 +13,16 @@ app = FastAPI(title="Bluesky Labeler MVP")
 
 _consumer_task = None
 _label_ingest_task = None
+_label_recheck_task = None
 
 LOG = logging.getLogger("labeler.main")
 
 
 @app.on_event("startup")
 async def startup_event():
-    init_db()
+    # the API reads every shard (see db.query_shards), so make sure they exist
+    for shard in shard_ids():
+        init_db(shard)
 
     # Run preflight checks
     from .preflight import run_preflight
@@ -52,8 +57,12 @@ async def startup_event():
         loop = asyncio.get_event_loop()
         loop.create_task(_fe())
 
-    # Optionally start retention loop
-    if os.environ.get("ENABLE_RETENTION", "").lower() in ("1", "true"):
+    # Optionally start retention loop. An in-process consumer runs retention
+    # itself, as preemptible slices on its writer thread (maintenance.py).
+    if (
+        os.environ.get("ENABLE_RETENTION", "").lower() in ("1", "true")
+        and os.getenv("FIREHOSE_AUTO_START") != "1"
+    ):
         loop = asyncio.get_event_loop()
         loop.create_task(_retention_loop())
 
@@ -78,6 +87,12 @@ async def shutdown_event():
     global _label_ingest_task
     if _label_ingest_task:
         _label_ingest_task.cancel()
+    global _label_recheck_task
+    if _label_recheck_task:
+        _label_recheck_task.cancel()
+    from . import recheck_pool
+    recheck_pool.shutdown()
+    readpool.close_all()
 
 
 @app.get("/health")
@@ -94,23 +109,56 @@ async def health_extended():
         quarantine_trips = metrics_module.RECHECK_QUARANTINE_TRIPPED._value.get()
     except Exception:
         quarantine_trips = None
-    conn = get_conn()
-    queue_rows = conn.execute("SELECT COUNT(*) FROM recheck_requests").fetchall()
-    queue_depth = queue_rows[0][0] if queue_rows else 0
-    cursor_rows = conn.execute("SELECT consumer, cursor, updated_at FROM cursors ORDER BY updated_at DESC LIMIT 1").fetchall()
-    conn.close()
-    cursor_info = None
-    if cursor_rows:
-        cursor_info = {"consumer": cursor_rows[0][0], "cursor": cursor_rows[0][1], "updated_at": cursor_rows[0][2]}
+    reads = await readpool.run(_health_extended_reads)
     disk = check_disk()
+    from .coverage import snapshot as coverage_snapshot
+    try:
+        coverage = coverage_snapshot(windows=reads["windows"])
+    except Exception:
+        LOG.exception("coverage snapshot failed")
+        coverage = {"platform_health": "unknown", "reasons": []}
+    # process liveness is not coverage truth: a degraded or still-recovering
+    # intake must not report status=ok
+    status = "degraded" if coverage.get("platform_health") in ("degraded", "recovering") else "ok"
     return {
-        "status": "ok",
+        "status": status,
+        "platform_health": coverage.get("platform_health"),
+        "coverage": coverage,
         "emit_mode": get_emit_mode(),
-        "queue_depth": queue_depth,
-        "last_cursor": cursor_info,
+        "queue_depth": reads["queue_depth"],
+        "last_cursor": reads["last_cursor"],
         "quarantine_trips": quarantine_trips,
         "disk": disk,
         "disk_pressure": is_disk_pressure(),
+        "schema_pending_migrations": reads["schema_pending"],
+    }
+
+
+def _health_extended_reads() -> dict:
+    """The DB part of /health/extended, run on the read pool."""
+    from .coverage import load_windows
+    from .migrations import MIGRATIONS
+    from .readpool import query_shards
+    queue_depth = sum(r[0] for r in query_shards("SELECT COUNT(*) FROM recheck_requests"))
+    cursor_rows = query_shards("SELECT consumer, cursor, updated_at FROM cursors ORDER BY updated_at DESC LIMIT 1")
+    cursor_rows.sort(key=lambda r: r[2] or "", reverse=True)
+    cursor_info = None
+    if cursor_rows:
+        cursor_info = {"consumer": cursor_rows[0][0], "cursor": cursor_rows[0][1], "updated_at": cursor_rows[0][2]}
+    # per shard; online index builds the consumer has not finished yet
+    schema_pending = sum(
+        max(0, len(MIGRATIONS) - r[0]) for r in query_shards("SELECT COUNT(*) FROM schema_version")
+    )
+    try:
+        windows = load_windows()
+    except Exception:
+        LOG.exception("degraded window lookup failed")
+        windows = []
+    return {
+        "queue_depth": queue_depth,
+        "last_cursor": cursor_info,
+        "schema_pending": schema_pending,
+        "windows": windows,
     }
 
 
@@ -187,24 +235,26 @@ async def admin_cooldowns(auth=Depends(admin_auth)):
 @app.get("/exposure/{did}")
 async def exposure(did: str):
     # naive exposure: count edges where dst_did == did
-    conn = get_conn()
-    rows = conn.execute("SELECT count(*) FROM edges WHERE dst_did = ?", (did,)).fetchall()
-    count = rows[0][0] if rows else 0
+    # edges live with their source author's shard, so count across all
+    count = sum(r[0] for r in await aquery_shards("SELECT count(*) FROM edges WHERE dst_did = ?", (did,)))
     return {"did": did, "incoming_edges": count}
 
 
 @app.get("/strain/top")
 async def strain_top(limit: int = 10):
     # placeholder: return top authors by event count (proxy metric)
-    conn = get_conn()
-    rows = conn.execute("SELECT author, COUNT(*) as cnt FROM events GROUP BY author ORDER BY cnt DESC LIMIT ?", (limit,)).fetchall()
+    # authors never span shards, so per-shard top-N merges exactly
+    rows = await aquery_shards("SELECT author, COUNT(*) as cnt FROM events GROUP BY author ORDER BY cnt DESC LIMIT ?", (limit,))
+    rows = sorted(rows, key=lambda r: r[1], reverse=True)[:limit]
     return [{"author": r[0], "count": r[1]} for r in rows]
 
 
 @app.get("/labels/{subject_uri}")
 async def labels_for_subject(subject_uri: str):
     from .db import get_labels_for_subject
-    labels = get_labels_for_subject(subject_uri)
+    labels = await readpool.run(
+        lambda: get_labels_for_subject(subject_uri, conn=readpool.read_conn_for_uri(subject_uri))
+    )
     if not labels:
         raise HTTPException(status_code=404, detail="no labels found for subject")
     return {"subject_uri": subject_uri, "labels": labels}
@@ -213,18 +263,17 @@ async def labels_for_subject(subject_uri: str):
 @app.get("/recent-decisions")
 async def recent_decisions(limit: int = 50, rule_id: str = None, auth=Depends(admin_auth)):
     limit = max(1, min(int(limit), 500))
-    conn = get_conn()
     if rule_id:
-        rows = conn.execute(
+        rows = await aquery_shards(
             "SELECT decision_id, created_at, subject_uri, root_uri, label, rule_id, fingerprint_version, inputs_json, evidence_hashes_json, decision_trace, config_hash, status FROM label_decisions WHERE rule_id = ? ORDER BY created_at DESC LIMIT ?",
             (rule_id, limit),
-        ).fetchall()
+        )
     else:
-        rows = conn.execute(
+        rows = await aquery_shards(
             "SELECT decision_id, created_at, subject_uri, root_uri, label, rule_id, fingerprint_version, inputs_json, evidence_hashes_json, decision_trace, config_hash, status FROM label_decisions ORDER BY created_at DESC LIMIT ?",
             (limit,),
-        ).fetchall()
-    conn.close()
+        )
+    rows = sorted(rows, key=lambda r: r[1] or "", reverse=True)[:limit]
 
     out = []
     for r in rows:
@@ -260,12 +309,11 @@ async def recent_decisions(limit: int = 50, rule_id: str = None, auth=Depends(ad
 @app.get("/quarantine/recent")
 async def quarantine_recent(limit: int = 50, auth=Depends(admin_auth)):
     limit = max(1, min(int(limit), 500))
-    conn = get_conn()
-    rows = conn.execute(
+    rows = await aquery_shards(
         "SELECT emit_id, created_at, emit_mode, emit_status, emit_reason, payload_json FROM quarantine_emits ORDER BY created_at DESC LIMIT ?",
         (limit,),
-    ).fetchall()
-    conn.close()
+    )
+    rows = sorted(rows, key=lambda r: r[1] or "", reverse=True)[:limit]
     out = []
     for r in rows:
         payload = {}
@@ -0,0 +1,458 @@
+"""Preemptible maintenance on the consumer's writer thread.
+
+Retention deletes, WAL truncation, TTL label expiry and ANALYZE all need the
+write lock. Run from a separate connection they contend with the ingest
+writer (a long retention DELETE holds the lock for seconds and the batch
+behind it rolls back as rollback_lost). Instead the consumer owns them: each
+is a resumable job cut into small transactions that the writer thread runs
+only in the gaps between ingest batches.
+
+Scheduling rules (see the drain loop in consumer.py):
+
+- Ingest always goes first. A maintenance slice runs only when the event
+  queue is empty, or holds at most MAINT_MAX_BACKLOG events and the previous
+  writer job was an ingest batch. Otherwise the slice is deferred and counted.
+- A slice runs steps of the head job until MAINT_SLICE_BUDGET_S is spent.
+  Every step is its own transaction, so a job resumes where it left off.
+- A step that overruns twice the budget, or runs while the queue grows past
+  MAINT_PREEMPT_BACKLOG, is interrupted through SQLite's progress handler and
+  rolled back; chunked jobs halve their chunk size and retry next slice.
+- A job deferred (or preempted) for longer than MAINT_STARVE_S gets one
+  slice regardless of backlog, so a sustained burst cannot starve WAL
+  truncation forever.
+- Online migrations (BackfillJob, IndexBuildJob) run here too; an index
+  build's final CREATE INDEX step is bounded by MIGRATION_MAX_STEP_S
+  (a few seconds) instead of the budget, and a build that overruns it is
+  left pending rather than retried (see migrations.py).
+
+Env vars:
+  MAINT_SLICE_BUDGET_S     — wall-time budget per slice (default 0.25)
+  MAINT_MAX_BACKLOG        — queue depth above which slices are deferred (default 100)
+  MAINT_PREEMPT_BACKLOG    — queue depth that interrupts a running step (default 1000)
+  MAINT_STARVE_S           — max deferral before a slice is forced (default 300)
+  MAINT_EXPIRY_INTERVAL_S  — TTL label expiry interval; 0 disables (default 0)
+  MAINT_ANALYZE_INTERVAL_S — ANALYZE interval; 0 disables (default 86400)
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from . import metrics, stagetiming
+
+LOG = logging.getLogger("labeler.maintenance")
+
+MAINT_SLICE_BUDGET_S = float(os.getenv("MAINT_SLICE_BUDGET_S", "0.25"))
+MAINT_MAX_BACKLOG = int(os.getenv("MAINT_MAX_BACKLOG", "100"))
+MAINT_PREEMPT_BACKLOG = int(os.getenv("MAINT_PREEMPT_BACKLOG", "1000"))
+MAINT_STARVE_S = float(os.getenv("MAINT_STARVE_S", "300"))
+MAINT_EXPIRY_INTERVAL_S = float(os.getenv("MAINT_EXPIRY_INTERVAL_S", "0"))
+MAINT_ANALYZE_INTERVAL_S = float(os.getenv("MAINT_ANALYZE_INTERVAL_S", "86400"))
+
+# SQLite VM instructions between progress-handler callbacks.
+_PROGRESS_OPS = 1000
+ANALYZE_TABLES = ("events", "edges", "event_versions", "claim_history", "labels", "label_decisions")
+
+
+class MaintenanceJob:
+    """One resumable unit of maintenance.
+
+    ``step(conn)`` does a bounded amount of work inside one transaction
+    (the scheduler commits) and returns True once the job is finished.
+    """
+
+    name = "job"
+    # Per-step time limit overriding the scheduler's 2x budget, for steps
+    # that cannot be split (None: use the scheduler's).
+    max_step_s: Optional[float] = None
+
+    def __init__(self):
+        self.elapsed_s = 0.0
+        self.steps = 0
+
+    def step(self, conn) -> bool:
+        raise NotImplementedError
+
+    def adapt(self, step_s: float, budget_s: float, preempted: bool = False):
+        """Feedback after each step; chunked jobs resize here."""
+
+
+class ChunkedJob(MaintenanceJob):
+    """Job that works through rows ``chunk`` at a time.
+
+    The chunk halves when a step overruns the budget or is preempted and
+    doubles (up to max_chunk) when steps finish well within it.
+    """
+
+    def __init__(self, max_chunk: int, chunk: Optional[int] = None):
+        super().__init__()
+        self.max_chunk = max(1, max_chunk)
+        self.chunk = min(self.max_chunk, chunk or max(1, self.max_chunk // 10))
+
+    def adapt(self, step_s, budget_s, preempted=False):
+        if preempted or step_s > budget_s:
+            self.chunk = max(1, self.chunk // 2)
+        elif step_s < budget_s / 4:
+            self.chunk = min(self.max_chunk, self.chunk * 2)
+
+
+class RetentionJob(ChunkedJob):
+    """retention.run_retention() as resumable chunks over retention_plan()."""
+
+    name = "retention"
+
+    def __init__(self, plan: Optional[list] = None, max_chunk: Optional[int] = None):
+        from . import retention
+
+        super().__init__(max_chunk or retention.BATCH_SIZE)
+        self.plan = plan if plan is not None else retention.retention_plan()
+        self.stats: Dict[str, int] = {key: 0 for key, *_ in self.plan}
+        self._idx = 0
+
+    def step(self, conn) -> bool:
+        from .retention import delete_chunk_txn
+
+        if self._idx >= len(self.plan):
+            return True
+        key, table, ts_col, cutoff = self.plan[self._idx]
+        limit = self.chunk
+        deleted = delete_chunk_txn(conn, table, ts_col, cutoff, limit)
+        self.stats[key] += deleted
+        if deleted < limit:
+            self._idx += 1
+        if self._idx >= len(self.plan):
+            LOG.info("retention complete in %.1fs: %s", self.elapsed_s, self.stats)
+            return True
+        return False
+
+
+class ExpiryJob(ChunkedJob):
+    """TTL label expiry (expiry.expire_labels_by_ttl) in chunks."""
+
+    name = "label_expiry"
+
+    def __init__(self, ttl_days: Optional[int] = None, max_chunk: int = 5000):
+        from .expiry import ttl_cutoff
+
+        super().__init__(max_chunk)
+        self.cutoff = ttl_cutoff(ttl_days)
+        self.expired = 0
+
+    def step(self, conn) -> bool:
+        from .expiry import expire_labels_chunk_txn
+
+        limit = self.chunk
+        n = expire_labels_chunk_txn(conn, self.cutoff, limit)
+        self.expired += n
+        if n < limit:
+            if self.expired:
+                LOG.info("label expiry: expired %d labels", self.expired)
+            return True
+        return False
+
+
+class CheckpointJob(MaintenanceJob):
+    """PRAGMA wal_checkpoint(TRUNCATE) from the writer connection.
+
+    Auto-checkpoint at 1000 frames is PASSIVE only (frames flush to the main
+    DB but the WAL file never shrinks); without an explicit TRUNCATE the WAL
+    grows to its high-water mark and stays. Logs only when the result is
+    interesting (busy or non-trivial work done).
+    """
+
+    name = "wal_checkpoint"
+
+    def step(self, conn) -> bool:
+        t0 = time.perf_counter()
+        row = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        stagetiming.STATS.observe("wal", time.perf_counter() - t0)
+        if row:
+            busy, log, ckpt = row
+            if busy or log >= 1000:
+                LOG.info("wal_truncate: busy=%d log=%d checkpointed=%d", busy, log, ckpt)
+        return True
+
+
+class AnalyzeJob(MaintenanceJob):
+    """ANALYZE one table per step, with a bounded sample (analysis_limit)."""
+
+    name = "analyze"
+
+    def __init__(self, tables=ANALYZE_TABLES, analysis_limit: int = 1000):
+        super().__init__()
+        self.tables = list(tables)
+        self.analysis_limit = analysis_limit
+
+    def step(self, conn) -> bool:
+        if not self.tables:
+            return True
+        conn.execute(f"PRAGMA analysis_limit = {int(self.analysis_limit)}")
+        conn.execute(f"ANALYZE {self.tables[0]}")
+        self.tables.pop(0)
+        return not self.tables
+
+
+class IndexBuildJob(ChunkedJob):
+    """An online index migration (migrations.py) on a large table.
+
+    Reads the indexed columns in rowid chunks first, so the table's pages
+    are in cache and the build itself is mostly the sort, then runs the
+    CREATE INDEX as a single step under MIGRATION_MAX_STEP_S. A build that
+    overruns that limit is rolled back and not tried again by this process:
+    the migration stays pending for an offline ``migrations apply``.
+    Preemptions for ingest backlog are retried as usual.
+    """
+
+    name = "index_build"
+
+    def __init__(self, migration, warm_chunk: Optional[int] = None):
+        from .migrations import MIGRATION_WARM_CHUNK
+
+        super().__init__(warm_chunk or MIGRATION_WARM_CHUNK)
+        self.migration = migration
+        self._pos = 0
+        self._hi: Optional[int] = None
+        self.abandoned = False
+
+    def adapt(self, step_s, budget_s, preempted=False):
+        if preempted and self.max_step_s is not None and step_s >= self.max_step_s:
+            self.abandoned = True
+            return
+        super().adapt(step_s, budget_s, preempted)
+
+    def step(self, conn) -> bool:
+        from . import migrations
+
+        m = self.migration
+        if m.version in migrations.current_versions(conn):
+            return True  # applied elsewhere (CLI, another process)
+        if self.abandoned:
+            LOG.warning(
+                "schema: online build of migration %d %s did not fit in MIGRATION_MAX_STEP_S=%.0fs; "
+                "left pending, apply it offline with `python -m labeler.migrations apply`",
+                m.version, m.name, self.max_step_s,
+            )
+            metrics.MIGRATIONS_ABANDONED.inc()
+            return True
+        if self._hi is None:
+            self._hi = migrations.table_rows(conn, m.table)
+        if self._pos < self._hi:
+            end = self._pos + self.chunk
+            conn.execute(
+                f"SELECT count({m.columns[0]}) FROM {m.table} WHERE rowid > ? AND rowid <= ?",
+                (self._pos, end),
+            ).fetchone()
+            self._pos = end
+            return False
+        self.max_step_s = migrations.MIGRATION_MAX_STEP_S
+        migrations.apply_txn(conn, m)
+        LOG.info("schema: applied migration %d %s online in %.1fs", m.version, m.name, self.elapsed_s)
+        return True
+
+
+class BackfillJob(ChunkedJob):
+    """An online data migration (migrations.py): one rowid range per step."""
+
+    name = "backfill"
+
+    def __init__(self, migration, max_chunk: int = 5000):
+        super().__init__(max_chunk)
+        self.migration = migration
+        self._pos = 0
+
+    def step(self, conn) -> bool:
+        from . import migrations
+
+        m = self.migration
+        if m.version in migrations.current_versions(conn):
+            return True
+        pos = m.backfill(conn, self._pos, self.chunk)
+        if pos is not None:
+            self._pos = pos
+            return False
+        migrations.record_txn(conn, m)
+        LOG.info("schema: applied migration %d %s online in %.1fs", m.version, m.name, self.elapsed_s)
+        return True
+
+
+class MaintenanceScheduler:
+    """Queue of maintenance jobs run in time-boxed slices.
+
+    The event loop asks has_work() / seconds_until_due() and records
+    deferrals; run_slice() runs on the writer thread. The two never overlap
+    because the loop awaits each writer job before deciding the next.
+    """
+
+    def __init__(self, budget_s: float = MAINT_SLICE_BUDGET_S, clock: Callable[[], float] = time.monotonic):
+        self.budget_s = budget_s
+        self._clock = clock
+        # [name, interval_s, factory, next_due]
+        self._periodic: List[list] = []
+        self._queue: deque = deque()
+        self._deferred_since: Optional[float] = None
+        self._busy_s = 0.0
+        self._window_start = clock()
+        self.deferrals: Dict[str, int] = {}
+        self.preemptions: Dict[str, int] = {}
+        self.completed: Dict[str, int] = {}
+
+    def every(self, name: str, interval_s: float, factory: Callable[[], MaintenanceJob],
+              first_in_s: Optional[float] = None):
+        """Run ``factory()`` every interval_s (first after first_in_s, default
+        one interval). A new instance is not queued while one is pending."""
+        if interval_s <= 0:
+            return
+        first = interval_s if first_in_s is None else first_in_s
+        self._periodic.append([name, interval_s, factory, self._clock() + first])
+
+    def submit(self, job: MaintenanceJob):
+        self._queue.append(job)
+
+    def pending(self) -> List[str]:
+        return [job.name for job in self._queue]
+
+    def _promote_due(self):
+        now = self._clock()
+        queued = {job.name for job in self._queue}
+        for entry in self._periodic:
+            name, interval_s, factory, next_due = entry
+            if next_due <= now:
+                entry[3] = now + interval_s
+                if name not in queued:
+                    self._queue.append(factory())
+
+    def has_work(self) -> bool:
+        self._promote_due()
+        return bool(self._queue)
+
+    def seconds_until_due(self) -> Optional[float]:
+        """0 with work queued, else time until the next periodic job; None
+        when nothing is scheduled."""
+        if self._queue:
+            return 0.0
+        if not self._periodic:
+            return None
+        return max(0.0, min(e[3] for e in self._periodic) - self._clock())
+
+    def defer(self):
+        """Record that the head job was passed over in favour of ingest."""
+        if not self._queue:
+            return
+        name = self._queue[0].name
+        self.deferrals[name] = self.deferrals.get(name, 0) + 1
+        metrics.MAINT_DEFERRALS.labels(job=name).inc()
+        if self._deferred_since is None:
+            self._deferred_since = self._clock()
+
+    def starved(self, limit_s: float = MAINT_STARVE_S) -> bool:
+        return (
+            self._deferred_since is not None
+            and self._clock() - self._deferred_since >= limit_s
+        )
+
+    def run_slice(self, conn, should_yield: Optional[Callable[[], bool]] = None) -> Optional[str]:
+        """Run the head job for up to one budget. Writer thread only.
+
+        Returns the job name, or None when there was nothing to do.
+        """
+        if not self._queue:
+            return None
+        job = self._queue[0]
+        t0 = self._clock()
+        step_start = t0
+        hard_limit = 2 * self.budget_s
+
+        def _progress():
+            if self._clock() - step_start > (job.max_step_s or hard_limit):
+                return 1
+            if should_yield is not None and should_yield():
+                return 1
+            return 0
+
+        conn.set_progress_handler(_progress, _PROGRESS_OPS)
+        try:
+            while True:
+                step_start = self._clock()
+                try:
+                    done = job.step(conn)
+                    conn.commit()
+                except sqlite3.OperationalError as e:
+                    if "interrupted" not in str(e):
+                        raise
+                    conn.rollback()
+                    job.adapt(self._clock() - step_start, self.budget_s, preempted=True)
+                    self.preemptions[job.name] = self.preemptions.get(job.name, 0) + 1
+                    metrics.MAINT_PREEMPTIONS.labels(job=job.name).inc()
+                    # a preempted step counts as deferred, so one that
+                    # keeps losing to ingest is eventually forced
+                    if self._deferred_since is None:
+                        self._deferred_since = t0
+                    break
+                step_s = self._clock() - step_start
+                self._deferred_since = None
+                job.steps += 1
+                job.adapt(step_s, self.budget_s)
+                if done:
+                    self._finish(job, self._clock() - t0)
+                    break
+                if self._clock() - t0 >= self.budget_s:
+                    break
+                if should_yield is not None and should_yield():
+                    break
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            LOG.exception("maintenance job %s failed; dropped", job.name)
+            self._queue.popleft()
+        finally:
+            conn.set_progress_handler(None, 0)
+            slice_s = self._clock() - t0
+            job.elapsed_s += slice_s
+            self._busy_s += slice_s
+            metrics.MAINT_SLICE_SECONDS.labels(job=job.name).observe(slice_s)
+        return job.name
+
+    def _finish(self, job: MaintenanceJob, last_slice_s: float):
+        self._queue.popleft()
+        self.completed[job.name] = self.completed.get(job.name, 0) + 1
+        # elapsed_s is topped up with the final slice in run_slice's finally
+        metrics.MAINT_JOB_SECONDS.labels(job=job.name).observe(job.elapsed_s + last_slice_s)
+
+    def occupancy(self, reset: bool = False) -> float:
+        """Share of wall time spent in maintenance slices since the last reset."""
+        now = self._clock()
+        window = now - self._window_start
+        occ = self._busy_s / window if window > 0 else 0.0
+        if reset:
+            self._busy_s = 0.0
+            self._window_start = now
+        metrics.MAINT_OCCUPANCY.set(occ)
+        return occ
+
+
+def default_scheduler(wal_truncate_interval_s: float) -> MaintenanceScheduler:
+    """Scheduler with the consumer's standard jobs registered."""
+    from . import retention
+
+    sched = MaintenanceScheduler()
+    sched.every(CheckpointJob.name, wal_truncate_interval_s, CheckpointJob)
+    if retention.ENABLE_RETENTION:
+        sched.every(RetentionJob.name, retention.INTERVAL_HOURS * 3600, RetentionJob)
+    sched.every(ExpiryJob.name, MAINT_EXPIRY_INTERVAL_S, ExpiryJob)
+    sched.every(AnalyzeJob.name, MAINT_ANALYZE_INTERVAL_S, AnalyzeJob)
+    return sched
+
+
+def schedule_migrations(sched: MaintenanceScheduler, conn) -> int:
+    """Queue a job for every online migration pending on conn."""
+    from .migrations import pending
+
+    todo = [m for m in pending(conn) if m.online]
+    for m in todo:
+        sched.submit(BackfillJob(m) if m.backfill is not None else IndexBuildJob(m))
+    return len(todo)
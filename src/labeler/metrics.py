@@ -6,6 +6,9 @@ except Exception:
         def __init__(self, *args, **kwargs):
             pass
 
+        def labels(self, *args, **kwargs):
+            return self
+
     class Counter(_Noop):
         def inc(self, *args, **kwargs):
             return None
@@ -37,6 +40,7 @@ LABELS_SKIPPED = Counter("labels_skipped_total", "Labels skipped due to duplicat
 INGEST_ITERATIONS = Counter("ingest_iterations_total", "Number of ingest loop iterations completed")
 INGEST_LABELS_PROCESSED = Counter("ingest_labels_processed_total", "Number of label objects processed by ingest")
 INGEST_LAST_RUN_TS = Gauge("ingest_last_run_timestamp", "Timestamp of last ingest run (unix)")
+CLAIM_ROWS_DROPPED = Counter("claim_rows_dropped_total", "claim_history rows dropped because they failed to insert")
 
 # Recheck / longitudinal metrics
 RECHECK_ITERATIONS = Counter("recheck_iterations_total", "Number of recheck loop iterations completed")
@@ -45,3 +49,61 @@ RECHECK_LABELS_INSERTED = Counter("recheck_labels_inserted_total", "Number of ne
 RECHECK_LAST_RUN_TS = Gauge("recheck_last_run_timestamp", "Timestamp of last recheck run (unix)")
 RECHECK_QUEUE_DEPTH = Gauge("recheck_queue_depth", "Approximate number of pending recheck requests")
 RECHECK_QUARANTINE_TRIPPED = Counter("recheck_quarantine_tripped_total", "Times emit was quarantined due to budgets or caps")
+RECHECK_POSTS_EVALUATED = Counter("recheck_posts_evaluated_total", "Posts run through the rules by rechecks")
+RECHECK_POSTS_SKIPPED = Counter("recheck_posts_skipped_total", "Thread posts left unevaluated by incremental rechecks")
+RECHECK_PASS_SECONDS = Histogram(
+    "recheck_pass_seconds",
+    "Wall time of one recheck_once pass",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+RECHECK_ROOTS_PER_SECOND = Gauge("recheck_roots_per_second", "Roots processed per second in the last non-empty recheck pass")
+RECHECK_BACKLOG = Gauge("recheck_backlog", "Roots still queued when the last recheck pass finished")
+RECHECK_FULL_EVALUATIONS = Counter("recheck_full_evaluations_total", "Rechecks that evaluated the whole thread")
+
+# Consumer writer metrics
+INGEST_BATCH_SIZE = Gauge("ingest_batch_size_target", "Current writer batch size cap (events)")
+INGEST_BATCH_WAIT = Gauge("ingest_batch_max_wait_seconds", "Current writer batch fill wait (seconds)")
+INGEST_QUEUE_OCCUPANCY = Gauge("ingest_queue_occupancy_ratio", "Ingest queue depth as a fraction of its maxsize")
+INGEST_COMMIT_LATENCY = Histogram(
+    "ingest_commit_latency_seconds",
+    "Writer transaction wall time per batch (executes + commit)",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+INGEST_SPILL_DEPTH = Gauge("ingest_spill_depth", "Events spilled to disk and not yet replayed")
+INGEST_SPILL_BYTES = Gauge("ingest_spill_bytes", "Bytes held in ingest spill segments")
+INGEST_SPILL_AGE = Gauge("ingest_spill_age_seconds", "Age of the oldest unreplayed spilled event")
+
+# Writer-thread maintenance (maintenance.py)
+MAINT_SLICE_SECONDS = Histogram(
+    "maintenance_slice_seconds",
+    "Writer wall time per maintenance slice",
+    ["job"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+MAINT_JOB_SECONDS = Histogram(
+    "maintenance_job_seconds",
+    "Total writer wall time of a completed maintenance job, summed over its slices",
+    ["job"],
+    buckets=(0.01, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 1800.0),
+)
+MAINT_DEFERRALS = Counter("maintenance_deferrals_total", "Maintenance slices deferred for ingest backlog", ["job"])
+MAINT_PREEMPTIONS = Counter("maintenance_preemptions_total", "Maintenance steps interrupted and rolled back", ["job"])
+MIGRATIONS_ABANDONED = Counter("migrations_abandoned_total", "Online index builds left pending for an offline apply")
+MAINT_OCCUPANCY = Gauge("maintenance_occupancy_ratio", "Share of wall time the writer spent on maintenance since the last STATS line")
+
+# Intake coverage / platform_health (coverage.py)
+COVERAGE_DROP_FRAC = Gauge("coverage_drop_frac", "Events shed (dropped + rollback_lost) / offered over the coverage window")
+COVERAGE_EVENTS_PER_SEC = Gauge("coverage_events_per_sec", "Committed events per second over the coverage window")
+COVERAGE_EVENTS_PER_SEC_EWMA = Gauge("coverage_events_per_sec_ewma", "EWMA baseline of committed events per second")
+COVERAGE_CURSOR_LAG = Gauge("coverage_cursor_lag_seconds", "Wall clock minus the last committed Jetstream cursor")
+PLATFORM_HEALTH_STATE = Gauge("platform_health_state", "Intake health: 0 ok, 1 recovering, 2 degraded")
+PLATFORM_HEALTH_REASON = Gauge("platform_health_reason", "1 while the reason is active", ["reason"])
+
+# Sampled per-stage ingest latency (stagetiming.py)
+INGEST_STAGE_SECONDS = Histogram(
+    "ingest_stage_seconds",
+    "Sampled ingest stage wall time: per frame/event for parse, prepare, queue_wait and e2e; "
+    "per batch for insert, claim, edges, tombstones and commit; per checkpoint for wal",
+    ["stage"],
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
@@ -0,0 +1,288 @@
+"""Versioned schema migrations.
+
+init_db() creates the baseline tables; everything after that is a numbered
+migration recorded in ``schema_version``. Migrations are applied in version
+order and each one is idempotent (columns are checked before ALTER, indexes
+use IF NOT EXISTS), so a crash between applying a migration and recording
+it only means it runs again, harmlessly, on the next start.
+
+Index builds and data backfills on large tables are *online* migrations:
+running them inline in init_db would hold the write lock for as long as
+they take, and the ingest writer would stall behind it. When the table has
+more than MIGRATION_ONLINE_MIN_ROWS rows init_db leaves them pending; the
+consumer then runs them as maintenance jobs on its writer thread in the
+gaps between ingest batches. A backfill (BackfillJob) is one rowid range
+per transaction. An index build (IndexBuildJob) warms the table in rowid
+chunks and issues the CREATE INDEX itself in one gap: SQLite cannot build a
+single index incrementally, so that statement is the one step that is not
+chunked. The writer is stalled for as long as it runs, and with
+INGEST_OVERFLOW=drop every frame arriving meanwhile is lost, so
+MIGRATION_MAX_STEP_S bounds it to a few seconds. A build that overruns is
+rolled back, logged and counted (migrations_abandoned_total) and left
+pending; the consumer does not try it again until it restarts.
+
+That is the trade-off: online builds never stall ingest for longer than
+MIGRATION_MAX_STEP_S, but an index on a large table may not fit in it.
+Build those offline, with the consumer stopped (or during a planned
+pause), using ``migrations apply`` below; raising MIGRATION_MAX_STEP_S
+instead trades that many seconds of intake per attempt.
+
+Online migrations touch nothing but their own index or the rows they fill
+in, and so may complete out of version order; readers must cope with a
+backfill in progress.
+
+Pending migrations are logged at startup and listed by
+
+    python -m labeler.migrations status [--shard N]
+    python -m labeler.migrations apply  [--shard N]   # everything, inline
+
+Env vars:
+  MIGRATION_ONLINE_MIN_ROWS — table size above which index builds are left to the consumer (default 200000)
+  MIGRATION_WARM_CHUNK      — rows read per warm-up step of an online build (default 50000)
+  MIGRATION_MAX_STEP_S      — time allowed for an online build's final CREATE INDEX (default 5)
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from .posts import THREAD_KEY
+
+LOG = logging.getLogger("labeler.migrations")
+
+MIGRATION_ONLINE_MIN_ROWS = int(os.getenv("MIGRATION_ONLINE_MIN_ROWS", "200000"))
+MIGRATION_WARM_CHUNK = int(os.getenv("MIGRATION_WARM_CHUNK", "50000"))
+MIGRATION_MAX_STEP_S = float(os.getenv("MIGRATION_MAX_STEP_S", "5"))
+
+
+@dataclass
+class Migration:
+    """One schema change. ``table`` is set for online migrations: index
+    builds, and data backfills whose ``backfill(conn, after_rowid, limit)``
+    processes one rowid range and returns where to resume (None: done)."""
+
+    version: int
+    name: str
+    apply: Callable
+    table: Optional[str] = None
+    columns: Sequence[str] = field(default_factory=tuple)
+    backfill: Optional[Callable] = None
+
+    @property
+    def online(self) -> bool:
+        return self.table is not None
+
+
+def _add_column(table: str, column: str, decl: str) -> Callable:
+    def apply(conn):
+        cols = {r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+        if column not in cols:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+    return apply
+
+
+def _create_index(name: str, table: str, columns: Sequence[str], replaces: Sequence[str] = ()) -> Callable:
+    def apply(conn):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({', '.join(columns)})")
+        for old in replaces:
+            conn.execute(f"DROP INDEX IF EXISTS {old}")
+
+    return apply
+
+
+def _add_columns(table: str, columns: Sequence[Tuple[str, str]]) -> Callable:
+    adders = [_add_column(table, name, decl) for name, decl in columns]
+
+    def apply(conn):
+        for add in adders:
+            add(conn)
+
+    return apply
+
+
+def _run_backfill(chunk_fn: Callable, chunk: int) -> Callable:
+    def apply(conn):
+        pos = 0
+        while pos is not None:
+            pos = chunk_fn(conn, pos, chunk)
+
+    return apply
+
+
+def _backfill(version: int, name: str, table: str, chunk_fn: Callable, chunk: int = 5000) -> Migration:
+    return Migration(version, name, _run_backfill(chunk_fn, chunk), table=table, backfill=chunk_fn)
+
+
+def _project_events_chunk(conn, after_rowid, limit):
+    from .posts import backfill_chunk_txn
+
+    return backfill_chunk_txn(conn, after_rowid, limit)
+
+
+def _create_table(table: str, columns: str) -> Callable:
+    def apply(conn):
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+
+    return apply
+
+
+def _index(version: int, name: str, table: str, columns: Sequence[str], replaces: Sequence[str] = ()) -> Migration:
+    return Migration(version, name, _create_index(name, table, columns, replaces), table=table, columns=tuple(columns))
+
+
+MIGRATIONS: List[Migration] = [
+    # these two used to be unconditional ALTERs in init_db
+    Migration(1, "labels_expired_at", _add_column("labels", "expired_at", "TIMESTAMP")),
+    Migration(2, "claim_history_fingerprint_version", _add_column("claim_history", "fingerprint_version", "TEXT")),
+    # /exposure: count(*) FROM edges WHERE dst_did = ?
+    _index(3, "idx_edges_dst", "edges", ("dst_did",)),
+    # label lookups by (subject, labeler, label); the prefix covers the old
+    # subject-only index, which is dropped
+    _index(4, "idx_labels_subject_labeler_label", "labels", ("subject_uri", "labeler_did", "label"),
+           replaces=("idx_labels_subject",)),
+    # claim-group history ordered by createdAt (claims, longitudinal)
+    _index(5, "idx_claim_history_author_fp", "claim_history", ("authorDid", "claim_fingerprint", "createdAt")),
+    # /recent-decisions?rule_id=..., newest first
+    _index(6, "idx_label_decisions_rule_created", "label_decisions", ("rule_id", "created_at")),
+    # unfiltered /recent-decisions and the daily budget counts
+    _index(7, "idx_label_decisions_created", "label_decisions", ("created_at",)),
+    # /quarantine/recent and `cli quarantine list`
+    _index(8, "idx_quarantine_emits_created", "quarantine_emits", ("created_at",)),
+    # recent-events window scans (ctime >= ? ORDER BY ctime DESC)
+    _index(9, "idx_events_ctime", "events", ("ctime",)),
+    # zstd dictionaries for compressed raw payloads (rawcodec.py)
+    Migration(10, "raw_dicts", _create_table(
+        "raw_dicts", "dict_id INTEGER PRIMARY KEY, dict BLOB, created_at TIMESTAMP, samples INTEGER"
+    )),
+    # projected Post columns (posts.py), written at insert from here on;
+    # ADD COLUMN only touches the schema, existing rows read as NULL
+    Migration(11, "events_post_columns", _add_columns("events", [
+        ("root_uri", "TEXT"), ("parent_uri", "TEXT"), ("collection", "TEXT"), ("cid", "TEXT"),
+        ("text", "TEXT"), ("has_links", "INTEGER"), ("created_at", "TIMESTAMP"),
+    ])),
+    # ...and filled in for existing rows, in rowid chunks
+    _backfill(12, "events_post_columns_backfill", "events", _project_events_chunk),
+    # thread membership for rechecks (posts.load_thread); an expression
+    # index, so there is no membership table to keep in step
+    _index(13, "idx_events_thread", "events", (THREAD_KEY,)),
+    # per-thread evaluation watermark for incremental rechecks (thread_state.py)
+    Migration(14, "thread_eval_state", _create_table(
+        "thread_eval_state",
+        "root_uri TEXT PRIMARY KEY, watermark INTEGER, digest TEXT, config_hash TEXT, evaluated_at TIMESTAMP",
+    )),
+    # deleted records (db.apply_tombstones_txn): a create that arrives after
+    # its delete (cursor rewind, replay) must not resurrect it
+    Migration(15, "tombstones", _create_table(
+        "tombstones", "event_uri TEXT PRIMARY KEY, author TEXT, deleted_at TIMESTAMP"
+    )),
+    # lookups the tombstone purge does per deleted post
+    _index(16, "idx_claim_history_post_uri", "claim_history", ("post_uri",)),
+    _index(17, "idx_edges_src_ctime", "edges", ("src_did", "ctime")),
+    # retention of tombstones (retention.retention_plan)
+    _index(18, "idx_tombstones_deleted_at", "tombstones", ("deleted_at",)),
+    # the post an edge came from, so a delete purges exactly its edges
+    # (db.apply_tombstones_txn); older rows read as NULL
+    Migration(19, "edges_event_uri", _add_column("edges", "event_uri", "TEXT")),
+    _index(20, "idx_edges_event_uri", "edges", ("event_uri",)),
+    # retention of thread evaluation state (retention.retention_plan)
+    _index(21, "idx_thread_eval_state_evaluated", "thread_eval_state", ("evaluated_at",)),
+]
+
+
+def _ensure_table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TIMESTAMP
+        )
+        """
+    )
+
+
+def current_versions(conn) -> set:
+    _ensure_table(conn)
+    return {r[0] for r in conn.execute("SELECT version FROM schema_version").fetchall()}
+
+
+def pending(conn, migrations: Sequence[Migration] = MIGRATIONS) -> List[Migration]:
+    done = current_versions(conn)
+    return [m for m in sorted(migrations, key=lambda m: m.version) if m.version not in done]
+
+
+def apply_txn(conn, migration: Migration):
+    """Apply one migration and record it. Does not commit."""
+    migration.apply(conn)
+    record_txn(conn, migration)
+
+
+def record_txn(conn, migration: Migration):
+    """Mark a migration applied (online jobs that did the work themselves)."""
+    conn.execute(
+        "INSERT OR REPLACE INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+        (migration.version, migration.name, datetime.datetime.now(datetime.timezone.utc).isoformat()),
+    )
+
+
+def table_rows(conn, table: str) -> int:
+    """Cheap size estimate: max(rowid) is one b-tree seek, count(*) a scan."""
+    row = conn.execute(f"SELECT max(rowid) FROM {table}").fetchone()
+    return int(row[0] or 0) if row else 0
+
+
+def migrate(conn, online_min_rows: Optional[int] = None,
+            migrations: Sequence[Migration] = MIGRATIONS) -> List[Migration]:
+    """Apply pending migrations in order, committing each.
+
+    Online index builds on tables with more than ``online_min_rows`` rows
+    (MIGRATION_ONLINE_MIN_ROWS; 0 disables deferral) are skipped and
+    returned, still pending, for the consumer to run.
+    """
+    limit = MIGRATION_ONLINE_MIN_ROWS if online_min_rows is None else online_min_rows
+    deferred = []
+    for m in pending(conn, migrations):
+        if m.online and limit and table_rows(conn, m.table) > limit:
+            deferred.append(m)
+            continue
+        apply_txn(conn, m)
+        conn.commit()
+        LOG.info("schema: applied migration %d %s", m.version, m.name)
+    return deferred
+
+
+def status(conn) -> dict:
+    versions = current_versions(conn)
+    todo = pending(conn)
+    return {
+        "version": max(versions) if versions else 0,
+        "latest": max(m.version for m in MIGRATIONS),
+        "pending": [{"version": m.version, "name": m.name, "table": m.table} for m in todo],
+    }
+
+
+def main(argv=None):
+    from .db import get_conn, init_db
+
+    parser = argparse.ArgumentParser(prog="labeler.migrations")
+    parser.add_argument("cmd", choices=["status", "apply"])
+    parser.add_argument("--shard", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    init_db(args.shard)
+    conn = get_conn(args.shard)
+    try:
+        if args.cmd == "apply":
+            migrate(conn, online_min_rows=0)
+        print(json.dumps(status(conn), indent=2))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
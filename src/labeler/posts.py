@@ -0,0 +1,272 @@
+"""Post projection: the events columns the drift rules read, and the loader.
+
+Rules and rechecks need a handful of fields per post (thread pointers,
+text, author, createdAt), yet the events table only had the raw JSON, so
+every load decoded whole events. The fields are now projected into columns
+when the event is prepared:
+
+  root_uri    replyRootUri                 parent_uri  replyParentUri
+  collection  NSID from the URI ('' if unknown; NULL: not projected yet)
+  cid, text   as in the event             created_at  Post.createdAt (UTC ISO)
+  has_links   1 if the event carries facets, embeds or externalLinks
+
+load_posts() builds drift.models.Post from the columns and decodes raw only
+for rows with has_links set (rules hash and compare those lists) or rows
+written before the projection existed and not yet backfilled (collection
+IS NULL; see backfill_chunk_txn and migrations.py).
+
+Thread membership is THREAD_KEY, the root a post belongs to: replyRootUri,
+else replyParentUri, else the post itself. It is an indexed expression
+(idx_events_thread), so load_thread() reads one thread with an index range
+scan whatever the size of the table; SQLite keeps the index current on
+insert, update and delete.
+"""
+
+import json
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from . import timeutil
+from .drift.models import Post
+from .rawcodec import decode_raw
+
+PROJECTED_COLUMNS = ("root_uri", "parent_uri", "collection", "cid", "text", "has_links", "created_at")
+EMPTY_PROJECTION = (None,) * len(PROJECTED_COLUMNS)
+
+# must match idx_events_thread (migrations.py) character for character, or
+# SQLite will not use the index
+THREAD_KEY = "coalesce(root_uri, parent_uri, event_uri)"
+# the migration that fills the columns in for pre-projection rows
+BACKFILL_VERSION = 12
+
+_SELECT = "SELECT " + ", ".join(
+    "events." + c for c in ("rowid", "event_uri", "ctime", "author") + PROJECTED_COLUMNS
+) + " FROM events"
+_IN_CHUNK = 500
+_CLAIM_KEYS_CHUNK = 400  # (authorDid, fingerprint) pairs per query; 2 params each
+
+
+def collection_of(ev: dict, event_uri: str) -> str:
+    coll = ev.get("_collection")
+    if coll:
+        return coll
+    if event_uri.startswith("at://"):
+        parts = event_uri[5:].split("/")
+        if len(parts) >= 3:
+            return parts[1]
+    return ""
+
+
+def project_event(ev: dict, event_uri: str, ctime_iso: str) -> tuple:
+    """PROJECTED_COLUMNS values for a canonical event dict."""
+    return (
+        ev.get("replyRootUri"),
+        ev.get("replyParentUri"),
+        collection_of(ev, event_uri),
+        ev.get("cid"),
+        ev.get("text", ""),
+        1 if (ev.get("facets") or ev.get("embeds") or ev.get("externalLinks")) else 0,
+        timeutil.to_utc_iso(ev.get("createdAt") or ctime_iso),
+    )
+
+
+def post_from_raw(data: dict, event_uri: str, ctime) -> Post:
+    """Post from a decoded raw event (the pre-projection path)."""
+    return Post(
+        uri=data.get("uri") or event_uri,
+        cid=data.get("cid"),
+        text=data.get("text", ""),
+        createdAt=timeutil.to_utc_iso(data.get("createdAt") or ctime),
+        authorDid=data.get("authorDid", ""),
+        replyParentUri=data.get("replyParentUri"),
+        replyRootUri=data.get("replyRootUri"),
+        facets=data.get("facets", []),
+        embeds=data.get("embeds", []),
+        externalLinks=data.get("externalLinks", []),
+    )
+
+
+def _post_from_columns(row) -> Post:
+    _rowid, event_uri, _ctime, author, root, parent, _coll, cid, text, _links, created_at = row
+    return Post(
+        uri=event_uri,
+        cid=cid,
+        text=text or "",
+        createdAt=created_at,
+        authorDid=author or "",
+        replyParentUri=parent,
+        replyRootUri=root,
+    )
+
+
+def _raw_by_rowid(conn, rowids: List[int]) -> dict:
+    out = {}
+    for i in range(0, len(rowids), _IN_CHUNK):
+        chunk = rowids[i:i + _IN_CHUNK]
+        marks = ",".join("?" * len(chunk))
+        out.update(conn.execute(f"SELECT rowid, raw FROM events WHERE rowid IN ({marks})", chunk).fetchall())
+    return out
+
+
+def load_post_rows(conn, where: str = "", params: Sequence = (), extra: Sequence[str] = (),
+                   keep=None) -> List[Tuple[Post, tuple]]:
+    """(Post, values of the ``extra`` columns) for ``SELECT ..., <extra>
+    FROM events <where>``, in query order. ``where`` may start with a JOIN;
+    the post columns are qualified.
+
+    ``keep(event_uri, data)`` filters rows that had to be decoded because
+    they are not projected yet; projected rows are filtered by ``where``.
+    """
+    select = _SELECT if not extra else _SELECT.replace(" FROM events", ", " + ", ".join(extra) + " FROM events")
+    rows = conn.execute(f"{select} {where}", tuple(params)).fetchall()
+    need_raw = [r[0] for r in rows if r[6] is None or r[9]]
+    raw = _raw_by_rowid(conn, need_raw) if need_raw else {}
+    out = []
+    base = 4 + len(PROJECTED_COLUMNS)
+    for r in rows:
+        if r[6] is not None and not r[9]:
+            out.append((_post_from_columns(r[:base]), r[base:]))
+            continue
+        try:
+            data = json.loads(decode_raw(raw.get(r[0]), conn))
+        except Exception:
+            continue
+        if r[6] is None:
+            if keep is not None and not keep(r[1], data):
+                continue
+            out.append((post_from_raw(data, r[1], r[2]), r[base:]))
+            continue
+        p = _post_from_columns(r[:base])
+        p.facets = data.get("facets", [])
+        p.embeds = data.get("embeds", [])
+        p.externalLinks = data.get("externalLinks", [])
+        out.append((p, r[base:]))
+    return out
+
+
+def load_posts(conn, where: str = "", params: Sequence = (), keep=None) -> List[Post]:
+    """Posts for ``SELECT ... FROM events <where>``, in query order."""
+    return [p for p, _ in load_post_rows(conn, where, params, keep=keep)]
+
+
+def thread_root(event_uri: str, data: dict) -> str:
+    """THREAD_KEY for a decoded raw event."""
+    return data.get("replyRootUri") or data.get("replyParentUri") or event_uri
+
+
+def backfill_done(conn) -> bool:
+    try:
+        row = conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (BACKFILL_VERSION,)).fetchone()
+    except Exception:
+        return False
+    return row is not None
+
+
+def load_thread_rows(conn, root_uri: str) -> List[Tuple[Post, int]]:
+    """(Post, events rowid) for the thread rooted at ``root_uri`` (the root
+    included), in rowid order.
+
+    While the backfill is still pending, unprojected rows are decoded and
+    matched too; that scans them, as every load did before the projection.
+    """
+    if backfill_done(conn):
+        rows = load_post_rows(conn, f"WHERE {THREAD_KEY} = ?", (root_uri,), extra=("events.rowid",))
+    else:
+        rows = load_post_rows(
+            conn,
+            f"WHERE {THREAD_KEY} = ? OR collection IS NULL",
+            (root_uri,),
+            extra=("events.rowid",),
+            keep=lambda event_uri, data: thread_root(event_uri, data) == root_uri,
+        )
+    return [(p, extra[0]) for p, extra in rows]
+
+
+def load_thread(conn, root_uri: str) -> List[Post]:
+    """The posts of the thread rooted at ``root_uri``, in rowid order."""
+    return [p for p, _ in load_thread_rows(conn, root_uri)]
+
+
+def load_thread_all_shards(root_uri: str) -> List[Post]:
+    """load_thread over every shard (db.shard_ids), for when replies are
+    stored on their authors' shards. Each shard's rows are decoded on its
+    own connection, as db.query_shards reads them."""
+    from . import db
+
+    posts = []
+    for shard in db.shard_ids():
+        conn = db.get_conn(shard)
+        try:
+            posts.extend(load_thread(conn, root_uri))
+        finally:
+            conn.close()
+    return posts
+
+
+def load_claim_group(conn, author_did: str, claim_fingerprint: str, before: Optional[str] = None) -> List[Post]:
+    """The posts in an author's claim_history for one fingerprint, ordered by
+    the history's createdAt (only those before ``before``, if given).
+
+    One query joining claim_history to events, so ``conn`` must be the
+    author's shard (get_conn_for_did); history rows whose event is gone are
+    skipped.
+    """
+    where = (
+        "JOIN claim_history h ON h.post_uri = events.event_uri"
+        " WHERE h.authorDid = ? AND h.claim_fingerprint = ?"
+    )
+    params: Tuple = (author_did, claim_fingerprint)
+    if before is not None:
+        where += " AND h.createdAt < ?"
+        params += (before,)
+    return load_posts(conn, where + " ORDER BY h.createdAt ASC", params)
+
+
+def load_claim_groups(conn, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], List[Tuple[str, Post]]]:
+    """Several claim groups at once: (authorDid, fingerprint) -> [(history
+    createdAt, Post)], each ordered by createdAt. One query per
+    _CLAIM_KEYS_CHUNK keys, all on ``conn`` (so the authors must share a
+    shard)."""
+    keys = sorted(set(keys))
+    out: Dict[Tuple[str, str], List[Tuple[str, Post]]] = {k: [] for k in keys}
+    step = _CLAIM_KEYS_CHUNK
+    for i in range(0, len(keys), step):
+        chunk = keys[i:i + step]
+        # an OR of equalities, one index search each; SQLite scans the whole
+        # table for a row-value IN (VALUES ...)
+        pairs = " OR ".join("(h.authorDid = ? AND h.claim_fingerprint = ?)" for _ in chunk)
+        rows = load_post_rows(
+            conn,
+            f"JOIN claim_history h ON h.post_uri = events.event_uri WHERE {pairs} ORDER BY h.createdAt ASC",
+            [v for k in chunk for v in k],
+            extra=("h.authorDid", "h.claim_fingerprint", "h.createdAt"),
+        )
+        for post, (author, fp, created) in rows:
+            out[(author, fp)].append((created, post))
+    return out
+
+
+def backfill_chunk_txn(conn, after_rowid: int, limit: int) -> Optional[int]:
+    """Project the unprojected events with rowid in (after_rowid,
+    after_rowid + limit]. Does not commit. Returns the end of the range, or
+    None once past the last row."""
+    hi = conn.execute("SELECT max(rowid) FROM events").fetchone()[0] or 0
+    if after_rowid >= hi:
+        return None
+    end = after_rowid + limit
+    rows = conn.execute(
+        "SELECT rowid, event_uri, ctime, raw FROM events WHERE rowid > ? AND rowid <= ? AND collection IS NULL",
+        (after_rowid, end),
+    ).fetchall()
+    updates: List[Tuple] = []
+    for rowid, event_uri, ctime, raw in rows:
+        try:
+            values = project_event(json.loads(decode_raw(raw, conn)), event_uri, ctime)
+        except Exception:
+            # undecodable: mark projected, keep has_links so readers still
+            # try (and skip) the raw
+            values = (None, None, "", None, None, 1, ctime)
+        updates.append((*values, rowid))
+    sets = ", ".join(f"{c} = ?" for c in PROJECTED_COLUMNS)
+    if updates:
+        conn.executemany(f"UPDATE events SET {sets} WHERE rowid = ?", updates)
+    return end
@@ -0,0 +1,159 @@
+"""Parse/transform stage of the ingest pipeline.
+
+All the CPU-bound work between a raw Jetstream frame and the rows the writer
+inserts: JSON decode, canonical event transform, serialization, claim
+fingerprinting, evidence hashing, edge extraction and the projected Post
+columns (posts.py). The output is a
+PreparedEvent the writer thread applies with plain executes.
+
+The stage runs inline on the writer thread by default. With PARSE_WORKERS > 0
+the consumer ships raw frames here in chunks via a process pool, so
+fingerprinting is no longer bounded by one GIL-bound thread. Either way the
+rows written are identical — the writer does not care where they came from.
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from . import timeutil
+from .extractor import extract_edges_from_event
+from .frames import decode_frame, get_decompressor
+from .posts import project_event
+
+
+@dataclass
+class PreparedEvent:
+    event_uri: str
+    ctime: str  # normalized UTC ISO
+    author: str
+    raw_json: str
+    root_uri: str  # thread root to schedule for recheck on insert/update
+    claim_row: Optional[tuple] = None  # claim_history row, None if not a text post
+    edges: List[tuple] = field(default_factory=list)  # (src, dst, type, ctime, event_uri)
+    deleted: bool = False  # tombstone: apply with db.apply_tombstones_txn
+    time_us: Optional[int] = None  # Jetstream cursor of the frame, if known
+    t_enq: Optional[float] = None  # monotonic enqueue time, sampled events only (stagetiming)
+    projection: tuple = ()  # posts.PROJECTED_COLUMNS values for the events row
+
+
+def prepare_event(ev: dict, event_uri: Optional[str] = None, ctime=None, author: Optional[str] = None) -> PreparedEvent:
+    """Compute everything the writer needs for one canonical event dict.
+
+    ``event_uri``/``ctime``/``author`` default to the fields the consumer
+    has always used (``uri``, ``createdAt``/``time``, ``authorDid``/``author``).
+    """
+    from .claims import claim_history_row, evidence_hash_from_raw
+
+    time_us = ev.get("_time_us")
+    t_enq = ev.get("_t_enq")
+    if time_us is not None or t_enq is not None:
+        # stream position and timing stamps, not content: keep them out of
+        # the stored raw
+        ev = {k: v for k, v in ev.items() if k not in ("_time_us", "_t_enq")}
+    event_uri = event_uri or ev["uri"]
+    author = author or ev.get("authorDid") or ev.get("author")
+    if ctime is None:
+        ctime = ev.get("createdAt") or ev.get("time")
+    ctime_iso = timeutil.to_utc_datetime(ctime).isoformat()
+    if ev.get("_operation") == "delete":
+        # the root and edges are only known from the stored event, which the
+        # writer reads when it applies the tombstone
+        return PreparedEvent(
+            event_uri, ctime_iso, author, json.dumps(ev), event_uri,
+            deleted=True, time_us=time_us, t_enq=t_enq,
+        )
+    root = ev.get("replyRootUri") or ev.get("replyParentUri") or event_uri
+
+    claim_row = None
+    try:
+        text = ev.get("text")
+        if text:
+            evidence_hash = evidence_hash_from_raw(ev)
+            claim_row = claim_history_row(author, text, ctime_iso, event_uri, ev.get("cid"), None, None, evidence_hash)
+    except Exception:
+        pass
+
+    return PreparedEvent(
+        event_uri=event_uri,
+        ctime=ctime_iso,
+        author=author,
+        raw_json=json.dumps(ev),
+        root_uri=root,
+        claim_row=claim_row,
+        edges=[(*e, event_uri) for e in extract_edges_from_event(ev)],
+        time_us=time_us,
+        t_enq=t_enq,
+        projection=project_event(ev, event_uri, ctime_iso),
+    )
+
+
+def dumps_prepared(prep: PreparedEvent) -> bytes:
+    """A PreparedEvent as a spill payload (spill.py), so replaying it applies
+    the prepared rows instead of preparing the event again on the writer
+    thread. ``t_enq`` is not kept: a replayed event's wait isn't queue wait."""
+    return json.dumps([
+        prep.event_uri, prep.ctime, prep.author, prep.raw_json, prep.root_uri,
+        prep.claim_row, prep.edges, prep.deleted, prep.time_us, prep.projection,
+    ]).encode("utf-8")
+
+
+def loads_spilled(payload: bytes) -> PreparedEvent:
+    """A spill payload back as a PreparedEvent. Payloads from dumps_prepared
+    (a JSON array) are rebuilt as they were; event dicts (events that
+    overflowed before being prepared, or spill files from older versions)
+    are prepared now."""
+    data = json.loads(payload)
+    if not isinstance(data, list):
+        return prepare_event(data)
+    event_uri, ctime, author, raw_json, root_uri, claim_row, edges, deleted, time_us, projection = data
+    return PreparedEvent(
+        event_uri=event_uri,
+        ctime=ctime,
+        author=author,
+        raw_json=raw_json,
+        root_uri=root_uri,
+        claim_row=tuple(claim_row) if claim_row is not None else None,
+        edges=[tuple(e) for e in edges],
+        deleted=deleted,
+        time_us=time_us,
+        projection=tuple(projection),
+    )
+
+
+def prepare_frames(
+    frames: List,
+    zstd_dict_path: Optional[str] = None,
+    shard: Optional[Tuple[int, int]] = None,
+) -> Tuple[List[PreparedEvent], Optional[str], int]:
+    """Decode and prepare a chunk of raw Jetstream frames.
+
+    Runs in a parse worker process. With ``zstd_dict_path`` the frames are
+    still compressed and are decompressed here, so the event loop never pays
+    for it and the chunk crosses the process boundary compact. Returns (prepared, cursor, errors) where
+    ``cursor`` is the ``time_us`` of the last frame in the chunk that carried
+    one (frames are processed in arrival order, matching the inline path) and
+    ``errors`` counts frames that failed to decode. ``shard`` is passed to
+    decode_frame to keep only this consumer's DIDs.
+    """
+    prepared = []
+    cursor = None
+    errors = 0
+    dctx = get_decompressor(zstd_dict_path) if zstd_dict_path else None
+    for raw in frames:
+        try:
+            if dctx is not None:
+                raw = dctx.decompress(raw)
+            time_us, ev = decode_frame(raw, shard=shard)
+        except Exception:
+            errors += 1
+            continue
+        if time_us:
+            cursor = time_us
+        if ev is None:
+            continue
+        try:
+            prepared.append(prepare_event(ev))
+        except Exception:
+            errors += 1
+    return prepared, cursor, errors
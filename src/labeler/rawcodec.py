@@ -0,0 +1,304 @@
+"""Storage codec for events.raw and event_versions.raw.
+
+The raw column holds the canonical event dict as JSON, which repeats the
+record's text, facets and embeds, and event_versions keeps a full copy per
+edit. With RAW_CODEC=zstd new payloads are stored as BLOBs compressed with
+a zstd dictionary trained on this database's own rows; small JSON documents
+compress several times better against a dictionary than on their own.
+
+Stored formats, told apart per row:
+
+  TEXT             plain JSON (the original format; RAW_CODEC=text)
+  BLOB 0x01 + ...  zstd frame. The frame header carries the id of the
+                   dictionary it was compressed with (0: none); dictionaries
+                   are kept in the raw_dicts table, so every row stays
+                   decodable after the dictionary is retrained.
+
+Writers get an encoder(conn) per batch; every reader goes through
+decode_raw() / load_raw(), which pass TEXT through unchanged, so old rows
+and mixed tables read transparently and RAW_CODEC can be switched either way
+without a migration. Encoders pick up a newly trained dictionary within
+RAW_DICT_REFRESH_S.
+
+    python -m labeler.rawcodec train [--samples 5000] [--dict-size 65536]
+    python -m labeler.rawcodec recompress [--chunk 2000] [--table events]
+    python -m labeler.rawcodec stats
+
+recompress rewrites rows in small transactions (safe next to a running
+consumer) and reports payload bytes and table pages before and after: pages
+are what a scan pulls through the page cache. Freed pages are reused by new
+rows; the file itself only shrinks after VACUUM.
+
+Env vars:
+  RAW_CODEC           — codec for newly written payloads: text | zstd (default text)
+  RAW_ZSTD_LEVEL      — zstd compression level (default 3)
+  RAW_DICT_REFRESH_S  — how often writers look for a newer dictionary (default 300)
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, Optional, Tuple, Union
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+LOG = logging.getLogger("labeler.rawcodec")
+
+RAW_CODEC = os.getenv("RAW_CODEC", "text").lower()
+RAW_ZSTD_LEVEL = int(os.getenv("RAW_ZSTD_LEVEL", "3"))
+RAW_DICT_REFRESH_S = float(os.getenv("RAW_DICT_REFRESH_S", "300"))
+
+CODEC_ZSTD = 0x01
+RAW_TABLES = ("events", "event_versions")
+
+Stored = Union[str, bytes]
+
+# dict_id -> ZstdDecompressor; dictionaries never change once trained
+_decompressors: Dict[int, object] = {}
+# database file -> (loaded_at, encode function)
+_encoders: Dict[str, Tuple[float, Callable[[str], Stored]]] = {}
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise RuntimeError("RAW_CODEC=zstd requires the zstandard package")
+
+
+def _identity(text: str) -> Stored:
+    return text
+
+
+def _db_key(conn) -> str:
+    row = conn.execute("PRAGMA database_list").fetchone()
+    return row[2] if row else ""
+
+
+def _latest_dict(conn):
+    try:
+        return conn.execute(
+            "SELECT dict_id, dict FROM raw_dicts ORDER BY created_at DESC, rowid DESC LIMIT 1"
+        ).fetchone()
+    except Exception:
+        return None  # raw_dicts not migrated yet
+
+
+def encoder(conn, codec: Optional[str] = None) -> Callable[[str], Stored]:
+    """Encode function for payloads written on ``conn``'s database.
+
+    Fetch once per batch: with zstd it compresses against the newest
+    dictionary in raw_dicts (or none before the first ``train``).
+    """
+    codec = (codec or RAW_CODEC).lower()
+    if codec != "zstd":
+        return _identity
+    _require_zstd()
+    key = _db_key(conn)
+    cached = _encoders.get(key)
+    now = time.monotonic()
+    if cached is not None and now - cached[0] < RAW_DICT_REFRESH_S:
+        return cached[1]
+    row = _latest_dict(conn)
+    if row is not None:
+        cctx = zstandard.ZstdCompressor(
+            level=RAW_ZSTD_LEVEL, dict_data=zstandard.ZstdCompressionDict(bytes(row[1])),
+            write_content_size=True,
+        )
+    else:
+        cctx = zstandard.ZstdCompressor(level=RAW_ZSTD_LEVEL, write_content_size=True)
+    prefix = bytes([CODEC_ZSTD])
+
+    def encode(text: str) -> Stored:
+        return prefix + cctx.compress(text.encode("utf-8"))
+
+    _encoders[key] = (now, encode)
+    return encode
+
+
+def _decompressor(dict_id: int, conn):
+    d = _decompressors.get(dict_id)
+    if d is not None:
+        return d
+    _require_zstd()
+    if dict_id == 0:
+        d = zstandard.ZstdDecompressor()
+    else:
+        row = None
+        if conn is not None:
+            row = conn.execute("SELECT dict FROM raw_dicts WHERE dict_id = ?", (dict_id,)).fetchone()
+        if row is None:
+            raise LookupError(f"raw payload needs zstd dictionary {dict_id}, not in raw_dicts")
+        d = zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(bytes(row[0])))
+    _decompressors[dict_id] = d
+    return d
+
+
+def decode_raw(value, conn=None) -> Optional[str]:
+    """Stored raw payload -> JSON text. ``conn`` is needed only the first
+    time a dictionary is seen, to load it from raw_dicts."""
+    if value is None or isinstance(value, str):
+        return value
+    data = bytes(value)
+    if not data:
+        return ""
+    if data[0] == CODEC_ZSTD:
+        frame = data[1:]
+        dict_id = zstandard.get_frame_parameters(frame).dict_id if zstandard is not None else 0
+        return _decompressor(dict_id, conn).decompress(frame).decode("utf-8")
+    raise ValueError(f"unknown raw payload codec 0x{data[0]:02x}")
+
+
+def load_raw(value, conn=None) -> dict:
+    return json.loads(decode_raw(value, conn))
+
+
+def _stored_len(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(value)
+
+
+def train(conn, samples: int = 5000, dict_size: int = 65536) -> Tuple[int, int]:
+    """Train a dictionary on the newest ``samples`` events and store it in
+    raw_dicts. Does not commit. Returns (dict_id, samples used)."""
+    _require_zstd()
+    rows = conn.execute("SELECT raw FROM events ORDER BY rowid DESC LIMIT ?", (samples,)).fetchall()
+    data = [decode_raw(r[0], conn).encode("utf-8") for r in rows if r[0] is not None]
+    if len(data) < 100:
+        raise ValueError(f"need at least 100 stored events to train a dictionary, have {len(data)}")
+    d = zstandard.train_dictionary(dict_size, data, level=RAW_ZSTD_LEVEL)
+    conn.execute(
+        "INSERT OR REPLACE INTO raw_dicts (dict_id, dict, created_at, samples) VALUES (?, ?, ?, ?)",
+        (d.dict_id(), d.as_bytes(), time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), len(data)),
+    )
+    _encoders.clear()
+    return d.dict_id(), len(data)
+
+
+def recompress_chunk_txn(conn, table: str, after_rowid: int, limit: int,
+                         encode: Callable[[str], Stored]) -> Tuple[Optional[int], int, int, int]:
+    """Re-encode up to ``limit`` rows of ``table`` after ``after_rowid``.
+    Does not commit.
+
+    Returns (last rowid or None when done, rows rewritten, stored bytes
+    before, stored bytes after) for the rows scanned.
+    """
+    rows = conn.execute(
+        f"SELECT rowid, raw FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?", (after_rowid, limit)
+    ).fetchall()
+    if not rows:
+        return None, 0, 0, 0
+    before = after = 0
+    updates = []
+    for rowid, raw in rows:
+        new = encode(decode_raw(raw, conn)) if raw is not None else None
+        before += _stored_len(raw)
+        if new is not None and new != raw and _stored_len(new) < _stored_len(raw):
+            updates.append((new, rowid))
+            after += _stored_len(new)
+        else:
+            after += _stored_len(raw)
+    if updates:
+        conn.executemany(f"UPDATE {table} SET raw = ? WHERE rowid = ?", updates)
+    return rows[-1][0], len(updates), before, after
+
+
+def table_pages(conn, table: str) -> Optional[int]:
+    """Pages the table's b-tree occupies (dbstat), or None if unavailable."""
+    try:
+        row = conn.execute("SELECT count(*) FROM dbstat WHERE name = ?", (table,)).fetchone()
+        return int(row[0])
+    except Exception:
+        return None
+
+
+def stats(conn) -> dict:
+    """Row count and stored bytes per table and storage format."""
+    out = {}
+    for table in RAW_TABLES:
+        out[table] = {
+            typ: {"rows": n, "bytes": b or 0}
+            for typ, n, b in conn.execute(
+                f"SELECT typeof(raw), count(*), sum(length(CAST(raw AS BLOB))) FROM {table} GROUP BY 1"
+            ).fetchall()
+        }
+        out[table]["pages"] = table_pages(conn, table)
+    out["page_size"] = conn.execute("PRAGMA page_size").fetchone()[0]
+    out["dictionaries"] = conn.execute("SELECT count(*) FROM raw_dicts").fetchone()[0]
+    return out
+
+
+def recompress(conn, tables=RAW_TABLES, chunk: int = 2000, pause_s: float = 0.0) -> dict:
+    """Re-encode every row of ``tables`` with zstd, one transaction per
+    chunk, and report the savings."""
+    encode = encoder(conn, codec="zstd")
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    report = {}
+    for table in tables:
+        pages_before = table_pages(conn, table)
+        pos, rewritten, before, after = 0, 0, 0, 0
+        while True:
+            last, n, b, a = recompress_chunk_txn(conn, table, pos, chunk, encode)
+            conn.commit()
+            if last is None:
+                break
+            pos, rewritten, before, after = last, rewritten + n, before + b, after + a
+            if pause_s:
+                time.sleep(pause_s)
+        pages_after = table_pages(conn, table)
+        report[table] = {
+            "rows_rewritten": rewritten,
+            "payload_bytes_before": before,
+            "payload_bytes_after": after,
+            "ratio": round(before / after, 2) if after else None,
+            "pages_before": pages_before,
+            "pages_after": pages_after,
+            "cache_bytes_saved": (
+                (pages_before - pages_after) * page_size
+                if pages_before is not None and pages_after is not None else None
+            ),
+        }
+    report["freelist_bytes"] = conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size
+    return report
+
+
+def main(argv=None):
+    from .db import get_conn, init_db
+
+    parser = argparse.ArgumentParser(prog="labeler.rawcodec")
+    parser.add_argument("--shard", type=int, default=None)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    tr = sub.add_parser("train")
+    tr.add_argument("--samples", type=int, default=5000)
+    tr.add_argument("--dict-size", type=int, default=65536)
+    rc = sub.add_parser("recompress")
+    rc.add_argument("--chunk", type=int, default=2000)
+    rc.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between chunks")
+    rc.add_argument("--table", choices=RAW_TABLES, action="append")
+    sub.add_parser("stats")
+    args = parser.parse_args(argv)
+
+    init_db(args.shard)
+    conn = get_conn(args.shard)
+    try:
+        if args.cmd == "train":
+            dict_id, n = train(conn, samples=args.samples, dict_size=args.dict_size)
+            conn.commit()
+            out = {"dict_id": dict_id, "samples": n}
+        elif args.cmd == "recompress":
+            out = recompress(conn, tables=args.table or RAW_TABLES, chunk=args.chunk, pause_s=args.pause)
+        else:
+            out = stats(conn)
+        print(json.dumps(out, indent=2))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
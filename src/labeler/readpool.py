@@ -0,0 +1,132 @@
+"""Pooled read connections and async DB reads for the API.
+
+db.get_conn() opens a fresh connection and runs five PRAGMAs per call, and
+the API handlers used it straight from the event loop, which also hosts the
+consumer when FIREHOSE_AUTO_START=1: a slow GROUP BY stalled WS pings and
+queued ingest behind it. Reads now go through here instead:
+
+- Connections are per thread and per database file and live as long as the
+  thread. They are opened with ``PRAGMA query_only`` (a handler bug cannot
+  take the write lock) and a larger sqlite3 statement cache, so repeated
+  handler queries skip the prepare step.
+- ``await run(fn, ...)`` runs a blocking read on a bounded pool of
+  READ_POOL_THREADS threads; ``await aquery_shards(sql, params)`` is the
+  async form of db.query_shards.
+
+WAL readers never wait for the writer, so the pool size bounds how much
+CPU and page cache the API can take from ingest, not lock contention.
+Only the sqlite backend is pooled; duckdb falls back to db.get_conn().
+
+Env vars:
+  READ_POOL_THREADS     — threads serving API reads (default 4)
+  READ_STATEMENT_CACHE  — prepared statements kept per connection (default 256)
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Optional
+
+from . import db
+
+LOG = logging.getLogger("labeler.readpool")
+
+READ_POOL_THREADS = max(1, int(os.getenv("READ_POOL_THREADS", "4")))
+READ_STATEMENT_CACHE = int(os.getenv("READ_STATEMENT_CACHE", "256"))
+
+_local = threading.local()
+_all_conns: list = []
+_all_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _pooled() -> bool:
+    return os.getenv("DB_BACKEND", "sqlite").lower() == "sqlite"
+
+
+def _open(path: str):
+    # check_same_thread=False only so close_all() can close it from the
+    # shutdown thread; each connection is used by its owning thread alone
+    conn = sqlite3.connect(path, cached_statements=READ_STATEMENT_CACHE, check_same_thread=False)
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA cache_size=-50000")
+    conn.execute("PRAGMA temp_store=FILE")
+    conn.execute("PRAGMA query_only=1")
+    with _all_lock:
+        _all_conns.append(conn)
+    return conn
+
+
+def read_conn(shard: Optional[int] = None):
+    """This thread's read-only connection to ``shard`` (see db.get_conn).
+
+    Not to be closed by the caller.
+    """
+    path = str(db._db_file("sqlite", shard))
+    conns: Dict[str, sqlite3.Connection] = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = _open(path)
+    return conn
+
+
+def read_conn_for_uri(uri: Optional[str]):
+    """Read connection to the shard owning the author of an at:// URI."""
+    did = db.did_from_uri(uri)
+    if db.SHARD_COUNT > 1 and did:
+        return read_conn(db.shard_for_did(did))
+    return read_conn()
+
+
+def query_shards(sql: str, params: tuple = ()) -> list:
+    """db.query_shards on pooled connections (blocking)."""
+    if not _pooled():
+        return db.query_shards(sql, params)
+    rows = []
+    for shard in db.shard_ids():
+        rows.extend(read_conn(shard).execute(sql, params).fetchall())
+    return rows
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=READ_POOL_THREADS, thread_name_prefix="labeler-read")
+    return _executor
+
+
+async def run(fn: Callable, *args, **kwargs):
+    """Run a blocking read on the read pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), partial(fn, *args, **kwargs))
+
+
+async def aquery_shards(sql: str, params: tuple = ()) -> list:
+    return await run(query_shards, sql, params)
+
+
+def close_all():
+    """Stop the pool and close every pooled connection (app shutdown)."""
+    global _executor
+    with _executor_lock:
+        ex, _executor = _executor, None
+    if ex is not None:
+        ex.shutdown(wait=True)
+    with _all_lock:
+        conns = list(_all_conns)
+        _all_conns.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
+    _local.__dict__.clear()
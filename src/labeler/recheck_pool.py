@@ -0,0 +1,125 @@
+"""Where recheck passes and their per-root rule evaluation run.
+
+run_periodic used to call recheck_once() on the event loop, so a long pass
+stalled the API and, with FIREHOSE_AUTO_START=1, the Jetstream reader
+(ping timeouts, reconnect churn). Passes now run on recheck_executor(), a
+dedicated single thread; one pass at a time, so there is still a single
+recheck writer.
+
+Within a pass, loading a thread and running the rules over it
+(longitudinal.evaluate_root) only reads, and is CPU-bound in Python. With
+RECHECK_WORKERS > 0 the dequeued roots are evaluated in parallel on a pool
+of worker processes, each reading through its own read-only connection
+(readpool.read_conn). Results are funneled back, in dequeue order, to
+recheck_once, which applies labels, ledger rows and thread state on the
+connection of the shard the roots were queued on. Passes with fewer than two roots stay inline.
+
+Env vars:
+  RECHECK_WORKERS — worker processes evaluating roots; 0 evaluates inline (default 0)
+"""
+
+import logging
+import multiprocessing
+import os
+import pathlib
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+LOG = logging.getLogger("labeler.recheck_pool")
+
+RECHECK_WORKERS = int(os.getenv("RECHECK_WORKERS", "0"))
+
+_lock = threading.Lock()
+_thread: Optional[ThreadPoolExecutor] = None
+_workers: Optional[ProcessPoolExecutor] = None
+_workers_key: Optional[tuple] = None
+
+
+def recheck_executor() -> ThreadPoolExecutor:
+    """The thread recheck passes run on."""
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="labeler-recheck")
+        return _thread
+
+
+def _init_worker(data_dir: str, shard_id: Optional[int]):
+    from . import db
+
+    db.DATA_DIR = pathlib.Path(data_dir)
+    db.SHARD_ID = shard_id
+
+
+def _evaluate_in_worker(root: str, claim_recheck: bool):
+    from . import db, readpool
+    from .longitudinal import evaluate_root
+
+    if readpool._pooled():
+        return evaluate_root(readpool.read_conn(), root, claim_recheck)
+    conn = db.get_conn()
+    try:
+        return evaluate_root(conn, root, claim_recheck)
+    finally:
+        conn.close()
+
+
+def _get_workers(n: int) -> ProcessPoolExecutor:
+    from . import db
+
+    global _workers, _workers_key
+    # workers open the database the parent has open (DATA_DIR can be
+    # repointed, e.g. by tests and benches)
+    key = (n, str(db.DATA_DIR), db.SHARD_ID)
+    with _lock:
+        if _workers is not None and _workers_key != key:
+            _workers.shutdown(wait=True)
+            _workers = None
+        if _workers is None:
+            # spawn, not fork: the parent may have a running event loop and
+            # other threads (see consumer.py's parse pool)
+            _workers = ProcessPoolExecutor(
+                max_workers=n,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(str(db.DATA_DIR), db.SHARD_ID),
+            )
+            _workers_key = key
+            LOG.info("recheck: %d root worker processes", n)
+        return _workers
+
+
+def evaluate_roots(conn, roots: List[str], claim_recheck: bool = False,
+                   workers: Optional[int] = None) -> Iterator[Tuple[str, object]]:
+    """(root, RootEvaluation or the exception it raised) for each root, in
+    order. ``conn`` is used for inline evaluation."""
+    from .longitudinal import evaluate_root
+
+    n = RECHECK_WORKERS if workers is None else workers
+    if n <= 0 or len(roots) < 2:
+        for root in roots:
+            try:
+                yield root, evaluate_root(conn, root, claim_recheck)
+            except Exception as e:
+                yield root, e
+        return
+    pool = _get_workers(n)
+    futures = [pool.submit(_evaluate_in_worker, root, claim_recheck) for root in roots]
+    for root, fut in zip(roots, futures):
+        try:
+            yield root, fut.result()
+        except Exception as e:
+            yield root, e
+
+
+def shutdown():
+    """Stop the recheck thread and worker processes (app shutdown)."""
+    global _thread, _workers, _workers_key
+    with _lock:
+        thread, _thread = _thread, None
+        workers, _workers, _workers_key = _workers, None, None
+    if thread is not None:
+        thread.shutdown(wait=False)
+    if workers is not None:
+        workers.shutdown(wait=True)
@@ -1,53 +1,95 @@
 import os
 import time
-from typing import List
+from typing import List, Optional
 from . import timeutil
 from . import metrics
 
 REDIS_URL = os.getenv("REDIS_URL")
+# stay well under SQLite's 999 host-parameter limit
+_IN_CHUNK = 500
+
+
+# Pending-root count for the depth gauge, kept incrementally so enqueues and
+# dequeues don't scan the table. Other writers (another process, tombstone
+# purges, rolled-back batches) make it drift, so it is re-counted at most
+# every RECHECK_DEPTH_RESYNC_S — hence "approximate".
+RECHECK_DEPTH_RESYNC_S = float(os.getenv("RECHECK_DEPTH_RESYNC_S", "60"))
+_local_depth: Optional[int] = None
+_depth_synced_at = 0.0
+
+
+def _adjust_local_depth(conn, delta: int):
+    global _local_depth, _depth_synced_at
+    now = time.monotonic()
+    if _local_depth is None or now - _depth_synced_at >= RECHECK_DEPTH_RESYNC_S:
+        try:
+            _local_depth = conn.execute("SELECT COUNT(*) FROM recheck_requests").fetchone()[0]
+            _depth_synced_at = now
+        except Exception:
+            return
+    else:
+        _local_depth = max(0, _local_depth + delta)
+    metrics.RECHECK_QUEUE_DEPTH.set(_local_depth)
+
+
+def note_removed(conn, n: int):
+    """Account for recheck_requests rows deleted outside the queue."""
+    if n:
+        _adjust_local_depth(conn, -n)
 
 
 class LocalFallbackQueue:
+    """recheck_requests table as a queue. Enqueues are transaction-scoped:
+    they run on the caller's conn and never commit, so the consumer's batch
+    stays one transaction."""
+
     def __init__(self, conn):
         self.conn = conn
 
     def enqueue(self, root_uri: str):
+        self.enqueue_many([root_uri])
+
+    def enqueue_many(self, roots: List[str]):
+        """Upsert distinct roots with one executemany; does not commit."""
+        roots = list(dict.fromkeys(roots))
+        if not roots:
+            return
         now = timeutil.now_utc().isoformat()
-        # upsert in DB table (portable across sqlite/duckdb)
-        cur = self.conn.execute(
-            "SELECT 1 FROM recheck_requests WHERE root_uri = ?",
-            (root_uri,),
-        ).fetchall()
-        if cur:
-            self.conn.execute(
-                "UPDATE recheck_requests SET scheduled_at = ? WHERE root_uri = ?",
-                (now, root_uri),
-            )
-        else:
-            self.conn.execute(
-                "INSERT INTO recheck_requests VALUES (?, ?)",
-                (root_uri, now),
-            )
-        self.conn.commit()
+        existing = 0
+        for i in range(0, len(roots), _IN_CHUNK):
+            chunk = roots[i:i + _IN_CHUNK]
+            existing += self.conn.execute(
+                f"SELECT COUNT(*) FROM recheck_requests WHERE root_uri IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchone()[0]
         try:
-            rows = self.conn.execute("SELECT COUNT(*) FROM recheck_requests").fetchall()
-            metrics.RECHECK_QUEUE_DEPTH.set(rows[0][0] if rows else 0)
+            self.conn.executemany(
+                "INSERT INTO recheck_requests (root_uri, scheduled_at) VALUES (?, ?) "
+                "ON CONFLICT(root_uri) DO UPDATE SET scheduled_at = excluded.scheduled_at",
+                [(r, now) for r in roots],
+            )
         except Exception:
-            pass
+            # backends without UPSERT: row by row (portable across sqlite/duckdb)
+            for r in roots:
+                if self.conn.execute("SELECT 1 FROM recheck_requests WHERE root_uri = ?", (r,)).fetchall():
+                    self.conn.execute("UPDATE recheck_requests SET scheduled_at = ? WHERE root_uri = ?", (now, r))
+                else:
+                    self.conn.execute("INSERT INTO recheck_requests VALUES (?, ?)", (r, now))
+        _adjust_local_depth(self.conn, len(roots) - existing)
 
     def dequeue(self, limit: int = 100) -> List[str]:
         rows = self.conn.execute("SELECT root_uri FROM recheck_requests ORDER BY scheduled_at ASC LIMIT ?", (limit,)).fetchall()
         roots = [r[0] for r in rows]
+        removed = 0
         for r in roots:
-            self.conn.execute("DELETE FROM recheck_requests WHERE root_uri = ?", (r,))
+            removed += self.conn.execute("DELETE FROM recheck_requests WHERE root_uri = ?", (r,)).rowcount
         self.conn.commit()
-        try:
-            rows = self.conn.execute("SELECT COUNT(*) FROM recheck_requests").fetchall()
-            metrics.RECHECK_QUEUE_DEPTH.set(rows[0][0] if rows else 0)
-        except Exception:
-            pass
+        _adjust_local_depth(self.conn, -removed)
         return roots
 
+    def depth(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM recheck_requests").fetchone()[0]
+
 
 class RedisQueue:
     def __init__(self):
@@ -56,10 +98,20 @@ class RedisQueue:
         self.key = "recheck:queue"
 
     def enqueue(self, root_uri: str):
+        self.enqueue_many([root_uri])
+
+    def enqueue_many(self, roots: List[str]):
+        """One round trip: a single ZADD for all roots plus ZCARD, pipelined."""
+        if not roots:
+            return
+        now = time.time()
         # use sorted set with timestamp score
-        self.r.zadd(self.key, {root_uri: time.time()})
+        pipe = self.r.pipeline(transaction=False)
+        pipe.zadd(self.key, {r: now for r in roots})
+        pipe.zcard(self.key)
+        _, depth = pipe.execute()
         try:
-            metrics.RECHECK_QUEUE_DEPTH.set(self.r.zcard(self.key))
+            metrics.RECHECK_QUEUE_DEPTH.set(depth)
         except Exception:
             pass
 
@@ -86,13 +138,24 @@ class RedisQueue:
                 pass
             return items
 
+    def depth(self) -> int:
+        return int(self.r.zcard(self.key))
+
+
+_redis_queue: Optional[RedisQueue] = None
+
 
 def get_queue(conn=None):
+    global _redis_queue
     if REDIS_URL:
-        try:
-            return RedisQueue()
-        except Exception:
-            pass
+        # one client (and connection pool) per process, not per enqueue
+        if _redis_queue is None:
+            try:
+                _redis_queue = RedisQueue()
+            except Exception:
+                pass
+        if _redis_queue is not None:
+            return _redis_queue
     # fallback to DB-backed queue
     if conn is None:
         from .db import get_conn
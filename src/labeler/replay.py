@@ -0,0 +1,277 @@
+"""Record-and-replay harness for raw Jetstream traffic.
+
+Recording: with REPLAY_RECORD_DIR set, the consumer writes every raw frame it
+receives, exactly as received and stamped with its arrival time, to
+gzip-compressed segment files before doing anything else with it. ``record``
+does the same straight from a Jetstream URL without running the consumer.
+
+Replay: ``serve`` plays recorded segments to any client on a local WebSocket
+at the recorded pace (--speed 1), accelerated (--speed N) or as fast as the
+socket takes them (--speed max). Point the consumer at it with
+FIREHOSE_WS_URL=ws://127.0.0.1:6009/subscribe to reproduce an incident
+offline, or to A/B writer changes against the same byte stream and compare
+``dropped``/``rollback_lost`` in the STATS line.
+
+Run as:
+    python -m labeler.replay record --url wss://jetstream2.us-east.bsky.network/subscribe --dir data/replay
+    python -m labeler.replay info --dir data/replay
+    python -m labeler.replay serve --dir data/replay --speed 10
+
+Frames are replayed byte-for-byte: a recording of a compressed subscription
+holds zstd frames and must be consumed with JETSTREAM_COMPRESS=1 and the same
+dictionary. Unlike fixture_server, the ``cursor`` query parameter is ignored
+— a replay always starts at the first recorded frame.
+
+Segment format: ``rec-<seq>.bin.gz``, a gzip stream of records, each a 13-byte
+header (big-endian float64 arrival time, uint32 length, uint8 1=text/0=binary)
+followed by the frame bytes. A segment is complete once its gzip trailer is
+written (on rotation or close); a truncated segment from a crash is read up
+to its last whole record.
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import pathlib
+import struct
+import time
+import zlib
+from typing import Iterator, List, Optional, Tuple, Union
+
+LOG = logging.getLogger("labeler.replay")
+
+REPLAY_RECORD_DIR = os.getenv("REPLAY_RECORD_DIR", "")
+REPLAY_SEGMENT_FRAMES = int(os.getenv("REPLAY_SEGMENT_FRAMES", "100000"))
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 6009
+
+_HEADER = struct.Struct(">dIB")
+_PREFIX = "rec-"
+_SUFFIX = ".bin.gz"
+
+Frame = Union[str, bytes]
+
+
+class FrameRecorder:
+    """Append raw frames to rotating gzip segments.
+
+    Called from the event loop for every frame, so it only buffers: gzip at
+    level 1 with a large write buffer keeps the per-frame cost to a memcpy
+    most of the time. Not thread-safe.
+    """
+
+    def __init__(self, directory, segment_frames: int = REPLAY_SEGMENT_FRAMES):
+        self.dir = pathlib.Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.segment_frames = max(1, segment_frames)
+        existing = _segment_seqs(self.dir)
+        self._seq = existing[-1] if existing else 0
+        self._out = None
+        self._in_segment = 0
+        self.frames = 0
+
+    def write(self, raw: Frame, arrival: Optional[float] = None):
+        if isinstance(raw, str):
+            data, is_text = raw.encode("utf-8"), 1
+        else:
+            data, is_text = bytes(raw), 0
+        if self._out is None:
+            self._seq += 1
+            self._out = gzip.open(self.dir / _seg_name(self._seq), "wb", compresslevel=1)
+            self._in_segment = 0
+        self._out.write(_HEADER.pack(arrival or time.time(), len(data), is_text))
+        self._out.write(data)
+        self._in_segment += 1
+        self.frames += 1
+        if self._in_segment >= self.segment_frames:
+            self._close_segment()
+
+    def _close_segment(self):
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+
+    def close(self):
+        self._close_segment()
+
+
+def _seg_name(seq: int) -> str:
+    return f"{_PREFIX}{seq:08d}{_SUFFIX}"
+
+
+def _segment_seqs(directory: pathlib.Path) -> List[int]:
+    seqs = []
+    for p in directory.glob(f"{_PREFIX}*{_SUFFIX}"):
+        try:
+            seqs.append(int(p.name[len(_PREFIX):-len(_SUFFIX)]))
+        except ValueError:
+            continue
+    return sorted(seqs)
+
+
+def read_frames(directory) -> Iterator[Tuple[float, Frame]]:
+    """Yield (arrival_time, frame) for every recorded frame, in order."""
+    directory = pathlib.Path(directory)
+    for seq in _segment_seqs(directory):
+        path = directory / _seg_name(seq)
+        try:
+            with gzip.open(path, "rb") as f:
+                while True:
+                    hdr = f.read(_HEADER.size)
+                    if len(hdr) < _HEADER.size:
+                        break
+                    ts, n, is_text = _HEADER.unpack(hdr)
+                    data = f.read(n)
+                    if len(data) < n:
+                        break
+                    yield ts, (data.decode("utf-8") if is_text else data)
+        except (EOFError, zlib.error, OSError) as e:
+            # a segment cut short by a crash: keep what was readable
+            LOG.warning("replay segment %s truncated: %s", path.name, e)
+
+
+def pace(arrivals: List[float], speed: Optional[float]) -> List[float]:
+    """Send offsets (seconds from replay start) for recorded arrival times.
+
+    ``speed`` 1.0 keeps the recorded gaps, N compresses them N-fold, and
+    None means no pacing at all.
+    """
+    if not arrivals or not speed:
+        return [0.0] * len(arrivals)
+    t0 = arrivals[0]
+    return [max(0.0, (t - t0) / speed) for t in arrivals]
+
+
+def info(directory) -> dict:
+    frames = 0
+    size = 0
+    first = last = None
+    for ts, raw in read_frames(directory):
+        frames += 1
+        size += len(raw)
+        first = ts if first is None else first
+        last = ts
+    return {
+        "segments": len(_segment_seqs(pathlib.Path(directory))),
+        "frames": frames,
+        "frame_bytes": size,
+        "duration_s": round((last - first), 3) if frames else 0.0,
+        "first_arrival": first,
+        "last_arrival": last,
+    }
+
+
+async def serve(
+    directory,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    speed: Optional[float] = 1.0,
+    stop: Optional[asyncio.Event] = None,
+):
+    """Replay the recording in ``directory`` to each connecting client.
+
+    Frames are loaded up front so disk and gzip don't perturb the pacing.
+    Lag (how far sends fell behind schedule) is logged per client: with a
+    slow consumer the socket's backpressure shows up there, not as skipped
+    frames.
+    """
+    import websockets
+
+    recorded = list(read_frames(directory))
+    offsets = pace([ts for ts, _ in recorded], speed)
+
+    async def handler(ws, path=None):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        max_lag = 0.0
+        for off, (_ts, raw) in zip(offsets, recorded):
+            delay = start + off - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+            await ws.send(raw)
+        LOG.info(
+            "replayed %d frames in %.1fs (speed=%s, max lag %.3fs)",
+            len(recorded), loop.time() - start, speed or "max", max_lag,
+        )
+        await ws.close()
+
+    stop = stop or asyncio.Event()
+    async with websockets.serve(handler, host, port, max_size=10 * 1024 * 1024):
+        LOG.info("replay server on ws://%s:%d/subscribe (%d frames)", host, port, len(recorded))
+        await stop.wait()
+
+
+async def record(url: str, directory, limit: Optional[int] = None, duration_s: Optional[float] = None):
+    """Record frames from ``url`` until ``limit`` frames or ``duration_s``."""
+    import websockets
+
+    rec = FrameRecorder(directory)
+    deadline = time.monotonic() + duration_s if duration_s else None
+    try:
+        async with websockets.connect(url, max_size=10 * 1024 * 1024) as ws:
+            async for raw in ws:
+                rec.write(raw)
+                if limit and rec.frames >= limit:
+                    break
+                if deadline and time.monotonic() >= deadline:
+                    break
+    finally:
+        rec.close()
+    return rec.frames
+
+
+def _speed(value: str) -> Optional[float]:
+    if value == "max":
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be > 0 or 'max'")
+    return speed
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="labeler.replay")
+    sub = parser.add_subparsers(dest="cmd")
+
+    sv = sub.add_parser("serve")
+    sv.add_argument("--dir", required=True)
+    sv.add_argument("--speed", type=_speed, default=1.0, help="1, N, or max")
+    sv.add_argument("--host", default=DEFAULT_HOST)
+    sv.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    rc = sub.add_parser("record")
+    rc.add_argument("--url", required=True)
+    rc.add_argument("--dir", required=True)
+    rc.add_argument("--limit", type=int, default=None)
+    rc.add_argument("--duration", type=float, default=None)
+
+    inf = sub.add_parser("info")
+    inf.add_argument("--dir", required=True)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.cmd == "serve":
+        try:
+            asyncio.run(serve(args.dir, args.host, args.port, args.speed))
+        except KeyboardInterrupt:
+            pass
+    elif args.cmd == "record":
+        try:
+            n = asyncio.run(record(args.url, args.dir, args.limit, args.duration))
+        except KeyboardInterrupt:
+            n = None
+        print(json.dumps({"ok": True, "dir": args.dir, "frames": n}, sort_keys=True))
+    elif args.cmd == "info":
+        print(json.dumps(info(args.dir), indent=2, sort_keys=True))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
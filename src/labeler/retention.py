@@ -5,8 +5,16 @@ Configurable via environment variables:
   RETENTION_EDGES_DAYS      — delete edges older than N days (default 14)
   RETENTION_VERSIONS_DAYS   — delete event_versions older than N days (default 7)
   RETENTION_CLAIMS_DAYS     — delete claim_history older than N days (default 30)
+  RETENTION_TOMBSTONES_DAYS — delete tombstones older than N days; never less than
+                              RETENTION_EVENTS_DAYS (default RETENTION_EVENTS_DAYS)
   RETENTION_INTERVAL_HOURS  — hours between retention passes (default 6)
   RETENTION_BATCH_SIZE      — rows per DELETE batch (default 5000)
+
+run_retention() runs a whole pass on its own connection, contending with the
+consumer's writer for the write lock. When the consumer runs with
+ENABLE_RETENTION, it instead runs retention in small preemptible chunks on its
+own writer thread (see maintenance.RetentionJob); both use retention_plan()
+and delete_chunk_txn().
 """
 import datetime
 import logging
@@ -22,23 +30,47 @@ EVENTS_DAYS = int(os.getenv("RETENTION_EVENTS_DAYS", "7"))
 EDGES_DAYS = int(os.getenv("RETENTION_EDGES_DAYS", "14"))
 VERSIONS_DAYS = int(os.getenv("RETENTION_VERSIONS_DAYS", "7"))
 CLAIMS_DAYS = int(os.getenv("RETENTION_CLAIMS_DAYS", "30"))
+# a tombstone keeps a replayed create from resurrecting a deleted post; once
+# it is older than the events horizon, so is any create it could block
+TOMBSTONES_DAYS = max(EVENTS_DAYS, int(os.getenv("RETENTION_TOMBSTONES_DAYS", str(EVENTS_DAYS))))
 BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+ENABLE_RETENTION = os.getenv("ENABLE_RETENTION", "").lower() in ("1", "true")
+INTERVAL_HOURS = int(os.getenv("RETENTION_INTERVAL_HOURS", "6"))
 
 
 def _cutoff(days: int) -> str:
     return (timeutil.now_utc() - datetime.timedelta(days=days)).isoformat()
 
 
+def retention_plan() -> list:
+    """(stats key, table, timestamp column, cutoff) for one pass, in order."""
+    return [
+        ("events", "events", "ctime", _cutoff(EVENTS_DAYS)),
+        ("edges", "edges", "ctime", _cutoff(EDGES_DAYS)),
+        ("event_versions", "event_versions", "version_ts", _cutoff(VERSIONS_DAYS)),
+        ("claim_history", "claim_history", "createdAt", _cutoff(CLAIMS_DAYS)),
+        ("tombstones", "tombstones", "deleted_at", _cutoff(TOMBSTONES_DAYS)),
+        # a thread not rechecked within the events horizon has had its posts
+        # pruned; losing the state only costs a full evaluation
+        ("thread_eval_state", "thread_eval_state", "evaluated_at", _cutoff(EVENTS_DAYS)),
+    ]
+
+
+def delete_chunk_txn(conn, table: str, ts_col: str, cutoff: str, limit: int) -> int:
+    """Delete up to ``limit`` rows older than cutoff. Does not commit."""
+    cur = conn.execute(
+        f"DELETE FROM {table} WHERE rowid IN "
+        f"(SELECT rowid FROM {table} WHERE {ts_col} < ? LIMIT ?)",
+        (cutoff, limit),
+    )
+    return cur.rowcount
+
+
 def _batch_delete(conn, table: str, ts_col: str, cutoff: str) -> int:
     """Delete rows older than cutoff in batches to avoid long locks."""
     total = 0
     while True:
-        cur = conn.execute(
-            f"DELETE FROM {table} WHERE rowid IN "
-            f"(SELECT rowid FROM {table} WHERE {ts_col} < ? LIMIT ?)",
-            (cutoff, BATCH_SIZE),
-        )
-        deleted = cur.rowcount
+        deleted = delete_chunk_txn(conn, table, ts_col, cutoff, BATCH_SIZE)
         conn.commit()
         total += deleted
         if deleted < BATCH_SIZE:
@@ -52,14 +84,8 @@ def run_retention() -> dict:
     conn = get_conn()
     stats = {}
 
-    stats["events"] = _batch_delete(conn, "events", "ctime", _cutoff(EVENTS_DAYS))
-    stats["edges"] = _batch_delete(conn, "edges", "ctime", _cutoff(EDGES_DAYS))
-    stats["event_versions"] = _batch_delete(
-        conn, "event_versions", "version_ts", _cutoff(VERSIONS_DAYS)
-    )
-    stats["claim_history"] = _batch_delete(
-        conn, "claim_history", "createdAt", _cutoff(CLAIMS_DAYS)
-    )
+    for key, table, ts_col, cutoff in retention_plan():
+        stats[key] = _batch_delete(conn, table, ts_col, cutoff)
 
     # WAL truncation is owned by the persistent writer thread. The
     # consumer's _maybe_wal_truncate runs after each batched commit — the
@@ -70,9 +96,9 @@ def run_retention() -> dict:
 
     elapsed = time.monotonic() - t0
     LOG.info(
-        "retention pass: events=%d edges=%d versions=%d claims=%d (%.1fs)",
+        "retention pass: events=%d edges=%d versions=%d claims=%d tombstones=%d thread_state=%d (%.1fs)",
         stats["events"], stats["edges"], stats["event_versions"],
-        stats["claim_history"], elapsed,
+        stats["claim_history"], stats["tombstones"], stats["thread_eval_state"], elapsed,
     )
     conn.close()
     return stats
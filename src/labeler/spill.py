@@ -0,0 +1,195 @@
+"""Disk-backed overflow for the ingest queue.
+
+With INGEST_OVERFLOW=spill, events that don't fit in the in-memory queue are
+appended to segmented, append-only spill files instead of being dropped. The
+drain loop replays them in order once the queue has headroom, so a short
+writer stall (a retention chunk, a WAL checkpoint) costs latency instead of
+permanent intake loss. Spill is bounded by SPILL_MAX_BYTES; past that, events
+are dropped and counted in ``dropped`` exactly as before.
+
+On-disk format: ``spill-<seq>.seg`` files of records, each a 12-byte header
+(big-endian float64 wall-clock append time, uint32 payload length) followed
+by the payload. A segment is fsynced when it is rotated (at
+SPILL_SEGMENT_BYTES, or when the reader catches up with it). Segments left
+over from a previous run are replayed on startup; a torn record at the tail
+of the last segment is truncated away.
+
+Not thread-safe: the consumer only touches it from the event loop.
+"""
+
+import os
+import pathlib
+import struct
+import time
+from typing import List, Optional
+
+INGEST_OVERFLOW = os.getenv("INGEST_OVERFLOW", "drop").lower()  # drop|spill
+SPILL_DIR = os.getenv("SPILL_DIR", "")
+SPILL_SEGMENT_BYTES = int(os.getenv("SPILL_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+SPILL_MAX_BYTES = int(os.getenv("SPILL_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+_HEADER = struct.Struct(">dI")
+_PREFIX = "spill-"
+_SUFFIX = ".seg"
+
+
+def _seg_name(seq: int) -> str:
+    return f"{_PREFIX}{seq:08d}{_SUFFIX}"
+
+
+class SpillQueue:
+    def __init__(self, directory, segment_bytes: int = SPILL_SEGMENT_BYTES, max_bytes: int = SPILL_MAX_BYTES):
+        self.dir = pathlib.Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self._segments: List[int] = []  # seqs, oldest first; last may be the write segment
+        self._records = 0
+        self._bytes = 0
+        self._writer = None
+        self._writer_seq: Optional[int] = None
+        self._writer_bytes = 0
+        self._read_off = 0
+        self._oldest_ts: Optional[float] = None
+        self._recover()
+
+    # -- introspection -------------------------------------------------------
+
+    @property
+    def depth(self) -> int:
+        """Records spilled and not yet replayed."""
+        return self._records
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def age_s(self, now: Optional[float] = None) -> float:
+        """Seconds since the oldest unreplayed record was spilled (0 if empty)."""
+        if self._oldest_ts is None:
+            return 0.0
+        return max(0.0, (now or time.time()) - self._oldest_ts)
+
+    # -- write side ----------------------------------------------------------
+
+    def append(self, payload: bytes) -> bool:
+        """Append one record. Returns False (nothing written) when the spill
+        is at SPILL_MAX_BYTES — the caller must count that as a drop."""
+        rec_len = _HEADER.size + len(payload)
+        if self._bytes + rec_len > self.max_bytes:
+            return False
+        if self._writer is None:
+            self._open_segment()
+        ts = time.time()
+        self._writer.write(_HEADER.pack(ts, len(payload)))
+        self._writer.write(payload)
+        self._writer_bytes += rec_len
+        self._records += 1
+        self._bytes += rec_len
+        if self._oldest_ts is None:
+            self._oldest_ts = ts
+        if self._writer_bytes >= self.segment_bytes:
+            self._rotate()
+        return True
+
+    def _open_segment(self):
+        seq = (self._segments[-1] + 1) if self._segments else 1
+        self._writer = open(self.dir / _seg_name(seq), "ab")
+        self._writer_seq = seq
+        self._writer_bytes = 0
+        self._segments.append(seq)
+
+    def _rotate(self):
+        """Seal the write segment: flush, fsync, close."""
+        if self._writer is None:
+            return
+        self._writer.flush()
+        os.fsync(self._writer.fileno())
+        self._writer.close()
+        self._writer = None
+        self._writer_seq = None
+
+    # -- read side -----------------------------------------------------------
+
+    def read(self, max_records: int) -> List[bytes]:
+        """Pop up to ``max_records`` payloads, oldest first.
+
+        Fully replayed segments are deleted. If the only data left is in the
+        write segment it is sealed first so the reader never sees a partial
+        buffered record.
+        """
+        out: List[bytes] = []
+        while len(out) < max_records and self._records > 0:
+            seq = self._segments[0]
+            if seq == self._writer_seq:
+                self._rotate()
+            path = self.dir / _seg_name(seq)
+            with open(path, "rb") as f:
+                f.seek(self._read_off)
+                while len(out) < max_records:
+                    hdr = f.read(_HEADER.size)
+                    if len(hdr) < _HEADER.size:
+                        break
+                    _ts, n = _HEADER.unpack(hdr)
+                    out.append(f.read(n))
+                    self._read_off += _HEADER.size + n
+                    self._records -= 1
+                    self._bytes -= _HEADER.size + n
+                exhausted = not f.read(1)
+            if exhausted:
+                path.unlink()
+                self._segments.pop(0)
+                self._read_off = 0
+        self._oldest_ts = self._peek_ts() if self._records else None
+        return out
+
+    def _peek_ts(self) -> Optional[float]:
+        if not self._segments:
+            return None
+        seq = self._segments[0]
+        if seq == self._writer_seq:
+            self._writer.flush()
+        with open(self.dir / _seg_name(seq), "rb") as f:
+            f.seek(self._read_off)
+            hdr = f.read(_HEADER.size)
+        if len(hdr) < _HEADER.size:
+            return None
+        return _HEADER.unpack(hdr)[0]
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def _recover(self):
+        """Adopt segments left by a previous run, truncating a torn tail."""
+        seqs = []
+        for p in self.dir.glob(f"{_PREFIX}*{_SUFFIX}"):
+            try:
+                seqs.append(int(p.name[len(_PREFIX):-len(_SUFFIX)]))
+            except ValueError:
+                continue
+        for seq in sorted(seqs):
+            path = self.dir / _seg_name(seq)
+            good = 0
+            records = 0
+            with open(path, "rb") as f:
+                while True:
+                    hdr = f.read(_HEADER.size)
+                    if len(hdr) < _HEADER.size:
+                        break
+                    _ts, n = _HEADER.unpack(hdr)
+                    if len(f.read(n)) < n:
+                        break
+                    good += _HEADER.size + n
+                    records += 1
+            if good < path.stat().st_size:
+                with open(path, "r+b") as f:
+                    f.truncate(good)
+            if records == 0:
+                path.unlink()
+                continue
+            self._segments.append(seq)
+            self._records += records
+            self._bytes += good
+        self._oldest_ts = self._peek_ts() if self._records else None
+
+    def close(self):
+        self._rotate()
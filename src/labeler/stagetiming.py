@@ -0,0 +1,121 @@
+"""Sampled per-stage latency for the ingest path, WS receive to commit.
+
+Stages, in pipeline order:
+
+  parse       decode_frame on the event loop: JSON decode plus the
+              Jetstream -> event transform (fused in the decoders)   per frame
+  queue_wait  _enqueue -> the writer picks the batch up               per event
+  prepare     prepare_event on the writer thread: serialization,
+              fingerprint, edges (inline parsing only)               per event
+  insert      event/version rows (db.insert_events_batch)            per batch
+  claim       claim_history rows                                      per batch
+  edges       insert_edges_txn                                        per batch
+  tombstones  apply_tombstones_txn                                    per batch
+  commit      cursor upsert + conn.commit                             per batch
+  wal         wal_checkpoint(TRUNCATE) (maintenance.CheckpointJob)    per run
+  e2e         _enqueue -> batch committed                             per event
+
+Events carry their enqueue time as a monotonic timestamp (``_t_enq`` on
+event dicts, PreparedEvent.t_enq), set only for sampled events. Writer
+stages are timed for one batch in every 1/STAGE_TIMING_SAMPLE, frames and
+events likewise, so the cost at the default rate is a few clock reads per
+ten events. Results go to the ingest_stage_seconds histogram (/metrics) and
+to StageStats, which the consumer prints as a STATS breakdown.
+
+Env vars:
+  STAGE_TIMING_SAMPLE — fraction of frames/events/batches timed; 0 disables (default 0.1)
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from . import metrics
+
+STAGE_TIMING_SAMPLE = float(os.getenv("STAGE_TIMING_SAMPLE", "0.1"))
+
+STAGES = (
+    "parse", "queue_wait", "prepare", "insert", "claim", "edges",
+    "tombstones", "commit", "wal", "e2e",
+)
+ENQ_KEY = "_t_enq"
+
+
+class Sampler:
+    """Deterministic 1-in-N sampling; cheaper than a random draw per event."""
+
+    def __init__(self, rate: float = STAGE_TIMING_SAMPLE):
+        self.every = round(1 / rate) if rate > 0 else 0
+        self._n = 0
+
+    def hit(self) -> bool:
+        if not self.every:
+            return False
+        self._n += 1
+        if self._n >= self.every:
+            self._n = 0
+            return True
+        return False
+
+
+class StageStats:
+    """Per-stage count / total / max since the last summary. Thread-safe:
+    the loop records parse and queue stamps, the writer the batch stages."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._acc: Dict[str, list] = {}
+
+    def observe(self, stage: str, seconds: float):
+        metrics.INGEST_STAGE_SECONDS.labels(stage=stage).observe(seconds)
+        with self._lock:
+            a = self._acc.get(stage)
+            if a is None:
+                self._acc[stage] = [1, seconds, seconds]
+            else:
+                a[0] += 1
+                a[1] += seconds
+                if seconds > a[2]:
+                    a[2] = seconds
+
+    def observe_all(self, timings: Dict[str, float]):
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+
+    def summary(self, reset: bool = True) -> str:
+        """'parse=0.04/0.9 insert=3.1/12.0 ...' as mean/max ms, pipeline order."""
+        with self._lock:
+            acc = self._acc
+            if reset:
+                self._acc = {}
+        parts = []
+        for stage in STAGES:
+            a = acc.get(stage)
+            if a:
+                parts.append(f"{stage}={a[1] / a[0] * 1000:.2f}/{a[2] * 1000:.1f}")
+        return " ".join(parts) or "-"
+
+
+STATS = StageStats()
+
+
+def add(timings: Dict[str, float], stage: str, t0: float) -> float:
+    """Accumulate perf_counter() - t0 into timings[stage]; returns now."""
+    now = time.perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + (now - t0)
+    return now
+
+
+def stamp(ev):
+    """Mark a queued event with its monotonic enqueue time."""
+    if isinstance(ev, dict):
+        ev[ENQ_KEY] = time.monotonic()
+    elif hasattr(ev, "t_enq"):
+        ev.t_enq = time.monotonic()
+
+
+def enqueued_at(item) -> Optional[float]:
+    if isinstance(item, dict):
+        return item.get(ENQ_KEY)
+    return getattr(item, "t_enq", None)
@@ -0,0 +1,217 @@
+"""Synthetic Jetstream firehose.
+
+Generates realistic commit frames for load tests: a posts/reposts mix,
+replies that build threads up to a depth cap, variable text lengths, a share
+of claim-like sentences (numbers, named entities, attribution) that exercise
+the fingerprint path, and Zipf-skewed authorship so a few accounts produce
+most of the traffic, like the real network. Output is deterministic for a
+given seed.
+
+Run as:
+    python -m labeler.synthetic generate --events 50000 --out fixtures/synthetic.jsonl
+    python -m labeler.synthetic serve --events 200000 --port 6008
+
+``serve`` reuses fixture_server, so the consumer connects to it exactly as to
+Jetstream (FIREHOSE_WS_URL=ws://127.0.0.1:6008/subscribe).
+"""
+
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import logging
+import random
+import string
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterator, List
+
+from . import timeutil
+
+LOG = logging.getLogger("labeler.synthetic")
+
+_ENTITIES = [
+    "The ministry", "City officials", "The WHO", "Police", "The company",
+    "The governor's office", "Researchers at MIT", "The central bank",
+    "Local hospitals", "The fire department",
+]
+_PLACES = ["Lagos", "Ohio", "Berlin", "the capital", "Gaza", "Texas", "Manila", "the port"]
+_CLAIMS = [
+    "{who} confirmed {n} people were evacuated in {where}.",
+    "{who} reported {n} new cases in {where} overnight.",
+    "According to {who}, {n}% of homes in {where} lost power.",
+    "{who} says {n} arrests were made in {where}.",
+    "Reportedly {n} vehicles were damaged in {where}, per {who}.",
+    "{who} announced a {n} million dollar package for {where}.",
+]
+_WORDS = [
+    "just", "really", "think", "today", "this", "thread", "lol", "same",
+    "coffee", "news", "weather", "new", "post", "anyone", "else", "agree",
+    "honestly", "look", "great", "time", "morning", "wild", "update",
+]
+
+
+@dataclass
+class SynthConfig:
+    authors: int = 10000
+    repost_ratio: float = 0.25      # share of frames that are reposts
+    reply_ratio: float = 0.4        # share of posts that are replies
+    max_reply_depth: int = 12
+    text_min: int = 10
+    text_max: int = 280
+    claim_ratio: float = 0.2        # share of posts that carry a claim sentence
+    zipf_s: float = 1.1             # author skew; 0 = uniform
+    rate: float = 2000.0            # events/sec encoded in time_us
+    start_time_us: int = 1_700_000_000_000_000
+    seed: int = 1
+
+
+class _Zipf:
+    """Sample ranks 0..n-1 with P(k) ~ 1/(k+1)^s via a cumulative table."""
+
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self._rng = rng
+        self._cum = list(itertools.accumulate(1.0 / (k + 1) ** s for k in range(n)))
+
+    def sample(self) -> int:
+        return bisect.bisect_left(self._cum, self._rng.random() * self._cum[-1])
+
+
+def _rkey(rng: random.Random) -> str:
+    return "3k" + "".join(rng.choices(string.ascii_lowercase + string.digits, k=11))
+
+
+def _cid(rng: random.Random) -> str:
+    return "bafyrei" + "".join(rng.choices(string.ascii_lowercase + "234567", k=52))
+
+
+def _text(cfg: SynthConfig, rng: random.Random) -> str:
+    parts = []
+    if rng.random() < cfg.claim_ratio:
+        parts.append(rng.choice(_CLAIMS).format(
+            who=rng.choice(_ENTITIES),
+            n=rng.choice([rng.randint(2, 99), rng.randint(100, 5000)]),
+            where=rng.choice(_PLACES),
+        ))
+    target = rng.randint(cfg.text_min, cfg.text_max)
+    while sum(len(p) + 1 for p in parts) < target:
+        parts.append(rng.choice(_WORDS))
+    # a claim sentence is never cut mid-way, filler is
+    return " ".join(parts)[: max(cfg.text_max, len(parts[0]) if parts else 0)]
+
+
+def generate(cfg: SynthConfig, events: int) -> Iterator[bytes]:
+    """Yield ``events`` compact Jetstream commit frames."""
+    rng = random.Random(cfg.seed)
+    authors = _Zipf(cfg.authors, cfg.zipf_s, rng)
+    # recent posts a reply or repost can point at: (uri, cid, root_uri, root_cid, depth)
+    recent: deque = deque(maxlen=2000)
+    step_us = max(1, int(1_000_000 / cfg.rate))
+    for i in range(events):
+        time_us = cfg.start_time_us + i * step_us
+        did = f"did:plc:synth{authors.sample():06d}"
+        created = timeutil.to_utc_iso(time_us / 1_000_000)
+        rkey, cid = _rkey(rng), _cid(rng)
+        if recent and rng.random() < cfg.repost_ratio:
+            uri, scid = rng.choice(recent)[:2]
+            collection = "app.bsky.feed.repost"
+            record = {
+                "$type": collection,
+                "subject": {"uri": uri, "cid": scid},
+                "createdAt": created,
+            }
+        else:
+            collection = "app.bsky.feed.post"
+            record = {"$type": collection, "text": _text(cfg, rng), "createdAt": created}
+            depth = 0
+            root = None
+            if recent and rng.random() < cfg.reply_ratio:
+                parent = rng.choice(recent)
+                if parent[4] < cfg.max_reply_depth:
+                    depth = parent[4] + 1
+                    root = (parent[2], parent[3])
+                    record["reply"] = {
+                        "root": {"uri": root[0], "cid": root[1]},
+                        "parent": {"uri": parent[0], "cid": parent[1]},
+                    }
+            uri = f"at://{did}/{collection}/{rkey}"
+            root = root or (uri, cid)
+            recent.append((uri, cid, root[0], root[1], depth))
+        frame = {
+            "did": did,
+            "time_us": time_us,
+            "kind": "commit",
+            "commit": {
+                "rev": rkey,
+                "operation": "create",
+                "collection": collection,
+                "rkey": rkey,
+                "record": record,
+                "cid": cid,
+            },
+        }
+        yield json.dumps(frame, separators=(",", ":")).encode("utf-8")
+
+
+def _add_config_args(p: argparse.ArgumentParser):
+    d = SynthConfig()
+    p.add_argument("--events", type=int, default=50000)
+    p.add_argument("--authors", type=int, default=d.authors)
+    p.add_argument("--repost-ratio", type=float, default=d.repost_ratio)
+    p.add_argument("--reply-ratio", type=float, default=d.reply_ratio)
+    p.add_argument("--max-reply-depth", type=int, default=d.max_reply_depth)
+    p.add_argument("--text-min", type=int, default=d.text_min)
+    p.add_argument("--text-max", type=int, default=d.text_max)
+    p.add_argument("--claim-ratio", type=float, default=d.claim_ratio)
+    p.add_argument("--zipf-s", type=float, default=d.zipf_s)
+    p.add_argument("--seed", type=int, default=d.seed)
+
+
+def config_from_args(args) -> SynthConfig:
+    return SynthConfig(
+        authors=args.authors,
+        repost_ratio=args.repost_ratio,
+        reply_ratio=args.reply_ratio,
+        max_reply_depth=args.max_reply_depth,
+        text_min=args.text_min,
+        text_max=args.text_max,
+        claim_ratio=args.claim_ratio,
+        zipf_s=args.zipf_s,
+        seed=args.seed,
+    )
+
+
+def main():
+    from .fixture_server import DEFAULT_HOST, DEFAULT_PORT, serve
+
+    parser = argparse.ArgumentParser(prog="labeler.synthetic")
+    sub = parser.add_subparsers(dest="cmd")
+
+    gen = sub.add_parser("generate")
+    _add_config_args(gen)
+    gen.add_argument("--out", required=True)
+
+    sv = sub.add_parser("serve")
+    _add_config_args(sv)
+    sv.add_argument("--host", default=DEFAULT_HOST)
+    sv.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.cmd == "generate":
+        with open(args.out, "wb") as f:
+            for frame in generate(config_from_args(args), args.events):
+                f.write(frame + b"\n")
+    elif args.cmd == "serve":
+        frames: List[bytes] = list(generate(config_from_args(args), args.events))
+        try:
+            asyncio.run(serve(frames, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
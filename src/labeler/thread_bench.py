@@ -0,0 +1,168 @@
+"""Recheck load benchmark: thread size vs database size.
+
+A recheck pass loads every queued root's thread (longitudinal
+_load_posts_for_root). That load used to decode every event in the
+database, so its cost grew with the table; with idx_events_thread it should
+depend on the size of the thread only. For each database size this builds
+a fresh database of filler threads plus one thread of each measured size,
+then times the load of those threads and reports:
+
+- load_ms p50/p99 per thread size, over --repeats loads
+- us_per_post: p50 load time divided by thread size
+- plan: SQLite's query plan for the load (should name idx_events_thread)
+
+Run as:
+    python -m labeler.thread_bench --db-sizes 10000,100000 --thread-sizes 10,100,1000
+
+Results are written as JSON (default out/bench/thread-<utc timestamp>.json).
+"""
+
+import argparse
+import json
+import logging
+import pathlib
+import tempfile
+import time
+from typing import Dict, List
+
+from . import timeutil
+from .ingest_bench import _patched, _round, percentile
+
+LOG = logging.getLogger("labeler.thread_bench")
+
+DEFAULT_DB_SIZES = "10000,100000"
+DEFAULT_THREAD_SIZES = "10,100,1000"
+FILLER_THREAD = 20  # posts per filler thread
+INSERT_BATCH = 2000
+
+
+def _root(name: str) -> str:
+    return f"at://did:plc:{name}/app.bsky.feed.post/root"
+
+
+def _event(root: str, i: int, author: str) -> dict:
+    uri = root if i == 0 else f"at://did:plc:{author}/app.bsky.feed.post/{i}"
+    return {
+        "uri": uri,
+        "cid": f"bafy{author}{i}",
+        "text": f"Officials confirmed {i} people were evacuated from the harbour district.",
+        "author": f"did:plc:{author}",
+        "authorDid": f"did:plc:{author}",
+        "time": "2024-01-01T00:00:00+00:00",
+        "createdAt": f"2024-01-01T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}Z",
+        "replyRootUri": None if i == 0 else root,
+        "replyParentUri": None if i == 0 else root,
+        "_collection": "app.bsky.feed.post",
+    }
+
+
+def _events(db_size: int, thread_sizes: List[int]):
+    """The measured threads first, then filler threads up to ``db_size``."""
+    n = 0
+    for size in thread_sizes:
+        root = _root(f"bench{size}")
+        for i in range(size):
+            yield _event(root, i, f"bench{size}x{i % 50}")
+            n += 1
+    t = 0
+    while n < db_size:
+        root = _root(f"filler{t}")
+        for i in range(min(FILLER_THREAD, db_size - n)):
+            yield _event(root, i, f"filler{t}x{i}")
+            n += 1
+        t += 1
+
+
+def _fill(conn, db_size: int, thread_sizes: List[int]):
+    from . import db
+    from .prepare import prepare_event
+
+    batch = []
+    for ev in _events(db_size, thread_sizes):
+        batch.append(prepare_event(ev))
+        if len(batch) >= INSERT_BATCH:
+            db.insert_events_batch(conn, batch)
+            conn.commit()
+            batch = []
+    if batch:
+        db.insert_events_batch(conn, batch)
+        conn.commit()
+
+
+def run_one(db_size: int, thread_sizes: List[int], repeats: int) -> dict:
+    from . import db
+    from .longitudinal import _load_posts_for_root
+    from .posts import THREAD_KEY
+
+    with tempfile.TemporaryDirectory(prefix="thread-bench-") as tmp, _patched(db, DATA_DIR=pathlib.Path(tmp)):
+        db.init_db()
+        conn = db.get_conn()
+        try:
+            t0 = time.monotonic()
+            _fill(conn, db_size, thread_sizes)
+            fill_s = time.monotonic() - t0
+            plan = " ".join(
+                r[-1] for r in conn.execute(
+                    f"EXPLAIN QUERY PLAN SELECT rowid FROM events WHERE {THREAD_KEY} = ?", ("x",)
+                ).fetchall()
+            )
+            threads: Dict[str, dict] = {}
+            for size in thread_sizes:
+                root = _root(f"bench{size}")
+                samples = []
+                for _ in range(repeats):
+                    t = time.perf_counter()
+                    posts = _load_posts_for_root(conn, root)
+                    samples.append((time.perf_counter() - t) * 1000.0)
+                if len(posts) != size:
+                    raise RuntimeError(f"thread of {size} loaded {len(posts)} posts")
+                p50 = percentile(samples, 50)
+                threads[str(size)] = {
+                    "load_ms_p50": _round(p50, 3),
+                    "load_ms_p99": _round(percentile(samples, 99), 3),
+                    "us_per_post": _round(p50 * 1000.0 / size, 2),
+                }
+        finally:
+            conn.close()
+    LOG.info("db_size=%d filled in %.1fs: %s", db_size, fill_s, threads)
+    return {"db_size": db_size, "fill_s": _round(fill_s), "plan": plan, "threads": threads}
+
+
+def run(db_sizes: List[int], thread_sizes: List[int], repeats: int = 20) -> dict:
+    return {
+        "thread_sizes": thread_sizes,
+        "repeats": repeats,
+        "runs": [run_one(n, thread_sizes, repeats) for n in db_sizes],
+    }
+
+
+def _ints(spec: str) -> List[int]:
+    return [int(s) for s in spec.split(",") if s.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="labeler.thread_bench")
+    parser.add_argument("--db-sizes", default=DEFAULT_DB_SIZES, help="comma-separated event counts")
+    parser.add_argument("--thread-sizes", default=DEFAULT_THREAD_SIZES, help="comma-separated posts per thread")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    report = run(_ints(args.db_sizes), _ints(args.thread_sizes), repeats=args.repeats)
+    out = pathlib.Path(args.out) if args.out else pathlib.Path("out/bench") / (
+        "thread-" + timeutil.now_utc().strftime("%Y%m%dT%H%M%SZ") + ".json"
+    )
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2, sort_keys=True))
+    for r in report["runs"]:
+        for size, t in r["threads"].items():
+            print(
+                f"db {r['db_size']:>8}  thread {size:>6}  p50 {t['load_ms_p50']} ms  "
+                f"p99 {t['load_ms_p99']} ms  {t['us_per_post']} us/post"
+            )
+    print(f"wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
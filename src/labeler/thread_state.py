@@ -0,0 +1,87 @@
+"""Per-thread evaluation state for incremental rechecks.
+
+A recheck used to run every rule for every post of the thread, so each new
+reply to a hot thread cost O(n²) in the thread's size. After evaluating a
+thread, recheck_once records in ``thread_eval_state``:
+
+  watermark    highest events rowid evaluated (new posts get higher rowids)
+  digest       hash of the (uri, cid, text) of every post up to the watermark
+  config_hash  rules_config_hash() at the time
+
+The next recheck of that root evaluates only the posts above the watermark,
+plus the earlier posts by the same authors: the thread-local rules compare a
+post with its author's other posts in the thread, so a new post can change
+those posts' labels and no others. History lookups only look at claims
+created before the post, so new posts do not change them for older posts.
+
+The whole thread is evaluated again when there is no state, when the digest
+no longer matches (a post was edited or deleted), or when the rule or
+fingerprint configuration changed. Labels expired outside rechecks (TTL
+expiry) are not re-asserted for posts an incremental recheck skips.
+
+With SHARD_COUNT > 1 there is no state: a thread's posts are spread over
+shards whose rowids are unrelated, so rechecks evaluate the whole thread.
+
+A root's state is dropped when the root is deleted (db.apply_tombstones_txn)
+and by retention once it is older than the events horizon.
+
+Env vars:
+  RECHECK_INCREMENTAL — 0 evaluates every post on every recheck (default 1)
+"""
+
+import datetime
+import hashlib
+import os
+from typing import List, Optional, Tuple
+
+from .drift.models import Post
+
+RECHECK_INCREMENTAL = os.getenv("RECHECK_INCREMENTAL", "1") == "1"
+
+
+def rules_config_hash() -> str:
+    """Changes whenever rule outputs may change for unchanged posts."""
+    from .claims import fingerprint_config_hash
+    from .drift.rules import RULES_VERSION
+
+    return hashlib.sha256(f"{RULES_VERSION}:{fingerprint_config_hash()}".encode("utf-8")).hexdigest()[:16]
+
+
+def thread_digest(rows: List[Tuple[Post, int]]) -> str:
+    h = hashlib.sha256()
+    for p, rowid in sorted(rows, key=lambda r: r[1]):
+        h.update(f"{rowid}\x00{p.uri}\x00{p.cid or ''}\x00{p.text}\x01".encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+def get_state(conn, root_uri: str) -> Optional[tuple]:
+    """(watermark, digest, config_hash) or None."""
+    try:
+        return conn.execute(
+            "SELECT watermark, digest, config_hash FROM thread_eval_state WHERE root_uri = ?", (root_uri,)
+        ).fetchone()
+    except Exception:
+        return None  # thread_eval_state not migrated yet
+
+
+def save_state_txn(conn, root_uri: str, watermark: int, digest: str, config_hash: str):
+    """Record a completed evaluation. Does not commit."""
+    conn.execute(
+        "INSERT OR REPLACE INTO thread_eval_state (root_uri, watermark, digest, config_hash, evaluated_at)"
+        " VALUES (?, ?, ?, ?, ?)",
+        (root_uri, watermark, digest, config_hash, datetime.datetime.now(datetime.timezone.utc).isoformat()),
+    )
+
+
+def posts_to_evaluate(state: Optional[tuple], rows: List[Tuple[Post, int]], config_hash: str) -> List[Post]:
+    """The posts of a thread (``rows`` from posts.load_thread_rows) whose
+    labels may differ from the last evaluation recorded in ``state``."""
+    posts = [p for p, _ in rows]
+    if not RECHECK_INCREMENTAL or state is None:
+        return posts
+    watermark, digest, cfg = state
+    if cfg != config_hash or thread_digest([r for r in rows if r[1] <= watermark]) != digest:
+        return posts
+    new = [p for p, rowid in rows if rowid > watermark]
+    authors = {p.authorDid for p in new}
+    return [p for p, rowid in rows if rowid > watermark or p.authorDid in authors]
@@ -0,0 +1,49 @@
+from labeler.batching import AdaptiveBatchController
+
+
+def _ctl(**kw):
+    kw.setdefault("min_events", 20)
+    kw.setdefault("ceiling_events", 500)
+    kw.setdefault("min_wait_s", 0.01)
+    kw.setdefault("target_commit_s", 0.1)
+    return AdaptiveBatchController(100, 0.25, 5000, **kw)
+
+
+def test_grows_additively_under_backlog_with_fast_commits():
+    c = _ctl()
+    for _ in range(5):
+        c.observe(c.batch_size, 0.01, queue_depth=2000)
+    assert c.batch_size == 200
+    assert c.max_wait_s == 0.25
+
+
+def test_backs_off_multiplicatively_on_slow_commit_or_rollback():
+    c = _ctl()
+    for _ in range(10):
+        c.observe(c.batch_size, 0.01, queue_depth=2000)
+    size = c.batch_size
+    c.observe(size, 0.5, queue_depth=2000)
+    assert c.batch_size == size // 2
+    c.observe(10, 0.01, queue_depth=2000, failed=True)
+    assert c.batch_size == size // 4
+
+
+def test_respects_floor_and_ceiling():
+    c = _ctl()
+    for _ in range(50):
+        c.observe(c.batch_size, 0.01, queue_depth=4999)
+    assert c.batch_size == 500
+    for _ in range(50):
+        c.observe(c.batch_size, 5.0, queue_depth=4999)
+    assert c.batch_size == 20
+
+
+def test_idle_shrinks_wait_then_recovers_when_batches_fill():
+    c = _ctl()
+    for _ in range(10):
+        c.observe(1, 0.001, queue_depth=0)
+    assert c.max_wait_s == 0.01
+    assert c.batch_size == 100
+    for _ in range(10):
+        c.observe(c.batch_size, 0.001, queue_depth=0)
+    assert c.max_wait_s == 0.25
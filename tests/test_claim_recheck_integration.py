@@ -11,7 +11,7 @@ from labeler import timeutil
 def test_claim_recheck_runs_when_enabled(monkeypatch):
     init_db()
     conn = get_conn()
-    for t in ("claim_history", "events", "labels", "event_versions", "recheck_requests", "label_decisions", "claim_recheck_requests"):
+    for t in ("claim_history", "events", "labels", "event_versions", "recheck_requests", "thread_eval_state", "label_decisions", "claim_recheck_requests"):
         try:
             conn.execute(f"DELETE FROM {t}")
         except Exception:
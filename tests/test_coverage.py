@@ -0,0 +1,114 @@
+import pytest
+
+from labeler import coverage, db
+from labeler.coverage import CoverageTracker
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 1_700_000_000.0
+
+    def __call__(self):
+        return self.t
+
+
+def _tracker(clock, **kw):
+    kw.setdefault("window_s", 60)
+    kw.setdefault("bucket_s", 10)
+    kw.setdefault("recovery_horizon_s", 3600)
+    return CoverageTracker("test", clock=clock, **kw)
+
+
+def _feed(tr, clock, seconds, eps, drop_eps=0, counters=None):
+    """Advance in 1s steps, committing eps and shedding drop_eps per second."""
+    c = counters if counters is not None else {"msgs": 0, "dropped": 0}
+    for _ in range(seconds):
+        clock.t += 1
+        c["msgs"] += eps
+        c["dropped"] += drop_eps
+        tr.update(c["msgs"], c["dropped"], 0, backlog=0, queue_max=100)
+    return c
+
+
+def test_drop_frac_rate_and_ewma():
+    clock = FakeClock()
+    tr = _tracker(clock)
+    c = _feed(tr, clock, 71, eps=90, drop_eps=10)
+    assert tr.drop_frac() == pytest.approx(0.1)
+    assert tr.events_per_sec() == pytest.approx(90)
+    assert tr.ewma_eps == pytest.approx(90, rel=0.1)  # slow baseline, seeded by a partial first bucket
+    assert tr.state == "degraded" and tr.reasons == ["high_drop_rate"]
+
+    # loss stops: the window drains back to zero
+    _feed(tr, clock, 70, eps=90, counters=c)
+    assert tr.drop_frac() == 0.0
+    assert tr.state == "recovering"
+
+
+def test_window_persists_and_closes_only_after_horizon(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    db.init_db()
+    conn = db.get_conn()
+    clock = FakeClock()
+    tr = _tracker(clock)
+
+    c = _feed(tr, clock, 30, eps=50, drop_eps=50)
+    tr.write_markers_txn(conn)
+    conn.commit()
+    row = coverage.load_open_window(conn, "test")
+    assert row is not None and "high_drop_rate" in row[2]
+
+    _feed(tr, clock, 120, eps=50, counters=c)
+    assert tr.state == "recovering"
+    # a relapse inside the horizon resets the clean clock
+    _feed(tr, clock, 20, eps=50, drop_eps=50, counters=c)
+    assert tr.state == "degraded"
+    _feed(tr, clock, 1800, eps=50, counters=c)
+    assert tr.state == "recovering"
+    assert tr.snapshot()["recovery"]["remaining_s"] > 0
+    tr.write_markers_txn(conn)
+    conn.commit()
+    assert coverage.load_open_window(conn, "test") is not None
+
+    _feed(tr, clock, 3600, eps=50, counters=c)
+    assert tr.state == "ok"
+    tr.write_markers_txn(conn)
+    conn.commit()
+    assert coverage.load_open_window(conn, "test") is None
+    ended, max_drop = conn.execute("SELECT ended_at, max_drop_frac FROM degraded_windows").fetchone()
+    assert ended is not None and max_drop >= 0.5
+
+    # a restarted tracker picks an open window back up, recovery from zero
+    cur = conn.execute(
+        "INSERT INTO degraded_windows (consumer, started_at, reasons, max_drop_frac) "
+        "VALUES ('test', '2024-01-01T00:00:00+00:00', '[\"lag_high\"]', 0.2)"
+    )
+    conn.commit()
+    fresh = _tracker(clock)
+    fresh.resume(coverage.load_open_window(conn, "test"))
+    assert fresh.state == "degraded" and fresh.window_id == cur.lastrowid
+    conn.close()
+
+
+def test_backlog_and_lag_reasons_and_rollback_restore():
+    clock = FakeClock()
+    tr = _tracker(clock)
+    tr.update(0, 0, 0)
+    clock.t += 11
+    tr.update(100, 0, 0, backlog=90, queue_max=100, cursor_us=int((clock.t - 600) * 1e6))
+    clock.t += 11
+    tr.update(200, 0, 0, backlog=90, queue_max=100, cursor_us=int((clock.t - 600) * 1e6))
+    assert tr.state == "degraded"
+    assert tr.reasons == ["lag_high", "consumer_backlog"]
+
+    markers = tr.write_markers_txn(_NullConn())
+    assert len(markers) == 1
+    tr.restore_markers(markers)  # batch rolled back: written again next time
+    assert tr.write_markers_txn(_NullConn()) == markers
+
+
+class _NullConn:
+    lastrowid = 1
+
+    def execute(self, *a):
+        return self
@@ -6,7 +6,7 @@ def test_insert_label_writes_expired_at_and_prevents_duplicates(tmp_path):
     # init and ensure clean DB
     init_db()
     conn = get_conn()
-    for t in ("labels", "events", "claim_history", "event_versions", "recheck_requests"):
+    for t in ("labels", "events", "claim_history", "event_versions", "recheck_requests", "thread_eval_state"):
         try:
             conn.execute(f"DELETE FROM {t}")
         except Exception:
@@ -50,7 +50,7 @@ def test_fingerprint_version_stored_when_adding_history(tmp_path, monkeypatch):
     from labeler.claims import add_claim_history
     init_db()
     conn = get_conn()
-    for t in ("claim_history", "events", "labels", "recheck_requests"):
+    for t in ("claim_history", "events", "labels", "recheck_requests", "thread_eval_state"):
         try:
             conn.execute(f"DELETE FROM {t}")
         except Exception:
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from labeler import frames
+
+
+def _commit(operation="create", record=None, time_us=1700000000000001):
+    commit = {"rev": "r1", "operation": operation, "collection": "app.bsky.feed.post", "rkey": "3k1"}
+    if operation != "delete":
+        commit["record"] = record or {"text": "hello", "createdAt": "2024-01-01T00:00:00Z"}
+        commit["cid"] = "bafy1"
+    return json.dumps({"did": "did:plc:alice", "time_us": time_us, "kind": "commit", "commit": commit}, separators=(",", ":"))
+
+
+@pytest.mark.parametrize("kind", ["identity", "account"])
+def test_prefilter_skips_identity_and_account(kind):
+    raw = json.dumps({"did": "did:plc:alice", "time_us": 1700000000000042, "kind": kind, kind: {"did": "did:plc:alice"}}, separators=(",", ":"))
+    assert frames.prefilter_frame(raw) == (True, "1700000000000042")
+    assert frames.prefilter_frame(raw.encode()) == (True, "1700000000000042")
+
+
+def test_deletes_decode_to_tombstones():
+    raw = _commit("delete", time_us=7)
+    assert frames.prefilter_frame(raw) == (False, None)
+    cursor, ev = frames.decode_frame(raw)
+    assert cursor == "7"
+    assert ev["_operation"] == "delete"
+    assert ev["uri"] == "at://did:plc:alice/app.bsky.feed.post/3k1"
+
+
+def test_prefilter_passes_creates_even_if_record_mimics_skip_shapes():
+    # user-controlled record fields come after the envelope keys and must not
+    # shadow them
+    record = {"text": "x", "kind": "identity", "operation": "delete"}
+    assert frames.prefilter_frame(_commit("create", record=record)) == (False, None)
+
+
+def test_prefilter_falls_through_on_unknown_shape():
+    assert frames.prefilter_frame('{"foo": 1}') == (False, None)
+
+
+@pytest.mark.parametrize("name", frames.available_decoders())
+def test_decoders_agree(name):
+    decoder = frames.select_decoder(name)
+    record = {
+        "text": "see link",
+        "createdAt": "2024-01-01T00:00:00Z",
+        "reply": {"root": {"uri": "at://r"}, "parent": {"uri": "at://p"}},
+        "embed": {"external": {"uri": "https://example.com"}},
+    }
+    raw = _commit("create", record=record)
+    expected = frames._decode_json(raw)
+    assert decoder(raw) == expected
+    cursor, ev = expected
+    assert cursor == "1700000000000001"
+    assert ev["uri"] == "at://did:plc:alice/app.bsky.feed.post/3k1"
+    assert ev["replyRootUri"] == "at://r"
+    assert ev["externalLinks"] == ["https://example.com"]
+
+
+def test_decode_frame_without_prefilter_match_still_ignores_non_commits():
+    raw = json.dumps({"did": "did:plc:alice", "time_us": 5, "kind": "other"})
+    assert frames.decode_frame(raw) == ("5", None)
+
+
+def test_decode_frame_raises_on_garbage():
+    with pytest.raises(Exception):
+        frames.decode_frame("{nope")
+
+
+def test_msgspec_decoder_typed_envelope():
+    pytest.importorskip("msgspec")
+    cursor, ev = frames.select_decoder("msgspec")(_commit("update"))
+    assert cursor == "1700000000000001"
+    assert ev["_operation"] == "update"
+    assert ev["record"]["text"] == "hello"
@@ -14,7 +14,7 @@ def test_golden_laundering(tmp_path):
     # ensure clean DB for deterministic golden runs
     from labeler.db import get_conn as _get_conn
     _c = _get_conn()
-    for t in ("claim_history","events","labels","event_versions","recheck_requests"):
+    for t in ("claim_history","events","labels","event_versions","recheck_requests","thread_eval_state"):
         try:
             _c.execute(f"DELETE FROM {t}")
         except Exception:
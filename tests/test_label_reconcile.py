@@ -0,0 +1,89 @@
+import datetime
+
+import pytest
+
+from labeler import db, thread_state
+from labeler.longitudinal import DRIFT_LABELER_DID, recheck_once
+
+A = "at://did:plc:alice/app.bsky.feed.post/a"
+B = "at://did:plc:bob/app.bsky.feed.post/b"
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    db.init_db()
+    c = db.get_conn()
+    yield c
+    c.close()
+
+
+def _desired(subj, name, rule_id="r1"):
+    label = {"label": name, "score": 0.9, "rule_id": rule_id, "scheduler": "thread_root"}
+    decision = {"root_uri": A, "rule_id": rule_id, "inputs": {"spans": [subj]}, "evidence_hashes": ["h"]}
+    return label, decision
+
+
+def _count(conn, sql, *params):
+    return conn.execute(sql, params).fetchone()[0]
+
+
+def test_reconcile_applies_the_diff_in_the_callers_transaction(conn):
+    desired = {A: [_desired(A, "drift")], B: [_desired(B, "drift"), _desired(B, "laundering", "r2")]}
+    inserted, expired = db.reconcile_labels_txn(conn, DRIFT_LABELER_DID, desired)
+    assert len(inserted) == 3 and expired == []
+    conn.rollback()
+    assert _count(conn, "SELECT count(*) FROM labels") == 0
+    assert _count(conn, "SELECT count(*) FROM label_decisions") == 0
+
+    db.reconcile_labels_txn(conn, DRIFT_LABELER_DID, desired)
+    conn.commit()
+    # one full ledger row per label
+    assert _count(conn, "SELECT count(*) FROM labels WHERE expired_at IS NULL") == 3
+    assert _count(conn, "SELECT count(*) FROM label_decisions WHERE status = 'committed' AND inputs_json != '{}'") == 3
+
+    # still-active labels are not inserted again
+    assert db.reconcile_labels_txn(conn, DRIFT_LABELER_DID, desired) == ([], [])
+    conn.commit()
+    assert _count(conn, "SELECT count(*) FROM labels") == 3
+
+    conn.execute("INSERT INTO labels VALUES (?, ?, ?, ?, ?)", (A, "did:ext", '{"label": "spam"}', "2024-01-01", None))
+    inserted, expired = db.reconcile_labels_txn(conn, DRIFT_LABELER_DID, {A: [], B: [_desired(B, "drift")]})
+    conn.commit()
+    assert inserted == []
+    assert sorted((s, l["label"]) for s, _, l in expired) == [(A, "drift"), (A, "spam"), (B, "laundering")]
+    assert _count(conn, "SELECT count(*) FROM labels WHERE expired_at IS NULL") == 1
+    assert conn.execute(
+        "SELECT subject_uri, label FROM label_decisions WHERE status = 'committed'"
+    ).fetchall() == [(B, "drift")]
+
+
+def test_recheck_does_not_duplicate_labels_or_ledger_rows(conn, monkeypatch):
+    # evaluate the whole thread on every pass
+    monkeypatch.setattr(thread_state, "RECHECK_INCREMENTAL", False)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    prior = {
+        "uri": "uri:rc:1",
+        "cid": "rc1",
+        "text": "According to source X, 100 people were evacuated.",
+        "createdAt": now.isoformat(),
+        "authorDid": "did:alice",
+    }
+    later = {
+        "uri": "uri:rc:2",
+        "cid": "rc2",
+        "text": "100 people were evacuated.",
+        "createdAt": (now + datetime.timedelta(minutes=10)).isoformat(),
+        "authorDid": "did:alice",
+    }
+    db.insert_event(prior["uri"], now, prior["authorDid"], prior)
+    db.insert_event(later["uri"], now + datetime.timedelta(minutes=10), later["authorDid"], later)
+
+    recheck_once()
+    labels = _count(conn, "SELECT count(*) FROM labels WHERE expired_at IS NULL")
+    assert labels > 0
+
+    db._add_recheck(conn, later["uri"])
+    recheck_once()
+    assert _count(conn, "SELECT count(*) FROM labels") == labels
+    assert _count(conn, "SELECT count(*) FROM label_decisions WHERE status = 'committed'") == labels
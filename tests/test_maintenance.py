@@ -0,0 +1,122 @@
+import sqlite3
+
+import pytest
+
+from labeler import db
+from labeler.maintenance import (
+    AnalyzeJob,
+    CheckpointJob,
+    ExpiryJob,
+    MaintenanceJob,
+    MaintenanceScheduler,
+    RetentionJob,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    db.init_db()
+    c = db.get_conn()
+    yield c
+    c.close()
+
+
+def _old_edges(conn, n):
+    conn.executemany(
+        "INSERT INTO edges (src_did, dst_did, type, ctime) VALUES (?, ?, 'reply', '2000-01-01T00:00:00')",
+        [(f"did:a{i}", "did:root") for i in range(n)],
+    )
+    conn.commit()
+
+
+def test_retention_job_resumes_across_slices(conn):
+    _old_edges(conn, 50)
+    plan = [("edges", "edges", "ctime", "2001-01-01T00:00:00")]
+    job = RetentionJob(plan=plan, max_chunk=10)
+    job.chunk = 10
+    job.adapt = lambda *a, **kw: None  # keep the chunk fixed
+    sched = MaintenanceScheduler(budget_s=60)
+    sched.submit(job)
+
+    # should_yield after every step: one 10-row transaction per slice
+    assert sched.run_slice(conn, should_yield=lambda: True) == "retention"
+    assert conn.execute("SELECT COUNT(*) FROM edges").fetchone()[0] == 40
+    assert sched.pending() == ["retention"]
+
+    sched.run_slice(conn)
+    assert conn.execute("SELECT COUNT(*) FROM edges").fetchone()[0] == 0
+    assert sched.pending() == [] and sched.completed == {"retention": 1}
+    assert job.stats == {"edges": 50}
+
+
+def test_preempted_step_rolls_back_and_shrinks_chunk(conn):
+    _old_edges(conn, 200)
+    job = RetentionJob(plan=[("edges", "edges", "ctime", "2001-01-01T00:00:00")], max_chunk=200)
+    job.chunk = 200
+    sched = MaintenanceScheduler(budget_s=60)
+    sched.submit(job)
+
+    sched.run_slice(conn, should_yield=lambda: True)  # interrupted by the progress handler
+    assert conn.execute("SELECT COUNT(*) FROM edges").fetchone()[0] == 200
+    assert job.chunk == 100
+    assert sched.preemptions == {"retention": 1}
+    assert sched.pending() == ["retention"]
+
+
+def test_expiry_checkpoint_and_analyze_jobs(conn):
+    conn.execute(
+        "INSERT INTO labels (subject_uri, labeler_did, label, ctime) VALUES ('at://x', 'did:l', 'l', '2000-01-01T00:00:00')"
+    )
+    conn.commit()
+    sched = MaintenanceScheduler(budget_s=60)
+    for job in (ExpiryJob(ttl_days=30), CheckpointJob(), AnalyzeJob(tables=["labels", "edges"])):
+        sched.submit(job)
+    while sched.has_work():
+        sched.run_slice(conn)
+    assert sched.completed == {"label_expiry": 1, "wal_checkpoint": 1, "analyze": 1}
+    assert conn.execute("SELECT expired_at IS NOT NULL FROM labels").fetchone()[0] == 1
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] >= 1
+
+
+def test_periodic_deferral_starvation_and_occupancy():
+    clock = FakeClock()
+    sched = MaintenanceScheduler(budget_s=1.0, clock=clock)
+
+    class Slow(MaintenanceJob):
+        name = "slow"
+
+        def step(self, conn):
+            clock.t += 0.5
+            return True
+
+    sched.every("slow", 10, Slow)
+    assert not sched.has_work() and sched.seconds_until_due() == 10
+    clock.t += 10
+    assert sched.has_work() and sched.seconds_until_due() == 0
+    clock.t += 5
+    assert sched.has_work() and sched.pending() == ["slow"]  # not queued twice
+
+    sched.defer()
+    clock.t += 400
+    assert sched.deferrals == {"slow": 1} and sched.starved()
+
+    sched.run_slice(sqlite3.connect(":memory:"))
+    assert not sched.starved() and sched.completed == {"slow": 1}
+    assert sched.occupancy(reset=True) == pytest.approx(0.5 / 415.5)
+    assert sched.occupancy() == 0.0
+
+
+def test_failing_job_is_dropped(conn):
+    sched = MaintenanceScheduler(budget_s=60)
+    sched.submit(AnalyzeJob(tables=["no_such_table"]))
+    assert sched.run_slice(conn) == "analyze"
+    assert not sched.has_work()
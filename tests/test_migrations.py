@@ -0,0 +1,110 @@
+import pytest
+
+from labeler import db, migrations
+from labeler.maintenance import MaintenanceScheduler, schedule_migrations
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    return tmp_path
+
+
+def _indexes(conn, table):
+    return {r[1] for r in conn.execute(f"PRAGMA index_list({table})").fetchall()}
+
+
+def test_fresh_db_is_fully_migrated_and_idempotent(data_dir):
+    db.init_db()
+    db.init_db()
+    conn = db.get_conn()
+    st = migrations.status(conn)
+    assert st["pending"] == [] and st["version"] == st["latest"]
+    assert "idx_edges_dst" in _indexes(conn, "edges")
+    assert _indexes(conn, "labels") == {"idx_labels_subject_labeler_label"}
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT rule_id FROM label_decisions WHERE rule_id = ? ORDER BY created_at DESC LIMIT 5",
+        ("r",),
+    ).fetchall()
+    assert "idx_label_decisions_rule_created" in str(plan) and "TEMP B-TREE" not in str(plan)
+    # re-applying a recorded migration is harmless
+    for m in migrations.MIGRATIONS:
+        migrations.apply_txn(conn, m)
+    conn.commit()
+    conn.close()
+
+
+def test_legacy_db_gets_columns(data_dir):
+    conn = db.get_conn()
+    conn.execute("CREATE TABLE labels (subject_uri TEXT, labeler_did TEXT, label TEXT, ctime TIMESTAMP)")
+    conn.commit()
+    conn.close()
+    db.init_db()
+    conn = db.get_conn()
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(labels)").fetchall()}
+    assert "expired_at" in cols
+    conn.close()
+
+
+def test_large_table_index_is_built_online(data_dir, monkeypatch):
+    db.init_db()
+    conn = db.get_conn()
+    conn.execute("DELETE FROM schema_version WHERE version = 3")
+    conn.execute("DROP INDEX idx_edges_dst")
+    conn.executemany(
+        "INSERT INTO edges (src_did, dst_did, type, ctime) VALUES (?, ?, 'reply', '2024-01-01')",
+        [(f"did:a{i}", f"did:d{i % 7}") for i in range(300)],
+    )
+    conn.commit()
+
+    # startup leaves the big-table build pending
+    assert [m.version for m in migrations.migrate(conn, online_min_rows=100)] == [3]
+    assert "idx_edges_dst" not in _indexes(conn, "edges")
+
+    sched = MaintenanceScheduler(budget_s=60)
+    assert schedule_migrations(sched, conn) == 1
+    job = sched._queue[0]
+    job.chunk, job.adapt = 100, (lambda *a, **kw: None)
+    for _ in range(3):  # warm-up chunks, one step per slice
+        steps = job.steps
+        sched.run_slice(conn, should_yield=lambda: job.steps > steps)
+    assert job._pos == 300 and migrations.pending(conn) != []
+
+    # ingest pressure interrupts the build itself; it is retried later
+    sched.run_slice(conn, should_yield=lambda: True)
+    assert sched.preemptions == {"index_build": 1}
+    assert "idx_edges_dst" not in _indexes(conn, "edges")
+    sched.run_slice(conn)
+    assert not sched.has_work()
+    assert "idx_edges_dst" in _indexes(conn, "edges")
+    assert migrations.pending(conn) == []
+    conn.close()
+
+
+def test_index_build_that_overruns_its_step_is_left_pending(data_dir, monkeypatch):
+    db.init_db()
+    conn = db.get_conn()
+    conn.execute("DELETE FROM schema_version WHERE version = 3")
+    conn.execute("DROP INDEX idx_edges_dst")
+    conn.executemany(
+        "INSERT INTO edges (src_did, dst_did, type, ctime) VALUES (?, ?, 'reply', '2024-01-01')",
+        [(f"did:a{i}", f"did:d{i % 7}") for i in range(3000)],
+    )
+    conn.commit()
+    assert [m.version for m in migrations.migrate(conn, online_min_rows=100)] == [3]
+
+    monkeypatch.setattr(migrations, "MIGRATION_MAX_STEP_S", 1e-9)
+    sched = MaintenanceScheduler(budget_s=60)
+    schedule_migrations(sched, conn)
+    job = sched._queue[0]
+    job.chunk = 10000
+    while sched.has_work() and not sched.preemptions:
+        sched.run_slice(conn)
+    assert job.abandoned and "idx_edges_dst" not in _indexes(conn, "edges")
+
+    # not retried: the job ends and the migration stays pending
+    sched.run_slice(conn)
+    assert not sched.has_work()
+    assert sched.preemptions == {"index_build": 1}
+    assert [m.version for m in migrations.pending(conn)] == [3]
+    conn.close()
@@ -0,0 +1,139 @@
+import pytest
+
+from labeler import db, migrations, posts
+from labeler.longitudinal import _load_posts_for_root
+from labeler.maintenance import MaintenanceScheduler, schedule_migrations
+from labeler.prepare import prepare_event
+
+ROOT = "at://did:plc:alice/app.bsky.feed.post/root"
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    db.init_db()
+    c = db.get_conn()
+    yield c
+    c.close()
+
+
+def _post(i, parent=ROOT, link=False):
+    uri = ROOT if i == 0 else f"at://did:plc:u{i}/app.bsky.feed.post/{i}"
+    ev = {
+        "uri": uri,
+        "cid": f"c{i}",
+        "text": f"Officials confirmed {i} people were evacuated.",
+        "author": f"did:plc:u{i}",
+        "authorDid": f"did:plc:u{i}",
+        "time": "2024-01-01T00:00:00+00:00",
+        "createdAt": f"2024-01-01T00:00:{i:02d}Z",
+        "replyRootUri": parent if i else None,
+        "replyParentUri": parent if i else None,
+        "facets": [],
+        "embeds": [],
+        "externalLinks": ["https://example.com/report"] if link else [],
+        "_collection": "app.bsky.feed.post",
+    }
+    return ev
+
+
+def _thread(conn):
+    events = [_post(0)] + [_post(i, link=i % 3 == 0) for i in range(1, 10)]
+    events.append(_post(20, parent="at://did:plc:x/app.bsky.feed.post/other"))
+    db.insert_events_batch(conn, [prepare_event(e) for e in events])
+    conn.commit()
+
+
+def _raw_posts(conn, root):
+    """The pre-projection loader: decode every raw event."""
+    from labeler.rawcodec import load_raw
+
+    out = []
+    for uri, raw, ctime in conn.execute("SELECT event_uri, raw, ctime FROM events"):
+        data = load_raw(raw, conn)
+        if root in (uri, data.get("replyRootUri"), data.get("replyParentUri")):
+            out.append(posts.post_from_raw(data, uri, ctime))
+    return sorted(out, key=lambda p: p.createdAt)
+
+
+def test_projection_is_written_and_loader_matches_raw(conn):
+    _thread(conn)
+    row = conn.execute(
+        "SELECT root_uri, parent_uri, collection, cid, has_links FROM events WHERE event_uri LIKE '%/3'"
+    ).fetchone()
+    assert row == (ROOT, ROOT, "app.bsky.feed.post", "c3", 1)
+    assert _load_posts_for_root(conn, ROOT) == _raw_posts(conn, ROOT)
+    assert len(_load_posts_for_root(conn, ROOT)) == 10
+
+
+def test_unprojected_rows_read_through_raw_until_backfilled(conn):
+    _thread(conn)
+    expected = _raw_posts(conn, ROOT)
+    # rows from before the projection existed
+    conn.execute("UPDATE events SET " + ", ".join(f"{c} = NULL" for c in posts.PROJECTED_COLUMNS))
+    conn.execute("DELETE FROM schema_version WHERE version = 12")
+    conn.commit()
+    assert _load_posts_for_root(conn, ROOT) == expected
+
+    assert [m.version for m in migrations.migrate(conn, online_min_rows=5)] == [12]
+    sched = MaintenanceScheduler(budget_s=60)
+    assert schedule_migrations(sched, conn) == 1
+    sched._queue[0].chunk = 4
+    sched._queue[0].adapt = lambda *a, **kw: None
+    while sched.has_work():
+        sched.run_slice(conn)
+    assert conn.execute("SELECT count(*) FROM events WHERE collection IS NULL").fetchone()[0] == 0
+    assert migrations.pending(conn) == []
+    assert _load_posts_for_root(conn, ROOT) == expected
+
+
+def test_thread_load_is_an_index_range_scan(conn):
+    _thread(conn)
+    plan = conn.execute(
+        f"EXPLAIN QUERY PLAN SELECT rowid FROM events WHERE {posts.THREAD_KEY} = ?", (ROOT,)
+    ).fetchall()
+    assert "idx_events_thread" in plan[0][-1]
+    # a reply carrying only a parent pointer belongs to that parent's thread
+    orphan = _post(30)
+    orphan["replyRootUri"] = None
+    db.insert_events_batch(conn, [prepare_event(orphan)])
+    conn.execute("DELETE FROM events WHERE event_uri LIKE '%/4'")
+    conn.commit()
+    uris = {p.uri for p in _load_posts_for_root(conn, ROOT)}
+    assert orphan["uri"] in uris and not any(u.endswith("/4") for u in uris)
+    assert len(uris) == 10
+
+
+def test_thread_bench_reports_per_thread_size():
+    from labeler.thread_bench import run
+
+    report = run([300, 1500], [5, 50], repeats=2)
+    for r in report["runs"]:
+        assert "idx_events_thread" in r["plan"]
+        assert set(r["threads"]) == {"5", "50"}
+
+
+def test_claim_group_loads_in_one_query(conn):
+    from labeler.claims import fingerprint_text
+    from labeler.longitudinal import _load_posts_for_claim_group
+
+    text = "Officials confirmed 40 people were evacuated."
+    events = []
+    for i in range(1, 31):
+        ev = _post(i, link=i == 7)
+        ev.update(author="did:plc:bob", authorDid="did:plc:bob", text=text)
+        events.append(ev)
+    db.insert_events_batch(conn, [prepare_event(e) for e in reversed(events)])
+    conn.commit()
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    group = _load_posts_for_claim_group(conn, "did:plc:bob", fingerprint_text(text))
+    conn.set_trace_callback(None)
+    assert [p.uri for p in group] == [e["uri"] for e in events]
+    assert group[6].externalLinks == ["https://example.com/report"]
+    # the join, plus one rowid IN (...) for the raw of the post with links
+    assert len(statements) == 2
+
+    before = posts.load_claim_group(conn, "did:plc:bob", fingerprint_text(text), before="2024-01-01T00:00:04")
+    assert [p.uri for p in before] == [e["uri"] for e in events[:3]]
@@ -0,0 +1,217 @@
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from labeler import db
+from labeler.prepare import PreparedEvent, prepare_event, prepare_frames
+
+
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    db.init_db()
+    return tmp_path
+
+
+def _frame(rkey, text, time_us=1700000000000000, operation="create", parent=None):
+    record = {"text": text, "createdAt": "2024-01-01T00:00:00Z"}
+    if parent:
+        record["reply"] = {"root": {"uri": parent}, "parent": {"uri": parent}}
+    return json.dumps({
+        "did": "did:plc:alice",
+        "time_us": time_us,
+        "kind": "commit",
+        "commit": {
+            "operation": operation,
+            "collection": "app.bsky.feed.post",
+            "rkey": rkey,
+            "cid": "cid-" + rkey,
+            "record": record,
+        },
+    })
+
+
+def test_prepare_event_rows():
+    ev = {
+        "uri": "at://did:plc:alice/app.bsky.feed.post/1",
+        "cid": "c1",
+        "text": "Officials confirmed 200 people were evacuated.",
+        "authorDid": "did:plc:alice",
+        "createdAt": "2024-01-01T00:00:00Z",
+        "replyRootUri": "at://did:plc:bob/app.bsky.feed.post/0",
+    }
+    prep = prepare_event(ev)
+    assert prep.event_uri == ev["uri"]
+    assert prep.author == "did:plc:alice"
+    assert prep.ctime == "2024-01-01T00:00:00+00:00"
+    assert prep.root_uri == ev["replyRootUri"]
+    assert json.loads(prep.raw_json) == ev
+    assert prep.claim_row[0] == "did:plc:alice"
+    assert prep.claim_row[6] == ev["uri"]
+
+
+def test_prepare_event_without_text_has_no_claim_row():
+    prep = prepare_event({"uri": "uri:x", "author": "did:a", "time": "2024-01-01T00:00:00Z"})
+    assert prep.claim_row is None
+    assert prep.root_uri == "uri:x"
+
+
+def test_prepare_frames_skips_bad_and_uninteresting_frames_keeps_deletes():
+    frames = [
+        _frame("1", "first"),
+        "{not json",
+        json.dumps({"did": "did:plc:x", "time_us": 1700000000000005, "kind": "identity"}),
+        _frame("2", "second", time_us=1700000000000009, operation="delete"),
+    ]
+    prepared, cursor, errors = prepare_frames(frames)
+    assert [(p.event_uri, p.deleted) for p in prepared] == [
+        ("at://did:plc:alice/app.bsky.feed.post/1", False),
+        ("at://did:plc:alice/app.bsky.feed.post/2", True),
+    ]
+    assert cursor == "1700000000000009"
+    assert errors == 1
+
+
+def test_spilled_prepared_events_replay_without_preparing_again(monkeypatch):
+    from labeler import prepare
+
+    prepared, _, _ = prepare_frames([
+        _frame("1", "Officials confirmed 200 people were evacuated.", parent="at://did:plc:bob/app.bsky.feed.post/0"),
+        _frame("2", "gone", time_us=1700000000000009, operation="delete"),
+    ])
+    payloads = [prepare.dumps_prepared(p) for p in prepared]
+    monkeypatch.setattr(prepare, "prepare_event", lambda ev: pytest.fail("prepared again"))
+    assert [prepare.loads_spilled(b) for b in payloads] == prepared
+    assert prepared[0].claim_row and prepared[1].deleted
+
+
+def test_prepared_event_matches_inline_insert(tmp_db):
+    ev = {
+        "uri": "uri:prep:1",
+        "cid": "c1",
+        "text": "Reportedly 100 people were evacuated.",
+        "authorDid": "did:alice",
+        "createdAt": "2024-01-01T00:00:00Z",
+    }
+    conn = db.get_conn()
+    assert db.insert_prepared_event_txn(conn, prepare_event(ev)) == (True, False)
+    assert db.insert_prepared_event_txn(conn, prepare_event(ev)) == (False, False)
+    edited = dict(ev, text="100 people were evacuated.")
+    assert db.insert_event_txn(conn, ev["uri"], ev["createdAt"], "did:alice", edited) == (False, True)
+    conn.commit()
+    assert conn.execute("SELECT COUNT(*) FROM claim_history WHERE post_uri = ?", (ev["uri"],)).fetchone()[0] == 2
+    assert conn.execute("SELECT COUNT(*) FROM event_versions").fetchone()[0] == 1
+    conn.close()
+
+
+def test_prepare_frames_in_process_pool():
+    frames = [_frame(str(i), f"post {i}", time_us=1700000000000000 + i) for i in range(5)]
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        prepared, cursor, errors = pool.submit(prepare_frames, frames).result(timeout=60)
+    assert all(isinstance(p, PreparedEvent) for p in prepared)
+    assert len(prepared) == 5
+    assert cursor == "1700000000000004"
+    assert errors == 0
+
+
+def test_time_us_is_carried_not_stored(tmp_db):
+    prepared, _, _ = prepare_frames([_frame("1", "first", time_us=1700000000000042)])
+    prep = prepared[0]
+    assert prep.time_us == 1700000000000042
+    assert "_time_us" not in json.loads(prep.raw_json)
+
+
+def test_cursor_upsert_is_part_of_the_batch_txn(tmp_db):
+    conn = db.get_conn()
+    db.upsert_cursor_txn(conn, "c", "100")
+    conn.commit()
+    db.upsert_cursor_txn(conn, "c", "200")
+    conn.rollback()
+    assert db.get_cursor("c") == "100"
+    db.upsert_cursor_txn(conn, "c", "300")
+    conn.commit()
+    conn.close()
+    assert db.get_cursor("c") == "300"
+
+
+def _post(n, text, **kw):
+    return prepare_event(dict({
+        "uri": f"uri:batch:{n}",
+        "cid": f"c{n}",
+        "text": text,
+        "authorDid": "did:alice",
+        "createdAt": "2024-01-01T00:00:00Z",
+        "replyRootUri": "uri:batch:root",
+    }, **kw))
+
+
+def _dump(conn):
+    return {
+        t: sorted(conn.execute(f"SELECT * FROM {t}").fetchall())
+        for t in ("events", "claim_history", "recheck_requests")
+    } | {"versions": sorted(conn.execute("SELECT event_uri, raw FROM event_versions").fetchall())}
+
+
+def test_events_batch_matches_per_event_inserts(tmp_path, monkeypatch):
+    def batch():
+        return [
+            _post(1, "Reportedly 100 people were evacuated."),
+            _post(2, "just coffee"),
+            _post(1, "Reportedly 100 people were evacuated."),  # duplicate: no-op
+            _post(1, "Officials say 120 people were evacuated."),  # edit in the same batch
+            _post(3, "back from the dead"),  # tombstoned earlier
+            _post(0, "already stored, unchanged"),
+        ]
+
+    dumps, results = [], []
+    for name, apply in (
+        ("seq", lambda conn, evs: [db.insert_prepared_event_txn(conn, e) for e in evs]),
+        ("batch", db.insert_events_batch),
+    ):
+        monkeypatch.setattr(db, "DATA_DIR", tmp_path / name)
+        (tmp_path / name).mkdir()
+        db.init_db()
+        conn = db.get_conn()
+        db.insert_prepared_event_txn(conn, _post(0, "already stored, unchanged"))
+        db.apply_tombstones_txn(conn, [_post(3, "", _operation="delete")])
+        conn.execute("DELETE FROM recheck_requests")
+        conn.commit()
+        statements = []
+        conn.set_trace_callback(statements.append)
+        results.append(apply(conn, batch()))
+        conn.set_trace_callback(None)
+        conn.commit()
+        dumps.append(_dump(conn))
+        conn.close()
+        if name == "batch":
+            # one lookup on events and one on tombstones for the whole batch
+            lookups = [s for s in statements if "FROM events" in s or "FROM tombstones" in s]
+            assert len(lookups) == 2
+
+    assert results[0] == results[1] == [
+        (True, False), (True, False), (False, False), (False, True), (False, False), (False, False),
+    ]
+    for table in ("events", "claim_history", "versions"):
+        assert dumps[0][table] == dumps[1][table]
+    assert [r[0] for r in dumps[0]["recheck_requests"]] == [r[0] for r in dumps[1]["recheck_requests"]]
+
+
+def test_a_failing_claim_row_costs_only_itself(tmp_db):
+    from labeler.claims import claim_history_row
+
+    rows = [
+        claim_history_row(f"did:plc:u{i}", "Officials confirmed 200 people were evacuated.",
+                          "2024-01-01T00:00:00+00:00", f"at://did:plc:u{i}/app.bsky.feed.post/{i}", "c", None, None, None)
+        for i in range(4)
+    ]
+    rows[2] = rows[2][:5]  # wrong arity: fails mid-executemany
+    conn = db.get_conn()
+    conn.execute("DELETE FROM claim_history")
+    conn.commit()
+    db._add_prepared_claims_txn(conn, rows)
+    conn.commit()
+    uris = sorted(r[0] for r in conn.execute("SELECT post_uri FROM claim_history"))
+    assert uris == [rows[i][6] for i in (0, 1, 3)]
+    conn.close()
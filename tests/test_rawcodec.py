@@ -0,0 +1,81 @@
+import pytest
+
+from labeler import db, rawcodec
+from labeler.longitudinal import _load_posts_for_root
+from labeler.prepare import prepare_event
+
+ROOT = "at://did:plc:alice/app.bsky.feed.post/root"
+
+
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(rawcodec, "_encoders", {})
+    db.init_db()
+    return tmp_path
+
+
+def _post(i, text=None):
+    uri = ROOT if i == 0 else f"at://did:plc:u{i}/app.bsky.feed.post/{i}"
+    return {
+        "uri": uri,
+        "cid": f"c{i}",
+        "text": text or f"Officials confirmed {i} people were evacuated from the harbour district.",
+        "author": f"did:plc:u{i}",
+        "authorDid": f"did:plc:u{i}",
+        "time": "2024-01-01T00:00:00+00:00",
+        "createdAt": f"2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}Z",
+        "replyRootUri": None if i == 0 else ROOT,
+        "replyParentUri": None if i == 0 else ROOT,
+        "record": {"text": text or f"Officials confirmed {i} people were evacuated from the harbour district."},
+    }
+
+
+def _insert(conn, events):
+    db.insert_events_batch(conn, [prepare_event(e) for e in events])
+    conn.commit()
+
+
+def test_text_rows_pass_through_and_unknown_codec_fails(tmp_db):
+    conn = db.get_conn()
+    _insert(conn, [_post(0)])
+    raw = conn.execute("SELECT raw FROM events").fetchone()[0]
+    assert isinstance(raw, str) and rawcodec.decode_raw(raw) == raw
+    assert rawcodec.load_raw(raw)["uri"] == ROOT
+    with pytest.raises(ValueError):
+        rawcodec.decode_raw(b"\x7fjunk")
+    conn.close()
+
+
+def test_zstd_rows_mix_with_text_and_survive_retraining(tmp_db, monkeypatch):
+    pytest.importorskip("zstandard")
+    conn = db.get_conn()
+    _insert(conn, [_post(i) for i in range(200)])  # legacy TEXT rows
+
+    monkeypatch.setattr(rawcodec, "RAW_CODEC", "zstd")
+    dict_id, n = rawcodec.train(conn, samples=500, dict_size=4096)
+    conn.commit()
+    assert n == 200
+    _insert(conn, [_post(i) for i in range(200, 260)])
+    # an edit: the version row and the update are both compressed
+    _insert(conn, [_post(5, text="Officials now say 7 people were evacuated.")])
+    types = dict(conn.execute("SELECT typeof(raw), count(*) FROM events GROUP BY 1").fetchall())
+    assert types == {"text": 199, "blob": 61}
+    assert conn.execute("SELECT typeof(raw) FROM event_versions").fetchone()[0] == "blob"
+
+    posts = _load_posts_for_root(conn, ROOT)
+    assert len(posts) == 260
+    assert [p.text for p in posts if p.uri.endswith("/5")] == ["Officials now say 7 people were evacuated."]
+
+    report = rawcodec.recompress(conn, chunk=50)
+    ev = report["events"]
+    assert ev["rows_rewritten"] == 199
+    assert ev["payload_bytes_after"] < ev["payload_bytes_before"] / 2
+
+    # a new dictionary leaves rows under the old one readable
+    monkeypatch.setattr(rawcodec, "_decompressors", {})
+    rawcodec.train(conn, samples=500, dict_size=4096)
+    conn.commit()
+    assert conn.execute("SELECT count(*) FROM raw_dicts").fetchone()[0] >= 1
+    assert len(_load_posts_for_root(conn, ROOT)) == 260
+    conn.close()
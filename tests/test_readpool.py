@@ -0,0 +1,52 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from labeler import db, readpool
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(db, "SHARD_COUNT", 2)
+    monkeypatch.setattr(db, "SHARD_ID", None)
+    for shard in db.shard_ids():
+        db.init_db(shard)
+    yield tmp_path
+    readpool.close_all()
+
+
+def test_connections_are_per_thread_and_read_only(sharded):
+    c1 = readpool.read_conn(0)
+    assert readpool.read_conn(0) is c1
+    assert readpool.read_conn(1) is not c1
+    with pytest.raises(sqlite3.OperationalError):
+        c1.execute("INSERT INTO cursors (consumer, cursor) VALUES ('x', '1')")
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(readpool.read_conn(0)))
+    t.start()
+    t.join()
+    assert other[0] is not c1
+
+
+def test_async_reads_fan_out_on_the_pool(sharded):
+    uris = [f"at://did:plc:user{i:05d}/app.bsky.feed.post/1" for i in range(10)]
+    for uri in uris:
+        db.insert_label(uri, "did:plc:labeler", {"label": "x", "rule_id": "r"})
+
+    async def go():
+        total = await readpool.aquery_shards("SELECT COUNT(*) FROM labels")
+        names = await asyncio.gather(*[readpool.run(lambda: threading.current_thread().name) for _ in range(8)])
+        labels = await readpool.run(
+            lambda: db.get_labels_for_subject(uris[3], conn=readpool.read_conn_for_uri(uris[3]))
+        )
+        return total, names, labels
+
+    total, names, labels = asyncio.run(go())
+    assert sum(r[0] for r in total) == 10
+    assert all(n.startswith("labeler-read") for n in names)
+    assert len(set(names)) <= readpool.READ_POOL_THREADS
+    assert len(labels) == 1 and labels[0]["label"]["label"] == "x"
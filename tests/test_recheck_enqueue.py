@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+from labeler import db, recheck_queue
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(recheck_queue, "REDIS_URL", None)
+    db.init_db()
+    c = db.get_conn()
+    # depth already counted once this process: no rescans in these tests
+    monkeypatch.setattr(recheck_queue, "_local_depth", 0)
+    monkeypatch.setattr(recheck_queue, "_depth_synced_at", time.monotonic())
+    yield c
+    c.close()
+
+
+def test_batch_enqueue_is_one_upsert_without_commit_or_count(conn):
+    conn.execute("INSERT INTO recheck_requests VALUES ('root:old', '2000-01-01T00:00:00')")
+    conn.commit()
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    db._add_rechecks_txn(conn, ["root:a", "root:b", "root:a", "root:old"])
+    conn.set_trace_callback(None)
+
+    upserts = [s for s in statements if "ON CONFLICT(root_uri)" in s]
+    assert len(upserts) == 3  # one executemany over distinct roots, traced per row
+    assert not any(s.strip().upper() == "COMMIT" for s in statements)
+    assert not any(s.rstrip().endswith("FROM recheck_requests") for s in statements)
+    assert conn.execute("SELECT scheduled_at FROM recheck_requests WHERE root_uri = 'root:old'").fetchone()[0] > "2000"
+
+    conn.rollback()  # the caller owns the transaction
+    assert conn.execute("SELECT root_uri FROM recheck_requests").fetchall() == [("root:old",)]
+
+
+def test_depth_is_tracked_incrementally(conn):
+    db._add_rechecks_txn(conn, ["root:a", "root:b"])
+    db._add_rechecks_txn(conn, ["root:b", "root:c"])
+    conn.commit()
+    assert recheck_queue._local_depth == 3
+
+    q = recheck_queue.LocalFallbackQueue(conn)
+    assert len(q.dequeue(limit=2)) == 2
+    assert recheck_queue._local_depth == 1
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import pytest
+
+from labeler import db, longitudinal, recheck_pool
+from labeler.prepare import prepare_event
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    db.init_db()
+    c = db.get_conn()
+    yield c
+    c.close()
+    recheck_pool.shutdown()
+
+
+def _threads(conn, n):
+    events = []
+    for t in range(n):
+        root = f"at://did:plc:r{t}/app.bsky.feed.post/root"
+        events.append({"uri": root, "text": "Evacuations at the harbour.", "author": f"did:plc:r{t}",
+                       "time": "2024-01-01T00:00:00+00:00", "createdAt": "2024-01-01T00:00:00Z"})
+        for i in range(1, 4):
+            events.append({
+                "uri": f"at://did:plc:u{i}/app.bsky.feed.post/{t}-{i}",
+                "text": 'He said "40 people were evacuated" according to the council.',
+                "author": f"did:plc:u{i}",
+                "time": "2024-01-01T00:00:00+00:00",
+                "createdAt": f"2024-01-01T00:00:0{i}Z",
+                "replyRootUri": root,
+                "replyParentUri": root,
+            })
+    db.insert_events_batch(conn, [prepare_event(e) for e in events])
+    conn.commit()
+    return [e["uri"] for e in events if "replyRootUri" not in e]
+
+
+def test_worker_processes_match_inline_evaluation(conn):
+    roots = _threads(conn, 4) + ["at://did:plc:gone/app.bsky.feed.post/none"]
+    inline = list(recheck_pool.evaluate_roots(conn, roots, workers=0))
+    pooled = list(recheck_pool.evaluate_roots(conn, roots, workers=2))
+    assert [r for r, _ in pooled] == roots
+    assert [(r.subjects, r.state) for _, r in pooled] == [(r.subjects, r.state) for _, r in inline]
+    assert any(labs for p, labs in pooled[0][1].subjects)
+    assert pooled[-1][1].posts == 0
+
+
+def test_run_periodic_keeps_the_event_loop_free(monkeypatch):
+    def slow_pass():
+        time.sleep(0.3)
+        return 0
+
+    monkeypatch.setattr(longitudinal, "recheck_once", slow_pass)
+
+    async def main():
+        stop = asyncio.Event()
+        task = asyncio.create_task(longitudinal.run_periodic(stop, interval=1))
+        ticks = 0
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < 0.25:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        stop.set()
+        await task
+        return ticks
+
+    assert asyncio.run(main()) > 10
+    recheck_pool.shutdown()
+
+
+def test_app_shutdown_stops_the_recheck_executor_with_the_loop_disabled(monkeypatch):
+    from labeler import main
+
+    monkeypatch.delenv("ENABLE_LONGITUDINAL_RECHECK", raising=False)
+    recheck_pool.recheck_executor()
+    asyncio.run(main.shutdown_event())
+    assert recheck_pool._thread is None
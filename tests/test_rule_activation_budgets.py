@@ -15,7 +15,7 @@ def _load_jsonl(path):
 
 
 def _reset_tables(conn):
-    for t in ("claim_history", "events", "labels", "event_versions", "recheck_requests", "label_decisions"):
+    for t in ("claim_history", "events", "labels", "event_versions", "recheck_requests", "thread_eval_state", "label_decisions"):
         try:
             conn.execute(f"DELETE FROM {t}")
         except Exception:
@@ -0,0 +1,171 @@
+import json
+from collections import Counter
+
+import pytest
+
+from labeler import db, frames
+
+
+def _dids(n):
+    return [f"did:plc:user{i:05d}" for i in range(n)]
+
+
+def test_shard_for_did_is_stable_and_balanced():
+    dids = _dids(4000)
+    shards = [db.shard_for_did(d, 4) for d in dids]
+    assert shards == [db.shard_for_did(d, 4) for d in dids]
+    counts = Counter(shards)
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > 800
+
+
+def test_growing_shard_count_moves_few_dids():
+    dids = _dids(4000)
+    moved = sum(db.shard_for_did(d, 4) != db.shard_for_did(d, 5) for d in dids)
+    # consistent hashing: ~1/5 move, not ~4/5 as with modulo
+    assert moved < 4000 * 0.3
+
+
+def test_did_from_uri():
+    assert db.did_from_uri("at://did:plc:alice/app.bsky.feed.post/1") == "did:plc:alice"
+    assert db.did_from_uri("did:plc:alice") == "did:plc:alice"
+    assert db.did_from_uri("https://example.com") is None
+
+
+def _frame(did, time_us):
+    return json.dumps({
+        "did": did,
+        "time_us": time_us,
+        "kind": "commit",
+        "commit": {
+            "operation": "create",
+            "collection": "app.bsky.feed.post",
+            "rkey": "1",
+            "cid": "c",
+            # a mention of someone else must not decide the shard
+            "record": {"text": "hi", "facets": [{"features": [{"did": "did:plc:zzz"}]}]},
+        },
+    }, separators=(",", ":"))
+
+
+def test_decode_frame_keeps_only_own_shard():
+    kept = 0
+    for i, did in enumerate(_dids(200)):
+        raw = _frame(did, 1000 + i)
+        assert frames.frame_did(raw) == did
+        mine = db.shard_for_did(did, 3) == 1
+        cursor, ev = frames.decode_frame(raw, shard=(1, 3))
+        assert cursor == str(1000 + i)
+        assert (ev is not None) == mine
+        kept += mine
+    assert 0 < kept < 200
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(db, "SHARD_COUNT", 2)
+    monkeypatch.setattr(db, "SHARD_ID", None)
+    for shard in db.shard_ids():
+        db.init_db(shard)
+    return tmp_path
+
+
+def test_router_reads_and_writes_owning_shard(sharded):
+    from labeler.claims import add_claim_history, fingerprint_text, get_claim_history
+
+    text = "Officials confirmed 200 people were evacuated."
+    dids = _dids(20)
+    for did in dids:
+        uri = f"at://{did}/app.bsky.feed.post/1"
+        db.insert_label(uri, "did:plc:labeler", {"label": "x", "rule_id": "r"})
+        add_claim_history(did, text, "2024-01-01T00:00:00Z", uri)
+
+    for did in dids:
+        uri = f"at://{did}/app.bsky.feed.post/1"
+        own = db.get_conn(db.shard_for_did(did))
+        other = db.get_conn(1 - db.shard_for_did(did))
+        q = "SELECT COUNT(*) FROM labels WHERE subject_uri = ?"
+        assert own.execute(q, (uri,)).fetchone()[0] == 1
+        assert other.execute(q, (uri,)).fetchone()[0] == 0
+        own.close()
+        other.close()
+        assert len(db.get_labels_for_subject(uri)) == 1
+        hist = get_claim_history(did, fingerprint_text(text))
+        assert [h["post_uri"] for h in hist] == [uri]
+
+    assert db.query_shards("SELECT COUNT(*) FROM labels") != [(20,)]
+    assert sum(r[0] for r in db.query_shards("SELECT COUNT(*) FROM labels")) == 20
+    assert sorted(p.name for p in sharded.glob("labeler.shard*.sqlite")) == [
+        "labeler.shard0.sqlite", "labeler.shard1.sqlite",
+    ]
+
+
+def test_recheck_labels_a_reply_on_the_other_shard(sharded, monkeypatch):
+    from labeler import recheck_queue
+    from labeler.longitudinal import evaluate_root, recheck_once
+    from labeler.prepare import prepare_event
+
+    monkeypatch.setattr(recheck_queue, "REDIS_URL", None)
+    root_did = "did:plc:alice"
+    reply_did = next(d for d in _dids(50) if db.shard_for_did(d) != db.shard_for_did(root_did))
+    root = f"at://{root_did}/app.bsky.feed.post/root"
+    reply = f"at://{reply_did}/app.bsky.feed.post/1"
+    events = [
+        {"uri": root, "text": "Evacuations at the harbour.", "author": root_did,
+         "time": "2024-01-01T00:00:00+00:00", "createdAt": "2024-01-01T00:00:00Z"},
+        {"uri": reply, "text": 'He said "40 people were evacuated" according to the council.',
+         "author": reply_did, "time": "2024-01-01T00:00:00+00:00", "createdAt": "2024-01-01T00:00:01Z",
+         "replyRootUri": root, "replyParentUri": root},
+    ]
+    # each consumer writes its own authors' events, and queues the root there
+    for ev in events:
+        conn = db.get_conn(db.shard_for_did(ev["author"]))
+        db.insert_events_batch(conn, [prepare_event(ev)])
+        conn.commit()
+        conn.close()
+
+    conn = db.get_conn(db.shard_for_did(root_did))
+    assert evaluate_root(conn, root).posts == 2  # the whole thread, from both shards
+    conn.close()
+
+    assert recheck_once() == 1
+    assert sum(r[0] for r in db.query_shards("SELECT COUNT(*) FROM recheck_requests")) == 0
+    own = db.get_conn(db.shard_for_did(reply_did))
+    assert own.execute(
+        "SELECT COUNT(*) FROM labels WHERE subject_uri = ? AND expired_at IS NULL", (reply,)
+    ).fetchone()[0] > 0
+    assert own.execute(
+        "SELECT COUNT(*) FROM label_decisions WHERE subject_uri = ? AND status = 'committed'", (reply,)
+    ).fetchone()[0] > 0
+    own.close()
+
+
+def test_shard_local_queues_are_drained_from_every_shard(sharded):
+    from labeler.cli import quarantine_list
+    from labeler.emitter import record_emit_decision
+
+    dids = _dids(6)
+    assert {db.shard_for_did(d) for d in dids} == {0, 1}
+    for did in dids:
+        db.enqueue_claim_recheck(did, "fp")
+    first = db.dequeue_claim_rechecks(limit=4)
+    assert len(first) == 4
+    rest = db.dequeue_claim_rechecks(limit=10)
+    assert sorted(first + rest) == sorted((d, "fp") for d in dids)
+    assert sum(r[0] for r in db.query_shards("SELECT COUNT(*) FROM claim_recheck_requests")) == 0
+
+    for i, did in enumerate(dids):
+        uri = f"at://{did}/app.bsky.feed.post/1"
+        db.insert_event(uri, f"2099-01-01T00:00:0{i}+00:00", did, {"uri": uri, "text": "x"})
+    labelled = f"at://{dids[0]}/app.bsky.feed.post/1"
+    db.insert_label(labelled, "did:plc:labeler", {"label": "x"})
+    subjects = db.get_unlabeled_subjects(window_hours=24 * 365 * 100, limit=3)
+    assert subjects == [f"at://{did}/app.bsky.feed.post/1" for did in reversed(dids[1:])][:3]
+
+    reply = f"at://{dids[-1]}/app.bsky.feed.post/1"
+    record_emit_decision([{"subject_uri": reply, "label": "drift"}], "quarantine", audit_path=str(sharded / "q.jsonl"))
+    own = db.get_conn(db.shard_for_did(dids[-1]))
+    assert own.execute("SELECT COUNT(*) FROM quarantine_emits").fetchone()[0] == 1
+    own.close()
+    assert sum(r[0] for r in db.query_shards("SELECT COUNT(*) FROM quarantine_emits")) == 1
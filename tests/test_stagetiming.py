@@ -0,0 +1,38 @@
+from labeler import db, stagetiming
+from labeler.prepare import prepare_event
+
+
+def test_sampler_rate():
+    s = stagetiming.Sampler(0.25)
+    assert [s.hit() for _ in range(8)] == [False, False, False, True] * 2
+    assert not any(stagetiming.Sampler(0).hit() for _ in range(10))
+
+
+def test_stage_stats_summary_in_pipeline_order():
+    st = stagetiming.StageStats()
+    st.observe("commit", 0.004)
+    st.observe("parse", 0.001)
+    st.observe("parse", 0.003)
+    assert st.summary() == "parse=2.00/3.0 commit=4.00/4.0"
+    assert st.summary() == "-"
+
+
+def test_enqueue_stamp_is_carried_but_not_stored(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    db.init_db()
+    ev = {
+        "uri": "at://did:plc:a/app.bsky.feed.post/1", "authorDid": "did:plc:a",
+        "text": "Officials confirmed 200 people were evacuated.",
+        "createdAt": "2024-01-01T00:00:00Z", "_time_us": 5,
+    }
+    stagetiming.stamp(ev)
+    prep = prepare_event(ev)
+    assert prep.t_enq == ev["_t_enq"] and prep.time_us == 5
+    assert "_t_enq" not in prep.raw_json and "_time_us" not in prep.raw_json
+    assert stagetiming.enqueued_at(prep) == prep.t_enq
+
+    conn = db.get_conn()
+    timings = {}
+    assert db.insert_prepared_event_txn(conn, prep, timings) == (True, False)
+    assert timings["claim"] > 0
+    conn.close()
@@ -0,0 +1,52 @@
+import re
+from collections import Counter
+
+from labeler.ingest_bench import parse_batches, percentile
+from labeler.prepare import prepare_frames
+from labeler.synthetic import SynthConfig, generate
+
+
+def test_generate_is_deterministic_and_decodes():
+    cfg = SynthConfig(authors=500, seed=7)
+    a = list(generate(cfg, 500))
+    assert a == list(generate(cfg, 500))
+    prepared, cursor, errors = prepare_frames(a)
+    assert errors == 0 and len(prepared) == 500
+    assert cursor == re.search(rb'"time_us":(\d+)', a[-1]).group(1).decode()
+    assert any(p.claim_row for p in prepared)
+
+
+def test_mix_depth_and_skew():
+    cfg = SynthConfig(authors=1000, repost_ratio=0.3, reply_ratio=0.5, max_reply_depth=3, seed=3)
+    frames = list(generate(cfg, 5000))
+    prepared, _, _ = prepare_frames(frames)
+    reposts = sum(b'"app.bsky.feed.repost"' in f for f in frames)
+    assert 0.25 < reposts / len(frames) < 0.35
+
+    # thread depth never exceeds the cap
+    parent_of = {}
+    for f, p in zip(frames, prepared):
+        m = re.search(rb'"parent":\{"uri":"([^"]+)"', f)
+        parent_of[p.event_uri] = m.group(1).decode() if m else None
+
+    def depth(uri):
+        d = 0
+        while parent_of.get(uri):
+            uri = parent_of[uri]
+            d += 1
+        return d
+
+    assert max(depth(u) for u in parent_of) <= 3
+    assert any(depth(u) > 0 for u in parent_of)
+
+    authors = Counter(p.author for p in prepared)
+    top = sum(c for _, c in authors.most_common(10))
+    assert top / len(prepared) > 0.2  # Zipf: a few accounts dominate
+
+
+def test_percentile_and_batches():
+    xs = list(range(1, 101))
+    assert percentile(xs, 50) == 50
+    assert percentile(xs, 99) == 99
+    assert percentile([], 50) is None
+    assert [s["name"] for s in parse_batches("50, 100,adaptive")] == ["fixed-50", "fixed-100", "adaptive"]
@@ -0,0 +1,87 @@
+import pytest
+
+from labeler import db
+from labeler.drift.context import ThreadContext
+from labeler.drift.rules import apply_all_rules
+from labeler.longitudinal import _load_posts_for_root
+from labeler.prepare import prepare_event
+
+ROOT = "at://did:plc:alice/app.bsky.feed.post/root"
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    db.init_db()
+    c = db.get_conn()
+    yield c
+    c.close()
+
+
+def _event(i, author, text, root=ROOT):
+    return {
+        "uri": root if i == 0 else f"at://{author}/app.bsky.feed.post/{root.rsplit('/', 1)[1]}{i}",
+        "cid": f"c{i}",
+        "text": text,
+        "author": author,
+        "authorDid": author,
+        "time": f"2024-01-01T{i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}+00:00",
+        "createdAt": f"2024-01-01T{i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}Z",
+        "replyRootUri": None if i == 0 else root,
+        "replyParentUri": None if i == 0 else root,
+        "_collection": "app.bsky.feed.post",
+    }
+
+
+def _thread(conn, size):
+    # each author's claim was made earlier, with attribution, in another
+    # thread: only their claim history shows the attribution was dropped
+    other = "at://did:plc:bob/app.bsky.feed.post/other"
+    events = [_event(0, "did:plc:bob", "Weather update for the harbour.", root=other)]
+    events += [
+        _event(i, f"did:plc:u{i}", f"{i} families were reportedly moved from the harbour.", root=other)
+        for i in range(1, size)
+    ]
+    events.append(_event(0, "did:plc:alice", "Evacuations at the harbour."))
+    for i in range(1, size):
+        events.append(_event(i + size, f"did:plc:u{i}", f"{i} families were moved from the harbour."))
+    db.insert_events_batch(conn, [prepare_event(e) for e in events])
+    conn.commit()
+
+
+def _evaluate(conn, monkeypatch):
+    posts = _load_posts_for_root(conn, ROOT)
+    statements = []
+    conn.set_trace_callback(statements.append)
+
+    def no_conn(*a, **kw):
+        raise AssertionError("rules opened a connection")
+
+    with monkeypatch.context() as m:
+        m.setattr(db, "get_conn", no_conn)
+        ctx = ThreadContext.build(posts, conn)
+        labels = [l for p in posts for l in apply_all_rules(p, posts, ctx)]
+    conn.set_trace_callback(None)
+    return posts, labels, statements
+
+
+def test_context_matches_per_post_lookups(conn, monkeypatch):
+    _thread(conn, 60)
+    posts, labels, _ = _evaluate(conn, monkeypatch)
+    # without a context every rule call fetches the post's history itself
+    expected = [l for p in posts for l in apply_all_rules(p, posts)]
+    assert labels == expected
+    assert any(l.rule_id == "provenance_laundering" for l in labels)
+
+
+def test_thread_evaluation_uses_constant_queries(conn, monkeypatch):
+    _thread(conn, 50)
+    _, _, small = _evaluate(conn, monkeypatch)
+    conn.execute("DELETE FROM events")
+    conn.execute("DELETE FROM claim_history")
+    conn.commit()
+    _thread(conn, 500)
+    posts, _, large = _evaluate(conn, monkeypatch)
+    assert len(posts) == 500
+    # one claim-history query per 400 distinct claims
+    assert len(small) == 1 and len(large) == 2
@@ -0,0 +1,87 @@
+import pytest
+
+from labeler import db, thread_state
+from labeler.posts import load_thread_rows
+from labeler.prepare import prepare_event
+
+ROOT = "at://did:plc:alice/app.bsky.feed.post/root"
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(thread_state, "RECHECK_INCREMENTAL", True)
+    db.init_db()
+    c = db.get_conn()
+    yield c
+    c.close()
+
+
+def _insert(conn, i, author, text="Officials confirmed 40 people were evacuated."):
+    ev = {
+        "uri": ROOT if i == 0 else f"at://{author}/app.bsky.feed.post/{i}",
+        "cid": f"c{i}-{len(text)}",
+        "text": text,
+        "author": author,
+        "authorDid": author,
+        "time": "2024-01-01T00:00:00+00:00",
+        "createdAt": f"2024-01-01T00:00:{i:02d}Z",
+        "replyRootUri": None if i == 0 else ROOT,
+        "replyParentUri": None if i == 0 else ROOT,
+        "_collection": "app.bsky.feed.post",
+    }
+    db.insert_events_batch(conn, [prepare_event(ev)])
+    conn.commit()
+    return ev["uri"]
+
+
+def _evaluated(conn, cfg="cfg"):
+    rows = load_thread_rows(conn, ROOT)
+    todo = thread_state.posts_to_evaluate(thread_state.get_state(conn, ROOT), rows, cfg)
+    thread_state.save_state_txn(conn, ROOT, max(r[1] for r in rows), thread_state.thread_digest(rows), cfg)
+    conn.commit()
+    return sorted(p.uri for p in todo)
+
+
+def test_only_new_posts_and_their_authors_posts_are_reevaluated(conn):
+    uris = [_insert(conn, 0, "did:plc:alice")] + [_insert(conn, i, f"did:plc:u{i % 5}") for i in range(1, 30)]
+    assert len(_evaluated(conn)) == 30
+    assert _evaluated(conn) == []
+
+    new = _insert(conn, 40, "did:plc:u3")
+    same_author = [u for u in uris if u.startswith("at://did:plc:u3/")]
+    assert _evaluated(conn) == sorted(same_author + [new])
+
+
+def test_edits_deletes_and_config_changes_reevaluate_everything(conn):
+    uris = [_insert(conn, 0, "did:plc:alice")] + [_insert(conn, i, f"did:plc:u{i}") for i in range(1, 10)]
+    _evaluated(conn)
+
+    _insert(conn, 4, "did:plc:u4", text="Officials now say 45 people were evacuated.")
+    assert len(_evaluated(conn)) == 10
+    conn.execute("DELETE FROM events WHERE event_uri = ?", (uris[7],))
+    conn.commit()
+    assert len(_evaluated(conn)) == 9
+    assert _evaluated(conn) == []
+    assert len(_evaluated(conn, cfg="other")) == 9
+
+
+def test_state_is_dropped_with_its_root_and_by_retention(conn, monkeypatch):
+    from labeler import recheck_queue, retention
+    from labeler.prepare import prepare_event
+
+    monkeypatch.setattr(recheck_queue, "REDIS_URL", None)
+    _insert(conn, 0, "did:plc:alice")
+    _evaluated(conn)
+    thread_state.save_state_txn(conn, "at://did:plc:old/app.bsky.feed.post/root", 1, "d", "cfg")
+    conn.execute("UPDATE thread_eval_state SET evaluated_at = '2000-01-01T00:00:00+00:00' WHERE root_uri != ?", (ROOT,))
+    conn.commit()
+
+    assert retention.run_retention()["thread_eval_state"] == 1
+    assert thread_state.get_state(conn, ROOT) is not None
+
+    db.apply_tombstones_txn(conn, [prepare_event({
+        "uri": ROOT, "author": "did:plc:alice", "time": "2024-01-02T00:00:00+00:00", "_operation": "delete",
+    })])
+    conn.commit()
+    assert conn.execute("SELECT count(*) FROM thread_eval_state").fetchone()[0] == 0
@@ -0,0 +1,115 @@
+import pytest
+
+from labeler import db, recheck_queue
+from labeler.prepare import prepare_event
+
+ROOT = "at://did:plc:alice/app.bsky.feed.post/root"
+REPLY = "at://did:plc:bob/app.bsky.feed.post/reply"
+
+
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(recheck_queue, "REDIS_URL", None)
+    db.init_db()
+    return tmp_path
+
+
+def _post(uri, author, text, parent=None):
+    ev = {
+        "uri": uri,
+        "cid": "c",
+        "text": text,
+        "author": author,
+        "authorDid": author,
+        "time": "2024-01-01T00:00:00+00:00",
+        "createdAt": "2024-01-01T00:00:00Z",
+        "replyRootUri": parent,
+        "replyParentUri": parent,
+        "record": {"text": text},
+    }
+    if parent:
+        ev["record"]["reply"] = {"parent": {"uri": parent, "author": "did:plc:alice"}}
+    return ev
+
+
+def _delete(uri, author):
+    return prepare_event({
+        "uri": uri, "author": author, "authorDid": author,
+        "time": "2024-01-02T00:00:00+00:00", "_operation": "delete",
+    })
+
+
+def _count(conn, sql, *args):
+    return conn.execute(sql, args).fetchone()[0]
+
+
+def test_delete_purges_dependents_and_rechecks_root(tmp_db):
+    conn = db.get_conn()
+    for ev in (_post(ROOT, "did:plc:alice", "Officials confirmed 200 people were evacuated."),
+               _post(REPLY, "did:plc:bob", "Police confirmed 300 arrests downtown.", parent=ROOT)):
+        prep = prepare_event(ev)
+        db.insert_prepared_event_txn(conn, prep)
+        db.insert_edges_txn(conn, prep.edges)
+    edited = _post(REPLY, "did:plc:bob", "Police confirmed 310 arrests downtown.", parent=ROOT)
+    db.insert_prepared_event_txn(conn, prepare_event(edited))
+    conn.execute("DELETE FROM recheck_requests")
+    conn.commit()
+    db.insert_label(REPLY, "did:plc:labeler", {"label": "x", "rule_id": "r"})
+    assert _count(conn, "SELECT COUNT(*) FROM edges") == 1
+
+    assert db.apply_tombstones_txn(conn, [_delete(REPLY, "did:plc:bob"), _delete("at://gone", "did:x")]) == 1
+    conn.commit()
+
+    assert _count(conn, "SELECT COUNT(*) FROM events WHERE event_uri = ?", REPLY) == 0
+    assert _count(conn, "SELECT COUNT(*) FROM event_versions") == 0
+    assert _count(conn, "SELECT COUNT(*) FROM claim_history WHERE post_uri = ?", REPLY) == 0
+    assert _count(conn, "SELECT COUNT(*) FROM claim_history WHERE post_uri = ?", ROOT) == 1
+    assert _count(conn, "SELECT COUNT(*) FROM edges") == 0
+    assert db.get_labels_for_subject(REPLY) == []
+    assert _count(conn, "SELECT COUNT(*) FROM label_decisions WHERE status = 'committed'") == 0
+    assert [r[0] for r in conn.execute("SELECT root_uri FROM recheck_requests")] == [ROOT]
+    assert _count(conn, "SELECT COUNT(*) FROM tombstones") == 2
+    conn.close()
+
+
+def test_tombstone_blocks_resurrection(tmp_db):
+    conn = db.get_conn()
+    db.apply_tombstones_txn(conn, [_delete(ROOT, "did:plc:alice")])
+    assert db.insert_prepared_event_txn(conn, prepare_event(_post(ROOT, "did:plc:alice", "hi"))) == (False, False)
+    conn.commit()
+    assert _count(conn, "SELECT COUNT(*) FROM events") == 0
+    conn.close()
+
+
+def test_retention_prunes_tombstones_no_sooner_than_events(tmp_db, monkeypatch):
+    from labeler import retention
+
+    conn = db.get_conn()
+    db.apply_tombstones_txn(conn, [_delete(ROOT, "did:plc:alice")])  # deleted 2024-01-02
+    conn.execute("INSERT INTO tombstones VALUES (?, ?, ?)", (REPLY, "did:plc:bob", "2999-01-01T00:00:00+00:00"))
+    conn.commit()
+    monkeypatch.setattr(retention, "TOMBSTONES_DAYS", 1)
+    assert ("tombstones", "tombstones", "deleted_at") in [p[:3] for p in retention.retention_plan()]
+
+    assert retention.run_retention()["tombstones"] == 1
+    assert [r[0] for r in conn.execute("SELECT event_uri FROM tombstones")] == [REPLY]
+    conn.close()
+
+
+def test_delete_purges_only_its_own_edges(tmp_db):
+    conn = db.get_conn()
+    other = "at://did:plc:bob/app.bsky.feed.post/other"
+    # two replies with the same author, parent and ctime: identical edge tuples
+    for uri in (REPLY, other):
+        prep = prepare_event(_post(uri, "did:plc:bob", "Police confirmed 300 arrests downtown.", parent=ROOT))
+        db.insert_prepared_event_txn(conn, prep)
+        db.insert_edges_txn(conn, prep.edges)
+    # an edge stored before edges carried their post
+    db.insert_edges_txn(conn, [("did:plc:carol", "did:plc:alice", "reply", "2024-01-01T00:00:00+00:00")])
+    conn.commit()
+
+    db.apply_tombstones_txn(conn, [_delete(REPLY, "did:plc:bob")])
+    conn.commit()
+    assert [r[0] for r in conn.execute("SELECT event_uri FROM edges ORDER BY event_uri")] == [None, other]
+    conn.close()
@@ -0,0 +1,51 @@
+import pytest
+
+from labeler.fixture_server import bench, load_frames
+from labeler.prepare import prepare_frames
+
+FIXTURE = "fixtures/jetstream_frames.jsonl"
+
+
+def test_fixture_frames_decode():
+    frames = load_frames(FIXTURE)
+    assert len(frames) == 60
+    prepared, cursor, errors = prepare_frames(frames)
+    assert errors == 0
+    assert prepared
+    assert cursor == frames[-1].split(b'"time_us":')[1].split(b",")[0].decode()
+
+
+def test_bench_plain_only():
+    report = bench(load_frames(FIXTURE), rounds=1)
+    assert report["frames"] == 60
+    assert report["plain_bytes"] > 0
+    assert "compressed_bytes" not in report
+
+
+def test_compressed_roundtrip(tmp_path):
+    pytest.importorskip("zstandard")
+    from labeler.fixture_server import compress_frames, train_dictionary
+    from labeler.frames import FrameDecompressor
+
+    frames = load_frames(FIXTURE)
+    dict_path = tmp_path / "zstd_dictionary"
+    dict_path.write_bytes(train_dictionary(frames, dict_size=4096))
+
+    compressed = compress_frames(frames, dict_path.read_bytes())
+    dctx = FrameDecompressor(str(dict_path))
+    assert [dctx.decompress(c) for c in compressed] == frames
+
+    # parse workers decompress when handed the dictionary path
+    assert prepare_frames(compressed, str(dict_path)) == prepare_frames(frames)
+
+    report = bench(frames, str(dict_path), rounds=1)
+    assert report["compressed_bytes"] < report["plain_bytes"]
+
+
+def test_build_ws_url_compress():
+    pytest.importorskip("websockets")
+    from labeler.consumer import _build_ws_url
+
+    url = _build_ws_url("ws://127.0.0.1:6008/subscribe", cursor="42", compress=True)
+    assert url.endswith("&cursor=42&compress=true")
+    assert "compress" not in _build_ws_url("ws://127.0.0.1:6008/subscribe")